@@ -544,7 +544,7 @@ class ApplicationMainWindow(gtk.Window):
 					f.write(struct.pack("B",int(c[2]*255)))
 					f.write(struct.pack("B",ct))
 				self.rlp_pack("Data BLOB","<B",0,f)
-				f.write(doc.data)
+				f.write(str(doc.data))
 				f.close()
 
 
@@ -809,57 +809,20 @@ class ApplicationMainWindow(gtk.Window):
 				elif cmd[0].lower() == "fmt":
 					cmd = cmd[1:]
 					mpos = cmdline.find("*")
-					curpos = doc.lines[doc.curr][0]
 					if mpos == -1:
 						# wrap lines starting from current to provided lengths
-						cmdacc = 0
-						for k in cmd:
-							cmdacc += int(k)
-							if cmdacc + curpos > len(doc.data):
-								cmd = cmd[:k]
-								break
-						doc.fmt_row(doc.curr,cmd)
-						lrow = doc.curr+len(cmd)
+						lrow = doc.fmt_rpt(doc.curr,cmd,1)
 
 					elif mpos == len(cmdline)-1:
 						# repeat wrapping till end
-						print "Rpt to end"
 						cmd = cmdline[4:mpos].split()
-						cmdacc = 0
-						rpt = 0
-						for k in cmd:
-							cmdacc += int(k)
-							if cmdacc + curpos > len(doc.data):
-								cmd = cmd[:k]
-								rpt = 1
-								break
-						if rpt == 0:
-							rpt = 1+(doc.lines[len(doc.lines)-1][0]-doc.lines[doc.curr][0])/cmdacc
-						for i in range(rpt):
-							doc.fmt_row(doc.curr+i*len(cmd),cmd)
-
-						lrow = doc.curr+i*len(cmd)
-						
+						lrow = doc.fmt_rpt(doc.curr,cmd)
+
 					else:
+						#repeat wrapping last arg times
 						cmd = cmdline[4:mpos].split()
 						rpt = int(cmdline[mpos+1:].strip())
-						cmdacc = 0
-						for k in cmd:
-							cmdacc += int(k)
-							if cmdacc + curpos > len(doc.data):
-								cmd = cmd[:k]
-								rpt = 1
-								break
-								
-						if cmdacc*rpt > doc.lines[len(doc.lines)-1][0]-doc.lines[doc.curr][0]:
-							rpt = 1+(doc.lines[len(doc.lines)-1][0]-doc.lines[doc.curr][0])/cmdacc
-
-						#repeat wrapping last arg times
-						print "Rpt",rpt,"times",cmd
-						for i in range(rpt):
-							doc.fmt_row(doc.curr+i*len(cmd),cmd)
-
-						lrow = doc.curr+i*len(cmd)+1
+						lrow = doc.fmt_rpt(doc.curr,cmd,rpt)
 
 					doc.hvlines[lrow] = ""
 					doc.set_maxaddr()
@@ -946,7 +909,7 @@ class ApplicationMainWindow(gtk.Window):
 					fname = self.file_open('Save',None,gtk.FILE_CHOOSER_ACTION_SAVE)
 					if fname:
 						f = open(fname,'wb')
-						f.write(doc.data)
+						f.write(str(doc.data))
 						f.close()
 					else:
 						print "Nothing to save"
@@ -18,6 +18,7 @@ import gtk
 import cairo
 import struct
 import utils, cli
+from bisect import bisect_left
 
 clrs = {}
 clrs[1] = (1,0.5,0.5)
@@ -101,11 +102,11 @@ class HexView():
 		self.tdx = -1				# width of one glyph
 		self.tht = 0				# height of one glyph
 		self.numtl = 0				# number of lines
-		self.lines = lines			# offsets of lines in dump (offset,mode,comment idx)
+		self.lines = utils.LineTable(lines)	# offsets of lines in dump (offset,mode,comment idx)
 		self.comments = comments	# hash of offset:Comment()
 		self.cmntlines = {}			# to cache lines with comments 
 		self.maxaddr = 16			# current length of the longest line
-		self.hvlines = []			# cached text of lines
+		self.hvlines = utils.BList()	# cached text of lines
 		self.selr = None
 		self.selc = None
 		self.drag = 0				# flag to track if we drag something
@@ -159,8 +160,7 @@ class HexView():
 		if lines == []:
 			self.init_lines()		# init as a standard "all 0x10 wide" lines
 		else:
-			for i in range(len(lines)):
-				self.hvlines.append("")
+			self.hvlines.reset([""]*len(lines))
 			self.set_maxaddr()
 
 	def on_clr_button(self,action):
@@ -263,17 +263,19 @@ class HexView():
 		pos = self.lines[self.curr][0]+self.curc
 		v = ord(self.data[pos])
 		self.modified = 1
+		if not isinstance(self.data,utils.PieceTable):
+			self.data = utils.PieceTable(self.data)
 		if self.edpos == 0:
 			v1 = self.edmap[event.keyval]*16+(v&0xF)
 			self.edpos = 1
-			self.data = self.data[:pos]+chr(v1)+self.data[pos+1:]
+			self.data.replace(pos,chr(v1))
 			self.hvlines[self.curr] = ""
 			self.get_string(self.curr)
 			self.exposed = 1
 		else:
 			v1 = (v&0xF0)+self.edmap[event.keyval]
 			self.edpos = 0
-			self.data = self.data[:pos]+chr(v1)+self.data[pos+1:]
+			self.data.replace(pos,chr(v1))
 			self.hvlines[self.curr] = ""
 			self.get_string(self.curr)
 			self.okp_right(event)
@@ -549,17 +551,10 @@ class HexView():
 
 	def init_lines(self):
 		# set initial line lengths
-		if len(self.data) > 15:
-			for i in range(len(self.data)/16):
-				self.lines.append((i*16,0))
-				self.hvlines.append("")
-			if len(self.data)%16 > 0:
-				self.lines.append((i*16+16,0))
-				self.hvlines.append("")
-		else:
-			self.lines.append((0,0))
-			self.hvlines.append("")
-		self.lines.append((len(self.data),0))
+		lines = [(i,0) for i in range(0,len(self.data),16)] or [(0,0)]
+		self.hvlines.reset([""]*len(lines))
+		lines.append((len(self.data),0))
+		self.lines.reset(lines)
 
 
 	def init_config(self): # redefine UI/behaviour options from file
@@ -589,11 +584,7 @@ class HexView():
 
 	def set_maxaddr (self):
 		# check and update maxaddr to the value of the longest line
-		ma = 16
-		for i in range(len(self.lines)-1):
-			ta = self.lines[i+1][0]-self.lines[i][0]
-			if ta > ma:
-				ma = ta
+		ma = max(16,self.lines.max_size())
 		if ma < 1000:
 			self.maxaddr = ma
 		else:
@@ -880,6 +871,61 @@ class HexView():
 			if rs > int(cmd[i]):
 				self.break_line(row+i,int(cmd[i])-1)
 
+	def fmt_styles(self,old,new):
+		# separators as fmt_row leaves them: a row keeps the entry of the line
+		# it starts at, attached lines lose theirs and a broken row passes its
+		# style on to the tail; 'old' ends with the line after the wrapped part
+		olds = [l[0] for l in old]
+		starts = [l[0] for l in new]
+		for cur in [l for l in old[:-1] if l[1] or len(l) > 2]:
+			k = bisect_left(starts,cur[0])
+			if k == len(starts) or starts[k] != cur[0]:
+				# attached to the row before
+				continue
+			while 1:
+				if k+1 < len(new):
+					e = starts[k+1]
+				else:
+					e = olds[-1]
+				if olds[bisect_left(olds,e)] == e:
+					new[k] = cur
+					break
+				# broken at 'e'
+				if cur[1] > 0:
+					new[k] = (starts[k],0,None)
+				else:
+					new[k] = cur
+				if not cur[1]:
+					break
+				cur = (e,cur[1])
+				k += 1
+
+	def fmt_rpt(self,row,cmd,rpt=None):
+		# wrap lines from 'row' to lengths from 'cmd' repeated 'rpt' times
+		# (till the end of data if None) in one go; returns the last wrapped row
+		cmd = [int(k) for k in cmd if int(k) > 0]
+		if not cmd:
+			return row
+		base = self.lines[row][0]
+		end = len(self.data)
+		plen = sum(cmd)
+		if rpt == None or base+plen*rpt >= end:
+			rpt = (end-base)/plen+1
+			stop = end
+		else:
+			stop = base+plen*rpt
+		if stop < end:
+			# the line after the wrapped part starts at 'stop'
+			last = self.lines.find(stop)+1
+		else:
+			last = len(self.lines)-1
+		offs,sizes = utils.pattern_lines(base,cmd,rpt,stop,self.lines[last][0])
+		new = zip(offs,[0]*len(offs))
+		self.fmt_styles(self.lines[row:last+1],new)
+		self.lines.splice(row,last,new,sizes)
+		self.hvlines.splice(row,last,[""]*len(offs))
+		return row+len(offs)-1
+
 	def fmt(self,row,col):
 		self.fmt_row(row, col)
 		if row < len(self.hvlines)-1:
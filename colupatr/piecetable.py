@@ -0,0 +1 @@
+../oletoy/piecetable.py
\ No newline at end of file
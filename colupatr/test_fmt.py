@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import os
+import random
+import unittest
+
+import hexview
+
+class FmtTest(unittest.TestCase):
+	def old_fmt(self, hv, row, cmd, rpt):
+		# what fmt did before fmt_rpt: fmt_row once per repetition
+		cmdacc = sum(map(int, cmd))
+		last = hv.lines[len(hv.lines)-1][0]
+		if rpt == None or cmdacc*rpt > last-hv.lines[row][0]:
+			rpt = 1+(last-hv.lines[row][0])/cmdacc
+		for i in range(rpt):
+			hv.fmt_row(row+i*len(cmd), cmd)
+
+	def test_against_fmt_row(self):
+		rnd = random.Random(25)
+		for t in range(300):
+			data = os.urandom(rnd.randint(20, 3000))
+			a = hexview.HexView(data)
+			b = hexview.HexView(data)
+			pre = [rnd.randint(1, 20) for i in range(rnd.randint(0, 10))]
+			a.fmt_row(0, pre)
+			b.fmt_row(0, pre)
+			# separators and comments on the lines being wrapped
+			for i in range(len(a.lines)-1):
+				r = rnd.random()
+				if r < .3:
+					l = (a.lines[i][0], rnd.randint(1, 3))
+				elif r < .35:
+					l = (a.lines[i][0], rnd.randint(0, 2), "note")
+				else:
+					continue
+				a.lines[i] = l
+				b.lines[i] = l
+			row = rnd.randint(0, len(a.lines)-2)
+			cmd = [str(rnd.randint(1, 30)) for i in range(rnd.randint(1, 4))]
+			rpt = rnd.choice((None, 1, rnd.randint(1, 20)))
+			self.old_fmt(a, row, cmd, rpt)
+			b.fmt_rpt(row, cmd, rpt)
+			self.assertEqual(list(a.lines), list(b.lines))
+			self.assertEqual(len(a.hvlines), len(b.hvlines))
+
+if __name__ == '__main__':
+	unittest.main()
+
+# vim: set ft=python ts=4 sw=4 noet:
@@ -14,8 +14,14 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
 # USA
 
-import struct
+import sys,struct
 import gtk, gobject
+from bisect import bisect_left, bisect_right
+from piecetable import PieceTable
+try:
+	import numpy
+except ImportError:
+	numpy = None
 
 def hex2d(data):
 	res = ''
@@ -41,26 +47,249 @@ def arg_conv (ctype,carg):
 		data = carg
 	return data
 
+class BList(object):
+	# list kept in chunks of up to 2*chunk items; a Fenwick tree over the chunk
+	# sizes finds the chunk of an index, so insert/pop in the middle do not
+	# move the whole list
+	chunk = 512
+
+	def __init__(self, items=()):
+		self.chunks = []
+		self.reset(list(items))
+
+	def reset(self, items):
+		ch = self.chunk
+		self.chunks = [items[i:i+ch] for i in range(0,len(items),ch)]
+		self.size = len(items)
+		self.rebuild()
+
+	def rebuild(self, keep=None):
+		# Fenwick tree of chunk sizes; called when the chunk list changes,
+		# 'keep' is (first,end,num) if only chunks first..end-1 were replaced by num new ones
+		n = len(self.chunks)
+		tree = [0]*(n+1)
+		for i in range(n):
+			tree[i+1] += len(self.chunks[i])
+			j = i+1 + ((i+1) & -(i+1))
+			if j <= n:
+				tree[j] += tree[i+1]
+		self.tree = tree
+		self.top = 1
+		while self.top*2 <= n:
+			self.top *= 2
+
+	def add_count(self, c, d):
+		c += 1
+		while c < len(self.tree):
+			self.tree[c] += d
+			c += c & -c
+
+	def chunk_start(self, c):
+		# number of items in chunks before 'c'
+		s = 0
+		while c > 0:
+			s += self.tree[c]
+			c -= c & -c
+		return s
+
+	def locate(self, i):
+		# chunk holding index 'i' and the position inside of it
+		if i < 0:
+			i += self.size
+		if i < 0 or i >= self.size:
+			raise IndexError("BList index out of range")
+		c = 0
+		step = self.top
+		while step:
+			if c+step < len(self.tree) and self.tree[c+step] <= i:
+				c += step
+				i -= self.tree[c]
+			step /= 2
+		return c,i
+
+	def __len__(self):
+		return self.size
+
+	def __iter__(self):
+		for ch in self.chunks:
+			for v in ch:
+				yield v
+
+	def __getitem__(self, i):
+		if isinstance(i,slice):
+			start,stop,step = i.indices(self.size)
+			if step != 1:
+				return list(self)[i]
+			res = []
+			if start < stop:
+				c,j = self.locate(start)
+				while len(res) < stop-start:
+					res.extend(self.chunks[c][j:j+stop-start-len(res)])
+					c += 1
+					j = 0
+			return res
+		c,j = self.locate(i)
+		return self.chunks[c][j]
+
+	def __getslice__(self, i, j):
+		return self.__getitem__(slice(max(i,0),max(j,0)))
+
+	def __setitem__(self, i, v):
+		c,j = self.locate(i)
+		self.chunks[c][j] = v
+		self.changed(c)
+
+	def insert(self, i, v):
+		if i < 0:
+			i = max(i+self.size,0)
+		if i >= self.size:
+			self.append(v)
+			return
+		c,j = self.locate(i)
+		self.chunks[c].insert(j,v)
+		self.size += 1
+		if len(self.chunks[c]) > 2*self.chunk:
+			ch = self.chunks[c]
+			self.chunks[c:c+1] = [ch[:self.chunk],ch[self.chunk:]]
+			self.rebuild((c,c+1,2))
+		else:
+			self.add_count(c,1)
+		self.changed(c)
+
+	def append(self, v):
+		if not self.chunks or len(self.chunks[-1]) >= 2*self.chunk:
+			self.chunks.append([v])
+			self.size += 1
+			self.rebuild((len(self.chunks)-1,len(self.chunks)-1,1))
+		else:
+			self.chunks[-1].append(v)
+			self.size += 1
+			self.add_count(len(self.chunks)-1,1)
+		self.changed(len(self.chunks)-1)
+
+	def pop(self, i=-1):
+		c,j = self.locate(i)
+		v = self.chunks[c].pop(j)
+		self.size -= 1
+		if self.chunks[c]:
+			self.add_count(c,-1)
+			self.changed(c)
+		else:
+			del self.chunks[c]
+			self.rebuild((c,c+1,0))
+		return v
+
+	def splice(self, i, j, items):
+		# replace items i..j-1 with 'items' at once;
+		# returns the first new chunk and the old items put before 'items' in it
+		i = min(max(i,0),self.size)
+		j = min(max(j,i),self.size)
+		if i < self.size:
+			c0,k0 = self.locate(i)
+		else:
+			c0,k0 = len(self.chunks),0
+		if j < self.size:
+			c1,k1 = self.locate(j)
+		else:
+			c1,k1 = len(self.chunks),0
+		new = list(items)
+		head = []
+		if k0:
+			head = self.chunks[c0][:k0]
+			new = head + new
+		if c1 < len(self.chunks):
+			new += self.chunks[c1][k1:]
+			c1 += 1
+		ch = self.chunk
+		new = [new[k:k+ch] for k in range(0,len(new),ch)]
+		self.chunks[c0:c1] = new
+		self.size += len(items) - (j-i)
+		self.rebuild((c0,c1,len(new)))
+		return c0,head
+
+	def changed(self, c):
+		pass
+
+
+class LineTable(BList):
+	# offsets of lines as (offset,style) tuples, the last one is the end of data;
+	# offsets are increasing, so the row of an address is a bisect
+	def rebuild(self, keep=None):
+		BList.rebuild(self)
+		self.firsts = [ch[0][0] for ch in self.chunks]
+		if keep:
+			# lengths of untouched chunks are still good
+			first,end,num = keep
+			self.maxes[first:end] = [None]*num
+		else:
+			self.maxes = [None]*len(self.chunks)
+
+	def changed(self, c):
+		self.firsts[c] = self.chunks[c][0][0]
+		self.maxes[c] = None
+
+	def splice(self, i, j, items, sizes=None):
+		# 'sizes' are lengths of the new lines (up to the line after each one),
+		# if known the longest lines of the new chunks are taken from them
+		c0,head = BList.splice(self, i, j, items)
+		if sizes != None and items:
+			gaps = [b[0]-a[0] for a,b in zip(head,head[1:])]
+			if head:
+				gaps.append(items[0][0]-head[-1][0])
+			gaps += sizes
+			# gaps[g] is the length of line g of the new chunks
+			c = c0
+			g = 0
+			while c < len(self.chunks) and g < len(gaps):
+				e = g+len(self.chunks[c])-1
+				if e <= len(gaps):
+					self.maxes[c] = max(gaps[g:e] or [0])
+				g += len(self.chunks[c])
+				c += 1
+		return c0,head
+
+	def find(self, addr):
+		# row holding 'addr' or None if it is at or after the end of data
+		if not self.size or addr >= self.chunks[-1][-1][0]:
+			return None
+		c = max(bisect_right(self.firsts,addr)-1,0)
+		return self.chunk_start(c) + max(bisect_right(self.chunks[c],(addr,sys.maxint))-1,0)
+
+	def max_size(self):
+		# length of the longest line
+		ma = 0
+		for c in range(len(self.chunks)):
+			ch = self.chunks[c]
+			if self.maxes[c] == None:
+				self.maxes[c] = max([0]+[b[0]-a[0] for a,b in zip(ch,ch[1:])])
+			ma = max(ma,self.maxes[c])
+			if c+1 < len(self.chunks):
+				ma = max(ma,self.firsts[c+1]-ch[-1][0])
+		return ma
+
+def pattern_lines(start,pattern,rpt,stop,end):
+	# offsets and lengths of lines with lengths from 'pattern' repeated 'rpt'
+	# times from 'start'; lines are cut at 'stop', the next one starts at 'end'
+	if numpy != None:
+		offs = numpy.cumsum(numpy.tile(numpy.array(pattern,dtype=numpy.int64),rpt))
+		offs = numpy.concatenate(([start],offs[:-1]+start))
+		offs = offs[:numpy.searchsorted(offs,stop)]
+		if stop < end:
+			offs = numpy.append(offs,stop)
+		sizes = numpy.diff(numpy.append(offs,end))
+		return offs.tolist(),sizes.tolist()
+	plen = sum(pattern)
+	prefix = [0]
+	for p in pattern[:-1]:
+		prefix.append(prefix[-1]+p)
+	offs = [start+i*plen+p for i in xrange(rpt) for p in prefix]
+	offs = offs[:bisect_left(offs,stop)]
+	if stop < end:
+		offs.append(stop)
+	return offs,[b-a for a,b in zip(offs,offs[1:]+[end])]
+
 def find_line (doc,addr):
-	if addr < doc.lines[len(doc.lines)-1][0]:
-		lno = 0
-		lnum = addr/16
-		while lnum < len(doc.lines) and lno != lnum:
-			lno = lnum
-			if doc.lines[lnum][0] < addr:
-				if doc.lines[lnum+1][0] > addr:
-					break
-				elif doc.lines[lnum+1][0] == addr:
-					lnum += 1
-				else:
-					lnum += (addr - doc.lines[lnum+1][0])/16
-			elif  doc.lines[lnum][0] == addr:
-				break
-			else:
-				lnum -= (doc.lines[lnum][0] - addr)/16
-			if lnum < 0:
-				break
-		return lnum
+	return doc.lines.find(addr)
 
 
 def cmd_parse(cmd, app,doc):
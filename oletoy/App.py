@@ -16,28 +16,433 @@
 
 import sys,struct,os
 import re
-import tree, gtk
-import ole,mf,svm,cdr,clp,cpl
-import rx2,fh,fh12,mdb,cpt,cdw,pkzip,wld,vsd,yep
-import abr,rtf,otxml,chdraw,vfb,fbx,nki,pngot
-import drw
-import qxp
-import iwa
-import lrf
-import palm
-import sbimp
-import zmf
-import zbr
-import lit
-import plist
-import c602
-import t602
-import bmi
-import quattro_wq
+import mmap
+import nodes
+import pcache
+import log
+import palm # its record types are in the signature table
 from utils import *
 
+# parsers are imported when a file of their format is opened
+lazy_import("""ole mf svm cdr clp cpl rx2 fh fh12 mdb cpt cdw pkzip wld vsd yep
+	abr rtf otxml chdraw vfb fbx nki pngot drw qxp iwa lrf sbimp zmf zbr lit
+	plist c602 t602 bmi quattro_wq""", globals())
+
+# files of this size or bigger are memory-mapped instead of being read in
+mmap_size = 32*1024*1024
+# signatures that need to search the file look only at this many bytes
+scan_limit = 64*1024*1024
+# sniff() searches only this many bytes
+sniff_size = 64*1024
+# GUI pages keep records in a node tree shown through tree.NodeModel
+nodeview = False
+# directory of the parse cache, None to parse every time
+cache_dir = None
+# bytes kept in the parse cache, least recently used entries go first
+cache_limit = 256*1024*1024
+
+def read_file(fname):
+	# large files are mapped read-only; slices of the map are plain strings,
+	# so parsers page in only the parts they look at
+	f = open(fname,"rb")
+	try:
+		if os.fstat(f.fileno()).st_size >= mmap_size:
+			return mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+		return f.read()
+	finally:
+		f.close()
+
+def open_qxp(page, buf, parent, package):
+	page.type = qxp.open(page, buf, parent)
+
+def open_png(page, buf, parent, package):
+	page.type = pngot.open(page, buf, parent)
+
+def open_vfb(page, buf, parent, package):
+	page.type = vfb.open(page, buf, parent)
+
+def open_xml(page, buf, parent, package):
+	page.type = otxml.open(buf[:], page, parent)
+
+def open_cpt(page, buf, parent, package):
+	page.type = cpt.open(buf, page, parent)
+
+def open_chdraw(page, buf, parent, package):
+	page.type = chdraw.open(page, buf, parent)
+
+def open_yep(page, buf, parent, package):
+	page.type = yep.parse(page, buf, parent)
+
+def open_ppi(page, buf, parent, package):
+	page.type = yep.parse_ppi(page, buf, parent)
+
+def open_rtf(page, buf, parent, package):
+	page.type = rtf.open(buf, page, parent)
+
+def open_ole(page, buf, parent, package):
+	page.type = ole.ole_open(buf, page, parent)
+
+def open_vsd(page, buf, parent, package):
+	page.type = vsd.parse(page, buf, parent)
+
+def open_clp(page, buf, parent, package):
+	page.type = "CLP"
+	clp.open(buf, page, parent)
+
+def open_svm(page, buf, parent, package):
+	page.type = "SVM"
+	svm.open(buf, page, parent)
+
+def open_nki(page, buf, parent, package):
+	nki.open(page, buf, parent)
+
+def open_cdr(page, buf, parent, package):
+	page.type = "CDR%x"%(ord(buf[11])-0x30)
+	print 'Probably CDR',
+	cdr.cdr_open(buf, page, parent)
+	print page.version
+
+def open_cmx(page, buf, parent, package):
+	page.type = "CMX"
+	cdr.cdr_open(buf, page, parent, "cmx")
+
+def open_wld(page, buf, parent, package):
+	page.type = "CDR2"
+	wld.open(buf, page, parent)
+
+def open_cpl(page, buf, parent, package):
+	page.type = "CPL"
+	cpl.open(buf, page, parent)
+
+def open_bgr(page, buf, parent, package):
+	page.type = "BGR"
+	abr.abr_open(buf, page, parent, "bgr")
+
+def open_abr(page, buf, parent, package):
+	page.type = "ABR"
+	abr.abr_open(buf, page, parent, "abr")
+
+def open_apwmf(page, buf, parent, package):
+	page.type = "APWMF"
+	mf.mf_open(buf, page, parent)
+	print "Aldus Placeable WMF"
+
+def open_lrf(page, buf, parent, package):
+	page.type = "LRF"
+	lrf.open(buf, page, parent)
+	print "LRF"
+
+def open_wmf(page, buf, parent, package):
+	page.type = "WMF"
+	print "Probably WMF"
+	mf.mf_open(buf, page, parent)
+
+def open_emf(page, buf, parent, package):
+	page.type = "EMF"
+	print "Probably EMF"
+	mf.mf_open(buf, page, parent)
+
+def open_cdw(page, buf, parent, package):
+	page.type = "CDW"
+	print "Probably CDW"
+	cdw.open(buf, page, parent)
+
+def open_rex2(page, buf, parent, package):
+	page.type = "REX2"
+	print "Probably REX2"
+	rx2.open(buf, page, parent)
+
+def open_fbx(page, buf, parent, package):
+	page.type = "FBX"
+	print "Probably FBX"
+	fbx.open(buf, page, parent)
+
+def open_mdb(page, buf, parent, package):
+	page.type = "MDB"
+	print "Probably MDB"
+	mdb.parse(buf, page, parent)
+
+def open_pkzip(page, buf, parent, package):
+	page.type = "PKZIP"
+	print "Probably PK-ZIP"
+	pkzip.open(page.fname, page, parent)
+
+def open_palm(page, buf, parent, package):
+	page.type = "PALM"
+	print "Probably Palm e-book"
+	palm.open(buf, page, parent, buf[0x3c:0x44])
+
+def open_imp(page, buf, parent, package):
+	page.type = 'IMP'
+	print 'Probably SoftBook e-book'
+	sbimp.open(buf, page, parent)
+
+def open_lit(page, buf, parent, package):
+	page.type = 'LIT'
+	print 'Probably LIT'
+	lit.open(buf, page, parent)
+
+def open_plist(page, buf, parent, package):
+	page.type = 'PLIST'
+	print 'Probably PLIST'
+	plist.open(buf, page, parent)
+
+def open_fh(page, buf, parent, package):
+	try:
+		page.type = "FH"
+		print "Probably Freehand"
+		fh.fh_open(buf, page)
+	except:
+		print "Check for Freehand failed..."
+		return False
+
+def open_fh9(page, buf, parent, package):
+	try:
+		page.type = "FH"
+		print "Probably Freehand 9+"
+		fh.fh_open(buf, page, parent)
+	except:
+		print "Check for Freehand 9+ failed..."
+		return False
+
+def open_fh12(page, buf, parent, package):
+	page.type = "FH12"
+	fh12.fh_open(buf, page, parent, 0)
+
+def open_fh4(page, buf, parent, package):
+	try:
+		page.type = "FH"
+		print "Probably Freehand <5"
+		fh.fh_open(buf, page, parent, 0)
+	except:
+		print "Check for Freehand <5 failed..."
+		return False
+
+def open_zmf(page, buf, parent, package):
+	page.type = 'ZMF'
+	print 'Probably Zoner Draw 4+'
+	zmf.zmf4_open(buf, page, parent)
+
+def open_zbr(page, buf, parent, package):
+	page.type = 'ZBR'
+	print 'Probably Zebra Metafile'
+	zbr.open(buf, page, parent)
+
+def open_bmi(page, buf, parent, package):
+	page.type = 'BMI'
+	print 'Probably Zoner Bitmap'
+	bmi.open(buf, page, parent)
+
+def open_iwa(page, buf, parent, package):
+	page.type = 'IWA'
+	if not page.subtype:
+		page.subtype = iwa.detect(package)
+	print('Probably Apple iWork file')
+	iwa.open(buf, page, parent, page.subtype)
+
+def open_c602(page, buf, parent, package):
+	page.type = 'C602'
+	print('Probably C602 file')
+	if buf[0x1c] == 'T':
+		c602.parse_spreadsheet(buf, page, parent)
+	else:
+		c602.parse_chart(buf, page, parent)
+
+def open_t602(page, buf, parent, package):
+	page.type = 'T602'
+	print('Probably T602 file')
+	t602.parse(buf, page, parent)
+
+def open_quwq(page, buf, parent, package):
+	page.type = 'QUWQ'
+	print('Probably Quattro Wq file')
+	quattro_wq.wq_open(page, buf, parent)
+
+def open_qxp1(page, buf, parent, package):
+	# QuarkXPress 1.x data fork
+	try:
+		qxp.open_v1(page, buf, parent)
+		page.type = 'QXP5'
+	except:
+		print "Failed after attempt to parse as QXP1..."
+		return False
+
+open_ids = {"QXP":open_qxp, "PNG":open_png, "VFB":open_vfb, "XML":open_xml,
+	"CPT":open_cpt, "CHDRAW":open_chdraw, "YEP":open_yep, "PPI":open_ppi,
+	"RTF":open_rtf, "OLE":open_ole, "VSD":open_vsd, "CLP":open_clp,
+	"SVM":open_svm, "NKI":open_nki, "CDR":open_cdr, "CMX":open_cmx,
+	"CDR2":open_wld, "CPL":open_cpl, "BGR":open_bgr, "ABR":open_abr,
+	"APWMF":open_apwmf, "LRF":open_lrf, "WMF":open_wmf, "EMF":open_emf,
+	"CDW":open_cdw, "REX2":open_rex2, "FBX":open_fbx, "MDB":open_mdb,
+	"PKZIP":open_pkzip, "PALM":open_palm, "IMP":open_imp, "LIT":open_lit,
+	"PLIST":open_plist, "FH":open_fh, "FH9":open_fh9, "FH12":open_fh12,
+	"FH4":open_fh4, "ZMF":open_zmf, "ZBR":open_zbr, "BMI":open_bmi,
+	"IWA":open_iwa, "C602":open_c602, "T602":open_t602, "QUWQ":open_quwq,
+	"QXP1":open_qxp1}
+
+def is_rtf(buf):
+	return buf[0:5].lower() == "{\\rtf"
+
+def is_cdr(buf):
+	return buf[8:11].lower() == "cdr"
+
+def is_cmx(buf):
+	return buf[8:11] == "CMX"
+
+def is_cdw(buf):
+	return buf[2:3] not in ("", "\x00")
+
+def is_rex2(buf):
+	return buf[0x8:0xc] == "REX2"
+
+def is_zbr(buf):
+	return buf[2:4] in ['\01\0', '\02\0', '\03\0', '\04\0']
+
+def is_iwa(buf):
+	if len(buf) < 3:
+		return False
+	size = (ord(buf[1]) | (ord(buf[2]) << 8)) + 4
+	return size == len(buf) or (size < len(buf) and buf[4:7] == "\x80\x80\x04")
+
+def is_c602(buf):
+	return buf[0x1c:0x24] == 'Tabulka\x1a' or buf[0x1c:0x21] == 'Graf\x1a'
+
+def is_t602(buf):
+	# the first line is enough for the match
+	return buf[-1:] == '\x1a' and re.match('@[A-Z]{2} .*?\\r\\n', buf[:0x1000]) != None
+
+def is_quwq(buf):
+	return buf[4:5] in ('\x20', '\x21') and buf[5:6] == '\x51'
+
+def is_fh9(buf):
+	# 'FreeHand' followed by the first 'AGD' somewhere in the file
+	fh_off = buf.find('FreeHand', 0, min(len(buf), scan_limit))
+	if fh_off == -1:
+		return False
+	return buf.find('AGD', 0, min(len(buf), scan_limit)) > fh_off
+
+def is_fh4(buf):
+	return buf.find('FHDocHeader', 0, min(len(buf), scan_limit)) != -1
+
+# probes that search the file instead of looking at a header window
+scans = (is_fh9, is_fh4)
+
+# (offset, magic, probe, confidence, type)
+# magic is compared with the bytes at offset, probe (if any) gets the buffer
+# and has to confirm; signatures without magic are checked by probe only.
+# Matches come in the order of the table, which is the order the formats
+# were tried in before; confidence is only reported.
+signatures = [
+	(0, "\0\0IIXPR", None, 100, "QXP"),
+	(0, "\0\0MMXPR", None, 100, "QXP"),
+	(0, "\x89PNG\x0d\x0a\x1a\x0a", None, 100, "PNG"),
+	(0, "\x1aWLF10", None, 100, "VFB"),
+	(0, "<?xml ", None, 100, "XML"),
+	(0, "\xff\xfe<\0?\0x\0m\0l\0 \0", None, 100, "XML"),
+	(0, "\xfe\xff\0<\0?\0x\0m\0l\0 ", None, 100, "XML"),
+	(0, "CPT9FILE", None, 100, "CPT"),
+	(0, "VjCD0100", None, 100, "CHDRAW"),
+	(0, "EVHD", None, 90, "YEP"),
+	(0, "XPIH", None, 90, "PPI"),
+	(0, None, is_rtf, 90, "RTF"),
+	(0, "\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", None, 100, "OLE"),
+	(0, "Visio (TM) Drawing", None, 100, "VSD"),
+	(0, "\x50\xc3", None, 50, "CLP"),
+	(0, "VCLMTF", None, 100, "SVM"),
+	(0, "\x12\x90\xa8\x7f", None, 90, "NKI"),
+	(0, "RIFF", is_cdr, 100, "CDR"),
+	(0, "RIFF", is_cmx, 100, "CMX"),
+	(0, "WL", None, 50, "CDR2"),
+	(0, "\xcc\xdc", None, 50, "CPL"),
+	(0, "8BGR", None, 90, "BGR"),
+	(4, "8BIM", None, 90, "ABR"),
+	(0, "\xd7\xcd\xc6\x9a", None, 90, "APWMF"),
+	(0, "\x4c\x00\x52\x00\x46\x00\x00\x00", None, 100, "LRF"),
+	(0, "\x01\x00\x09\x00\x00\x03", None, 100, "WMF"),
+	(40, "\x20\x45\x4d\x46", None, 90, "EMF"),
+	(0, "KF", is_cdw, 60, "CDW"),
+	(0, "CAT ", is_rex2, 100, "REX2"),
+	(0, "Kaydara FBX Binary  ", None, 100, "FBX"),
+	(4, "Standard Jet DB", None, 100, "MDB"),
+	(4, "Standard ACE DB", None, 100, "MDB"),
+	(0, "\x50\x4b\x03\x04", None, 90, "PKZIP"),
+	] + [(0x3c, t, None, 100, "PALM") for t in palm.palm_types.keys()] + [
+	(2, "BOOKDOUG", None, 100, "IMP"),
+	(0, "ITOLITLS", None, 100, "LIT"),
+	(0, "bplist", None, 100, "PLIST"),
+	(0, "AGD", None, 60, "FH"),
+	(0, None, is_fh9, 20, "FH9"),
+	(0, "FHD2", None, 90, "FH12"),
+	(0, "acf3", None, 90, "FH12"),
+	(0, "FH", is_fh4, 20, "FH4"),
+	(8, "xV4", None, 60, "ZMF"),
+	(0, "\x9a\x02", is_zbr, 60, "ZBR"),
+	(0, "ZonerBMIa", None, 100, "BMI"),
+	(0, "\0", is_iwa, 60, "IWA"),
+	(0, "Software602\r\nCalc602 v.", is_c602, 100, "C602"),
+	(0, "@", is_t602, 60, "T602"),
+	(0, "\0\0\x02\0", is_quwq, 60, "QUWQ"),
+	(0, "\x00\x1c\x00\x1c", None, 60, "QXP1"),
+	(0, "\x00\x20\x00\x20", None, 60, "QXP1"),
+]
+
+def compile_signatures(sigs):
+	# group the magics by header window, so every window is sliced once
+	# and looked up in a dict
+	windows = {}
+	probes = []
+	for i in range(len(sigs)):
+		off,magic,probe,conf,ftype = sigs[i]
+		if magic == None:
+			probes.append(i)
+			continue
+		key = (off,len(magic))
+		if not windows.has_key(key):
+			windows[key] = {}
+		windows[key].setdefault(magic,[]).append(i)
+	return windows.items(),probes
+
+sig_table = compile_signatures(signatures)
+
+def match(buf, limit=None):
+	# the header windows are looked up first; probes run lazily, in table
+	# order, so a search of the file is done only if no earlier signature
+	# was taken. limit cuts the searched part shorter than scan_limit.
+	windows,probes = sig_table
+	found = list(probes)
+	for (off,size),magics in windows:
+		ids = magics.get(buf[off:off+size])
+		if ids:
+			found += ids
+	found.sort()
+	for i in found:
+		probe = signatures[i][2]
+		if probe == None:
+			yield signatures[i]
+		elif probe in scans and limit != None:
+			if probe(buf[:limit]):
+				yield signatures[i]
+		elif probe(buf):
+			yield signatures[i]
+
+def sniff(path):
+	# report the type without parsing: (type, confidence) or None
+	# The file is mapped, not read: the header windows and the last byte
+	# are paged in, the searches look at sniff_size bytes only.
+	f = open(path,"rb")
+	try:
+		if os.fstat(f.fileno()).st_size == 0:
+			buf = ""
+		else:
+			buf = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+	finally:
+		f.close()
+	for sig in match(buf, sniff_size):
+		return sig[4],sig[3]
+	return None
+
 class Page:
-	def __init__(self):
+	def __init__(self,headless=False):
 		self.parent = None
 		self.type = ''
 		self.subtype = None # used by IWA
@@ -56,285 +461,72 @@ class Page:
 		self.wdoc = None  # need to store 'WordDocument' stream
 		self.wtable = None # need to store 'xTable' stream of ms-doc; use for CDRs map of dat-files IDs to names
 		self.wdata = None # need to store 'Data' stream; use for CDR to store iters of "dat" files
-		self.model, self.view, self.scrolled = tree.make_view() #None, None, None
+		if headless:
+			# parse into a plain node tree, no widgets
+			self.model, self.view, self.scrolled = nodes.NodeStore(), None, None
+			self.hd = nodes.Info()
+		else:
+			# headless pages work without PyGTK
+			import tree
+			if nodeview:
+				self.model, self.view, self.scrolled = tree.make_view(tree.NodeModel())
+			else:
+				self.model, self.view, self.scrolled = tree.make_view() #None, None, None
 		self.win = None # for preview
 		self.debug = 0
 		self.appdoc = None
 		self.backpath = None
 		self.cdr18 = False
+		self.headless = headless
+		self.cache = None # (key, file buffer) until the tree is stored in the parse cache
+		self.loading = False # set by parsers that fill the tree from idle callbacks
+		self.loader = None # bgload.Loader while the file is parsed in background
+		self.titles = {} # column titles of the view set by parsers
+
+	def fread(self):
+		return read_file(self.fname)
+
+	def set_title(self, col, title):
+		# headless pages get it when they have a view again
+		self.titles[col] = title
+		if not self.headless:
+			self.set_titles()
+
+	def set_titles(self):
+		if self.view != None:
+			for col,title in self.titles.items():
+				self.view.get_column(col).set_title(title)
+
+	def loaded(self):
+		# the parser is done with the tree
+		if self.loading:
+			return
+		log.summary()
+		if self.cache != None:
+			if pcache.save(self, cache_dir, self.cache[0], self.cache[1]):
+				pcache.prune(cache_dir, cache_limit)
+			self.cache = None
 
 	def fload(self,buf="",parent=None,package=None):
 		self.pname = os.path.split(self.fname)[1]
-		f = None
-		if buf == "":
-			offset = 0
-			f = open(self.fname,"rb")
-			buf = f.read()
-
-		if buf[0:7] == "\0\0IIXPR" or buf[0:7] == "\0\0MMXPR":
-			self.type = qxp.open(self, buf, parent)
-			return 0
-
-		if buf[:8] == "\x89PNG\x0d\x0a\x1a\x0a":
-			self.type = pngot.open(self, buf, parent)
-			return 0
-
-		if buf[0:6] == "\x1aWLF10":
-			self.type = vfb.open(self, buf, parent)
-			return 0
-
-		if buf[0:6] == "<?xml " or buf[0:14] == "\xff\xfe<\0?\0x\0m\0l\0 \0" or buf[0:14] == "\xfe\xff\0<\0?\0x\0m\0l\0 ":
-			self.type = otxml.open(buf, self, parent)
-			return 0
-
-		if buf[0:8] == "CPT9FILE":
-			self.type = cpt.open(buf, self, parent)
-			return 0
-
-		if buf[0:8] == "VjCD0100":
-			self.type = chdraw.open(self, buf, parent)
-			return 0
-
-		if buf[0:4] == "EVHD":
-			self.type = yep.parse(self, buf, parent)
-			return 0
-
-		if buf[0:4] == "XPIH":
-			self.type = yep.parse_ppi(self, buf, parent)
-			return 0
-
-		if buf[0:5].lower() == "{\\rtf":
-			self.type = rtf.open(buf, self, parent)
-			return 0
-
-		if buf[0:8] == "\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
-			self.type = ole.ole_open(buf, self, parent)
-			return 0
-
-		if buf[0:18] == "Visio (TM) Drawing":
-			self.type = vsd.parse(self, buf, parent)
-			return 0
-
-		if buf[0:2] == "\x50\xc3":
-			self.type = "CLP"
-			clp.open (buf,self, parent)
-			return 0
-
-		if buf[0:6] == "VCLMTF":
-			self.type = "SVM"
-			svm.open (buf,self, parent)
-			return 0
-
-		if buf[:4] == "\x12\x90\xa8\x7f":
-			nki.open(self,buf,parent)
-			return 0
-		
-		if buf[0:4] == "RIFF" and buf[8:11].lower() == "cdr":
-			self.type = "CDR%x"%(ord(buf[11])-0x30)
-			print 'Probably CDR',
-			cdr.cdr_open(buf,self, parent)
-			print self.version
-			return 0
-
-		if buf[0:4] == "RIFF" and buf[8:11] == "CMX":
-			self.type = "CMX"
-			cdr.cdr_open(buf,self, parent,"cmx")
-			return 0
-
-		if buf[0:2] == "WL":
-			self.type = "CDR2"
-			wld.open (buf,self, parent)
-			return 0
-
-		if buf[0:2] == "\xcc\xdc":
-			self.type = "CPL"
-			cpl.open (buf,self, parent)
-			return 0
-
-		if buf[0:4] == "8BGR":
-			self.type = "BGR"
-			abr.abr_open(buf,self, parent,"bgr")
-			return 0
-
-		if buf[4:8] == "8BIM":
-			self.type = "ABR"
-			abr.abr_open(buf,self, parent,"abr")
-			return 0
-
-		if buf[0:4] == "\xd7\xcd\xc6\x9a":
-			self.type = "APWMF"
-			mf.mf_open(buf,self, parent)
-			print "Aldus Placeable WMF"
-			return 0
-
-		if buf[0:8] == "\x4c\x00\x52\x00\x46\x00\x00\x00":
-			self.type = "LRF"
-			lrf.open(buf, self, parent)
-			print "LRF"
-			return 0
-
-		if buf[0:6] == "\x01\x00\x09\x00\x00\x03":
-			self.type = "WMF"
-			print "Probably WMF"
-			mf.mf_open(buf,self, parent)
-			return 0
-
-		if buf[40:44] == "\x20\x45\x4d\x46":
-			self.type = "EMF"
-			print "Probably EMF"
-			mf.mf_open(buf,self, parent)
-			return 0
-
-		if buf[0:2] =="KF" and buf[2] != "\x00":
-			self.type = "CDW"
-			print "Probably CDW"
-			cdw.open(buf,self, parent)
-			return 0
-
-		if buf[0:4] == "CAT " and buf[0x8:0xc] == "REX2":
-			self.type = "REX2"
-			print "Probably REX2"
-			rx2.open(buf,self, parent)
-			return 0
-		
-		if buf[0:20] == "Kaydara FBX Binary  ":
-			self.type = "FBX"
-			print "Probably FBX"
-			fbx.open(buf,self, parent)
-			return 0
-		
-		if buf[4:19] == "Standard Jet DB" or buf[4:19] == "Standard ACE DB":
-			self.type = "MDB"
-			print "Probably MDB"
-			mdb.parse (buf,self, parent)
-			return 0
-		
-		if buf[0:4] == "\x50\x4b\x03\x04":
-			self.type = "PKZIP"
-			print "Probably PK-ZIP"
-			if f:
-				f.close()
-			pkzip.open (self.fname,self, parent)
-			return 0
-
-		palmtype = buf[0x3c:0x44]
-		if palmtype in palm.palm_types.keys():
-			self.type = "PALM"
-			print "Probably Palm e-book"
-			palm.open(buf, self, parent, palmtype)
-			return 0
-
-		if buf[2:10] == 'BOOKDOUG':
-			self.type = 'IMP'
-			print 'Probably SoftBook e-book'
-			sbimp.open(buf, self, parent)
-			return 0
-
-		if buf[0:8] == 'ITOLITLS':
-			self.type = 'LIT'
-			print 'Probably LIT'
-			lit.open(buf,self,parent)
-			return 0
-
-		if buf[0:6] == 'bplist':
-			self.type = 'PLIST'
-			print 'Probably PLIST'
-			plist.open(buf,self,parent)
-			return 0
-
-		fh_off = buf.find('FreeHand')
-		if buf[0:3] == 'AGD':
-			agd_off = 0
-			agd_ver = ord(buf[agd_off+3])
-			try:
-				self.type = "FH"
-				print "Probably Freehand"
-				fh.fh_open(buf,self)
-				return 0
-			except:
-				print "Check for Freehand failed..."
-		elif fh_off != -1:
-			agd_off = buf.find('AGD')
-			if agd_off > fh_off:
-				agd_ver = ord(buf[agd_off+3])
-				try:
-					self.type = "FH"
-					print "Probably Freehand 9+"
-					fh.fh_open(buf,self, parent)
+		top = buf == ""
+		if top:
+			buf = self.fread()
+			if cache_dir != None and parent == None:
+				k = pcache.key(buf)
+				if pcache.load(self, cache_dir, k, buf):
+					print "Loaded from parse cache"
+					if not self.headless:
+						self.set_titles()
 					return 0
-				except:
-					print "Check for Freehand 9+ failed..."
-		if buf[0:4] == "FHD2" or buf[0:4] == "acf3":
-			self.type = "FH12"
-			fh12.fh_open(buf, self, parent, 0)
-			return 0
-		if buf[0:2] == "FH":
-			fh_off = buf.find('FHDocHeader')
-			if fh_off != -1:
-				try:
-					self.type = "FH"
-					print "Probably Freehand <5"
-					fh.fh_open(buf, self, parent, 0)
-					return 0
-				except:
-					print "Check for Freehand <5 failed..."
-		if buf[8:11] == 'xV4':
-			self.type = 'ZMF'
-			print 'Probably Zoner Draw 4+'
-			zmf.zmf4_open(buf, self, parent)
-			return 0
-
-		# NOTE: 0x29a is 666 in decimal .-)
-		if buf[0:2] == '\x9a\x02' and buf[2:4] in ['\01\0', '\02\0', '\03\0', '\04\0']:
-			self.type = 'ZBR'
-			print 'Probably Zebra Metafile'
-			zbr.open(buf, self, parent)
-			return 0
-
-		if buf[0:9] == 'ZonerBMIa':
-			self.type = 'BMI'
-			print 'Probably Zoner Bitmap'
-			bmi.open(buf, self, parent)
-			return 0
-
-		size = (ord(buf[1]) | (ord(buf[2]) << 8)) + 4
-		if buf[0] == '\0' and (size == len(buf) or (size < len(buf) and buf[4:7] == "\x80\x80\x04")):
-			self.type = 'IWA'
-			if not self.subtype:
-				self.subtype = iwa.detect(package)
-			print('Probably Apple iWork file')
-			iwa.open(buf, self, parent, self.subtype)
-			return 0
-			
-		if buf[0:0x17] == 'Software602\r\nCalc602 v.' and (buf[0x1c:0x24] == 'Tabulka\x1a' or buf[0x1c:0x21] == 'Graf\x1a'):
-			self.type = 'C602'
-			print('Probably C602 file')
-			if buf[0x1c] == 'T':
-				c602.parse_spreadsheet(buf, self, parent)
-			else:
-				c602.parse_chart(buf, self, parent)
-			return 0
-
-		if re.match('@[A-Z]{2} .*?\\r\\n', buf) and buf[-1] == '\x1a':
-			self.type = 'T602'
-			print('Probably T602 file')
-			t602.parse(buf, self, parent)
-			return 0
-		if buf[0:4] == "\0\0\x02\0":
-			if (buf[4]=='\x20' or buf[4]=='\x21') and buf[5]=='\x51':
-				self.type = 'QUWQ'
-				print('Probably Quattro Wq file')
-				quattro_wq.wq_open(self, buf, parent)
-				return 0
+				self.cache = (k, buf)
 
-		# QuarkXPress 1.x data fork
-		if buf[0:4] == '\x00\x1c\x00\x1c' or buf[0:4] == '\x00\x20\x00\x20':
-			try:
-				qxp.open_v1(self,buf,parent)
-				self.type = 'QXP5'
+		for sig in match(buf):
+			if open_ids[sig[4]](self, buf, parent, package) != False:
+				if top:
+					self.loaded()
 				return 0
-			except:
-				print "Failed after attempt to parse as QXP1..."
+		self.cache = None
 
 		if parent == None:
 			parent = add_pgiter(self, "File", "file","unknown",buf) 
@@ -350,6 +542,7 @@ class Page:
 		return 0
 
 	def show_search(self,carg):
+		import gtk
 		view = gtk.TreeView(self.search)
 		view.set_reorderable(True)
 		view.set_enable_tree_lines(True)
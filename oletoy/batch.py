@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+# Parses a corpus of files without GUI, one process per file, and writes
+# a JSON line per file: detected type, version, record counts, errors.
+
+import sys,os,glob,time,json,select,traceback
+import getopt
+import multiprocessing
+
+import App
+import ole
+import log
+
+def usage():
+	print "Syntax: batch.py [-j jobs] [-t timeout] [-o output.jsonl] [-c cachedir] dir|file|glob ..."
+
+def list_files(args):
+	for a in args:
+		if os.path.isdir(a):
+			for root,dirs,files in os.walk(a):
+				dirs.sort()
+				for f in sorted(files):
+					yield os.path.join(root,f)
+		else:
+			for f in sorted(glob.glob(a)):
+				if os.path.isfile(f):
+					yield f
+
+def parse_file(fname):
+	res = {"file":fname}
+	start = time.time()
+	try:
+		page = App.Page(True)
+		page.fname = fname
+		page.fload()
+		ole.load_all(page)
+		types = {}
+		count = 0
+		for n in page.model.walk():
+			count += 1
+			t = n.ftype
+			if type(t) is tuple:
+				t = t[0]
+			t = str(t)
+			types[t] = types.get(t,0) + 1
+		res["status"] = "ok"
+		res["type"] = page.type
+		res["version"] = page.version
+		res["records"] = count
+		res["types"] = types
+	except:
+		res["status"] = "error"
+		res["error"] = traceback.format_exc()
+	res["time"] = round(time.time()-start,3)
+	return res
+
+def worker(fname,conn):
+	# parsers talk a lot; keep the output for results
+	devnull = os.open(os.devnull,os.O_WRONLY)
+	os.dup2(devnull,1)
+	os.dup2(devnull,2)
+	# nobody reads them
+	log.set_level(log.OFF)
+	conn.send(json.dumps(parse_file(fname),default=repr))
+	conn.close()
+
+def run(files,jobs,timeout,out):
+	files = iter(files)
+	running = {} # fd -> (process, connection, file name, start time)
+	more = True
+	while more or running:
+		while more and len(running) < jobs:
+			try:
+				fname = files.next()
+			except StopIteration:
+				more = False
+				break
+			rconn,wconn = multiprocessing.Pipe(False)
+			p = multiprocessing.Process(target=worker,args=(fname,wconn))
+			p.daemon = True
+			p.start()
+			wconn.close()
+			running[rconn.fileno()] = (p,rconn,fname,time.time())
+		if not running:
+			break
+		ready = select.select(running.keys(),[],[],0.1)[0]
+		now = time.time()
+		for fd in running.keys():
+			p,conn,fname,start = running[fd]
+			line = None
+			if fd in ready:
+				try:
+					line = conn.recv()
+				except EOFError:
+					# died without sending anything
+					p.join()
+					line = json.dumps({"file":fname,"status":"crash","exitcode":p.exitcode,
+						"time":round(now-start,3)})
+			elif now - start > timeout:
+				p.terminate()
+				line = json.dumps({"file":fname,"status":"timeout","time":round(now-start,3)})
+			if line != None:
+				p.join()
+				conn.close()
+				del running[fd]
+				out.write(line+"\n")
+				out.flush()
+
+def main():
+	try:
+		opts,args = getopt.getopt(sys.argv[1:],"j:t:o:c:h")
+	except getopt.GetoptError,e:
+		print e
+		usage()
+		return 1
+	jobs = multiprocessing.cpu_count()
+	timeout = 60.
+	out = sys.stdout
+	for o,v in opts:
+		if o == "-j":
+			jobs = max(1,int(v))
+		elif o == "-t":
+			timeout = float(v)
+		elif o == "-o":
+			out = open(v,"w")
+		elif o == "-c":
+			App.cache_dir = v
+		else:
+			usage()
+			return 0
+	if not args:
+		usage()
+		return 1
+	run(list_files(args),jobs,timeout,out)
+	if out != sys.stdout:
+		out.close()
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
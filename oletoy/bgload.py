@@ -0,0 +1,148 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+
+# Parses a file in a worker thread. The parser fills a private node tree,
+# a timeout on the main loop copies the new rows into the tab's view in
+# batches short enough to keep the window responsive, so the rows parsed
+# so far can be browsed. When the parser is done the view gets the full tree.
+
+import os,time,threading,traceback
+import gtk,gobject
+import nodes,tree,pcache
+from utils import DataView
+
+class Loader():
+	def __init__(self, page, callback=None, interval=100, budget=0.03):
+		self.page = page
+		self.callback = callback # called with the loader on every tick and at the end
+		self.interval = interval # ms between ticks
+		self.budget = budget # seconds spent copying rows per tick
+		self.store = nodes.NodeStore()
+		self.store.added = []
+		self.store.changed = []
+		self.display = tree.NodeModel()
+		self.nmap = {self.store.root:None} # worker node -> display node
+		self.copied = 0
+		self.updated = 0
+		self.size = 0
+		self.consumed = 0
+		self.done = False
+		self.err = 0
+
+	def start(self):
+		page = self.page
+		try:
+			self.size = os.path.getsize(page.fname)
+		except OSError:
+			self.size = 0
+		page.loader = self
+		# parsers check it to not touch widgets or run idle loaders
+		page.headless = True
+		page.model = self.store
+		page.view.set_model(self.display)
+		t = threading.Thread(target=self.run)
+		t.daemon = True
+		t.start()
+		gobject.timeout_add(self.interval,self.tick)
+
+	def run(self):
+		try:
+			self.err = self.page.fload()
+		except nodes.Cancelled:
+			self.err = "Cancelled"
+		except:
+			self.err = traceback.format_exc()
+		self.done = True
+
+	def cancel(self):
+		self.store.cancelled = True
+
+	def fraction(self):
+		# part of the file covered by records seen so far; None if unknown
+		if self.size and self.consumed:
+			return min(1.,float(self.consumed)/self.size)
+		return None
+
+	def copy(self, n):
+		p = n.parent
+		if p == None or not self.nmap.has_key(p):
+			# removed by the parser
+			return
+		# after the nearest copied sibling before it; n.idx may count siblings
+		# that are not copied yet
+		prev = None
+		i = min(n.idx,len(p.children))-1
+		while i >= 0:
+			prev = self.nmap.get(p.children[i])
+			if prev != None:
+				break
+			i -= 1
+		if prev != None:
+			d = self.display.insert_after(self.nmap[p],prev,list(n.row))
+		else:
+			d = self.display.prepend(self.nmap[p],list(n.row))
+		self.nmap[n] = self.display.node(d)
+		data = n.row[3]
+		if isinstance(data,DataView) and len(data.buf) == self.size:
+			self.consumed = max(self.consumed,data.off+data.size)
+
+	def update(self, n):
+		# rows are often filled after the node was added
+		# cleared first, so a row set again meanwhile is taken again
+		n.dirty = False
+		d = self.nmap.get(n)
+		if d == None:
+			return
+		d.row[:] = n.row
+		self.display.row_changed(self.display.store.get_path(d),self.display.tree_iter(d))
+
+	def tick(self):
+		done = self.done
+		if done:
+			self.finish()
+		else:
+			added = self.store.added
+			end = time.time()+self.budget
+			while self.copied < len(added) and time.time() < end:
+				for n in added[self.copied:self.copied+64]:
+					self.copy(n)
+				self.copied = min(self.copied+64,len(added))
+			changed = self.store.changed
+			while self.updated < len(changed) and time.time() < end:
+				for n in changed[self.updated:self.updated+64]:
+					self.update(n)
+				self.updated = min(self.updated+64,len(changed))
+		if self.callback:
+			self.callback(self)
+		return not done
+
+	def finish(self):
+		page = self.page
+		self.store.added = None
+		self.store.changed = None
+		self.nmap = None
+		page.model = tree.NodeModel(self.store)
+		page.view.set_model(page.model)
+		page.headless = False
+		page.loader = None
+		for a,v in page.__dict__.items():
+			if isinstance(v,nodes.NodeStore) and v is not self.store:
+				# side stores made by utils.side_store() while headless
+				store = gtk.TreeStore(*[gobject.type_from_name(t) for t in v.types])
+				pcache.fill(store,pcache.rows(v))
+				setattr(page,a,store)
+		page.set_titles()
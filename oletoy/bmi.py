@@ -16,6 +16,7 @@
 
 import zlib
 
+import handlers
 from utils import add_iter, add_pgiter, rdata, d2hex, key2txt
 
 stream_tags = {
@@ -242,6 +243,11 @@ bmi_ids = {
 	'toc': add_toc,
 }
 
+def hd_callable(hd, size, data, stype):
+	# some rows keep the handler itself as their type
+	if callable(stype):
+		stype(hd, size, data)
+
 def get_size(data):
 	parser = bmi_parser(data)
 	parser.parse_size()
@@ -251,4 +257,7 @@ def open(data, page, parent):
 	parser = bmi_parser(data, page, parent)
 	parser.parse()
 
+handlers.register("bmi", bmi_ids)
+handlers.register_fallback("bmi", hd_callable, ("hd","size","data","stype"))
+
 # vim: set ft=python ts=4 sw=4 noet:
@@ -16,6 +16,7 @@
 
 import datetime
 
+import handlers
 from utils import add_iter, add_pgiter, bflag2txt, key2txt, rdata
 
 tc6_records = {
@@ -603,4 +604,6 @@ def parse_chart(data, page, parent):
 	parser = gc6_parser(page, data, parent)
 	parser.parse()
 
+handlers.register("c602", c602_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
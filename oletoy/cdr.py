@@ -14,11 +14,16 @@
 # USA
 #
 
-import sys,struct,gtk,zlib
-import gobject
+import sys,struct,zlib
+try:
+	import gtk
+except ImportError:
+	# only the previews need it
+	gtk = None
 import icc,cmx
 from utils import *
 import traceback
+import handlers
 ri = {0:"Per", 1:"Rel.clr",2:"Sat",3:"Abs.clr"}
 
 
@@ -2284,100 +2289,114 @@ cdr_ids = {
 	}
 
 
-def collect_cmpr(model,parent,idx):
+class zwriter:
+	# compresses what is written; the compressed pieces are kept in a list
+	def __init__(self):
+		self.z = zlib.compressobj()
+		self.chunks = []
+		self.size = 0
+		self.zsize = 0
+
+	def write(self, data):
+		self.size += len(data)
+		self.add(self.z.compress(data))
+
+	def add(self, zdata):
+		if zdata:
+			self.chunks.append(zdata)
+			self.zsize += len(zdata)
+
+	def close(self):
+		self.add(self.z.flush())
+		return self.chunks
+
+def collect_cmpr(model,parent,write,blocks):
+	# writes the record with its block index in place of the size,
+	# puts the size to blocks and returns it
 	ic = model.iter_n_children(parent)
-	blk = []
-	data = ""
-	cbs = 0
+	idx = len(blocks)
+	blocks.append(0)
 	if ic == 0:
 		t = model.get_value(parent,1)[1]
-		d = model.get_value(parent,3)
-		data = t + struct.pack("<I",idx)+d
-		blksize = len(data)-8
-		if len(data) & 1:
-			data += "\x00"
-		blk.append(blksize)
-		idx += 1
+		d = str(model.get_value(parent,3))
+		write(t + struct.pack("<I",idx))
+		write(d)
+		if len(d) & 1:
+			write("\x00")
+		blksize = len(d)
 	else:
-		data = "LIST"+struct.pack("<I",idx)+model.get_value(parent,0)
-		idx += 1
+		write("LIST"+struct.pack("<I",idx)+model.get_value(parent,0))
+		cbs = 0
 		for i in range(ic):
 			iter = model.iter_nth_child(parent,i)
 			lt = model.get_value(iter,0)
 			if lt != "CMX1":
-				tmpdata, tmpblocks,bs,idx = collect_cmpr(model,iter,idx)
-				data += tmpdata
-				blk += tmpblocks
+				bs = collect_cmpr(model,iter,write,blocks)
 				cbs += bs+8
 				if cbs & 1:
 					cbs += 1
-				
 		blksize = cbs + 4
-		blk.insert(0,blksize)
-	return data,blk,blksize,idx
+	blocks[idx] = blksize
+	return blksize
 
-def pack_cmpr(model,parent):
+def pack_cmpr(model,parent,write):
 	blocks = []
-	data = ""
-	idx = 0
+	zdata = zwriter()
 	nc = model.iter_n_children(parent)
 	for i in range(nc):
 		iter = model.iter_nth_child(parent,i)
-		tmpdata, tmpblocks, bs, idx = collect_cmpr(model,iter, idx)
-		data += tmpdata
-		blocks += tmpblocks
-	zdata = zlib.compress(data)
-	sblocks = ""
-	for i in range(len(blocks)):
-		sblocks += struct.pack("<I",blocks[i])
-	zblk = zlib.compress(sblocks)
-	
-	res = "cmpr"+struct.pack("<I",len(zdata)+8) + struct.pack("<I",len(data))
-	res += struct.pack("<I",len(zblk)+8) + struct.pack("<I",len(blocks)*4)
-	res += "CPng\x01\x00\x04\x00"+zdata + "CPng\x01\x00\x04\x00"+ zblk
-	if len(res) & 1:
-		res += "\x00"
-	return "LIST"+struct.pack("<I",len(res))+res
-
-
-def dump_chunk(model, parent):
+		collect_cmpr(model,iter,zdata.write,blocks)
+	zchunks = zdata.close()
+	zblk = zlib.compress(struct.pack("<%dI"%len(blocks),*blocks))
+
+	size = 28 + zdata.zsize + 8 + len(zblk)
+	pad = size & 1
+	write("LIST"+struct.pack("<I",size+pad))
+	write("cmpr"+struct.pack("<I",zdata.zsize+8) + struct.pack("<I",zdata.size))
+	write(struct.pack("<I",len(zblk)+8) + struct.pack("<I",len(blocks)*4))
+	write("CPng\x01\x00\x04\x00")
+	for z in zchunks:
+		write(z)
+	write("CPng\x01\x00\x04\x00"+ zblk)
+	if pad:
+		write("\x00")
+
+
+def dump_chunk(model, parent, write):
+	# write is e.g. file.write or list.append
 	nc = model.iter_n_children(parent)
-	tmpbuf = ""
 	t = model.get_value(parent,1)[1]
 	s = model.get_value(parent,2)
-	pad = ""
-	if s & 1:
-		pad = "\x00"
-	s = struct.pack("<I",s)
 	lt = model.get_value(parent,0)
 	if nc == 0 or lt == "iccp":
-		return t+s+model.get_value(parent,3)+pad
+		write(t+struct.pack("<I",s))
+		write(str(model.get_value(parent,3)))
+		if s & 1:
+			write("\x00")
+	elif lt == "cmpr":
+		pack_cmpr(model,parent,write)
 	else:
-		if lt == "cmpr" and s > 52:
-			return pack_cmpr(model,parent)
-		else:
-			tmpbuf += t + s + lt
-			for i in range(nc):
-				iter = model.iter_nth_child(parent,i)
-				tmpbuf += dump_chunk (model, iter)
-			return tmpbuf
+		write(t + struct.pack("<I",s) + lt)
+		for i in range(nc):
+			iter = model.iter_nth_child(parent,i)
+			dump_chunk (model, iter, write)
 
 def save (page,fname):
 	model = page.view.get_model()
 	print "Save request. Ver 7 to 13 only. To be continued..."
-	buf = ""
+	f = open(fname,"wb")
 	if page.version > 6 and page.version < 14:
 		parent = model.iter_nth_child(None,0)
-		buf += dump_chunk(model,parent)
-	s = struct.pack("<I",len(buf)-8)
-	buf = buf[0:4] +s +buf[8:]
-	f = open(fname,"w")
-	f.write(buf)
+		dump_chunk(model,parent,f.write)
+		# RIFF size
+		size = f.tell()
+		f.seek(4)
+		f.write(struct.pack("<I",size-8))
 	f.close()
 
 def cdr_open (buf,page,parent,fmttype="cdr"):
 	# Path, Name, ID
-	page.dictmod = gtk.TreeStore(gobject.TYPE_STRING, gobject.TYPE_STRING, gobject.TYPE_STRING, gobject.TYPE_STRING)
+	page.dictmod = side_store(page,"gchararray","gchararray","gchararray","gchararray")
 	chunk = record()
 	chunk.load (buf,page,parent,0,(),fmttype)
 
@@ -2388,18 +2407,46 @@ class record:
 	data = ''
 
 	def unpack(self, page, parent, blocksizes=(), fmttype="cdr", offset=12):
+		# records are loaded as soon as they are inflated; only the tail
+		# that does not make a whole record yet is carried over
 		decomp = zlib.decompressobj()
-		self.uncmprdata = decomp.decompress(self.data[offset:])
-		offset = 0
-#		print "------------"
-#		print d2hex(self.uncmprdata," ",16)
-#		print "------------"
-		
-##		add_pgiter(page,"Uncompressed data",fmttype,"",self.uncmprdata,parent)
-		while offset < len(self.uncmprdata):
-			chunk = record()
-			chunk.load(self.uncmprdata, page, parent, offset, blocksizes, fmttype)
-			offset += 8 + chunk.size
+		end = len(self.data)
+		pending = []
+		plen = 0
+		need = 8
+		done = False
+		while not done:
+			if decomp.unused_data or (offset >= end and not decomp.unconsumed_tail):
+				# the stream or the input has ended
+				piece = decomp.flush()
+				done = True
+			elif decomp.unconsumed_tail:
+				piece = decomp.decompress(decomp.unconsumed_tail,0x100000)
+			else:
+				piece = decomp.decompress(self.data[offset:offset+0x100000],0x100000)
+				offset += 0x100000
+			if piece:
+				pending.append(piece)
+				plen += len(piece)
+			if plen < need and not done:
+				continue
+			buf = "".join(pending)
+			off = 0
+			while off + 8 <= plen:
+				size = struct.unpack('<I', buf[off+4:off+8])[0]
+				if len(blocksizes):
+					size = blocksizes[size]
+				size += 8 + (size & 1)
+				if off + size > plen and not done:
+					break
+				chunk = record()
+				chunk.load(buf, page, parent, off, blocksizes, fmttype)
+				off += 8 + chunk.size
+			pending = [buf[off:]]
+			plen = len(pending[0])
+			need = 8
+			if plen >= 8:
+				need = size
 
 	def cmpr(self,page,parent,fmttype="cdr"):
 		cmprsize = struct.unpack('<I', self.data[4:8])[0]
@@ -2420,7 +2467,7 @@ class record:
 		self.size = struct.unpack('<I', buf[offset+4:offset+8])[0]
 		if len(blocksizes):
 			self.size = blocksizes[self.size]
-		self.data = buf[offset+8:offset+8+self.size]
+		self.data = DataView(buf,offset+8,self.size)
 		if self.size & 1:
 			self.size += 1
 
@@ -2463,13 +2510,13 @@ class record:
 				page.hd.width = struct.unpack("<I",self.data[4:8])[0]/10000
 				page.hd.height = struct.unpack("<I",self.data[8:12])[0]/10000
 		if self.fourcc == 'iccd':
-			icc.parse(page,self.data,f_iter)
+			icc.parse(page,str(self.data),f_iter)
 		if self.fourcc == 'pack':
 			self.pack(page,f_iter)
 		if self.fourcc == 'page' and fmttype == "cmx":
-			cmx.parse_page(page,self.data,self.offset+8,f_iter)
+			cmx.parse_page(page,str(self.data),self.offset+8,f_iter)
 		if self.fourcc == 'vrsn' and len(self.data) == 2: # ver 16
-				page.version = struct.unpack("<H",self.data)[0]/100.
+				page.version = struct.unpack("<H",str(self.data))[0]/100.
 				print page.version
 
 		page.hd.version = page.version
@@ -2490,11 +2537,11 @@ class record:
 			parent = f_iter
 			if name == 'vect':
 				chunk = record()
-				chunk.load(self.data[16:],page,parent,0,(),"cmx")
+				chunk.load(DataView(self.data,16),page,parent,0,(),"cmx")
 			if name == 'stlt' and page.version >= 7:
 				try:
 #					print 'stlt'
-					stlt(self.data,page,parent)
+					stlt(str(self.data),page,parent)
 				except:
 					print "Something failed in 'stlt'."
 			elif name == 'cmpr':
@@ -2513,7 +2560,7 @@ class record:
 				off2 = off1 + struct.unpack("<I",self.data[4:8])[0]
 				if strid != -1:
 					ci = page.wdata[page.wtable[strid]]
-					data = page.model.get_value(ci,3)[off1:off2]
+					data = DataView(page.model.get_value(ci,3),off1,off2-off1)
 					p_iter = add_pgiter(page,"%s [%04x - %04x]"%(self.fourcc,off1,off2),"cdr",self.fourcc,data,ci)
 					page.model.set_value(p_iter,8,("path",page.model.get_string_from_iter(f_iter)))
 					page.model.set_value(f_iter,8,("path",page.model.get_string_from_iter(p_iter)))
@@ -2546,3 +2593,6 @@ class record:
 			#except:
 			#	traceback.print_exc()
 			#	print 'Failed in v16 or v17 dat'
+
+handlers.register("cdr", {"DISP":disp}, ("hd","size","data","page"))
+handlers.register("cdr", cdr_ids)
@@ -15,7 +15,7 @@
 #
 
 import sys,struct
-import gtk
+import handlers
 from utils import *
 
 
@@ -524,3 +524,4 @@ cmx_ids = {
 	"rscr":rscr,"rclr":rclr,"rotl":rotl,"rott":rott,
 	"rpen":rpen}
 
+handlers.register("cmx", cmx_ids)
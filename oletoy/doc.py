@@ -25,6 +25,7 @@ import tree
 import hexdump
 import inflate
 import ctypes
+import handlers
 from utils import *
 
 
@@ -507,7 +508,7 @@ def parse_data (page, data, dataiter):
 
 
 def parse_table (page):
-	data = page.model.get_value(page.wtable,3)
+	data = pgdata(page.model,page.wtable)
 	parent = page.wtable
 	totlen = 0
 	try:
@@ -617,15 +618,7 @@ def dump_tree (page, parent, outfile):
 		piter = model.iter_nth_child(parent,0)
 		data = model.get_value(piter,3)
 		srcoff = model.get_value(piter,1)[2]
-		off = 0
-		value = value[:srcoff]
-		while  off + 4094 < len(data):
-		  value += "\x30\x00"+data[off:off+4094]
-		  off += 4094
-		if off < len(data):
-		  res = inflate.deflate(data[off:],1)
-		  flag = 0xb000+len(res)
-		  value += struct.pack("<H",flag)+res
+		value = value[:srcoff] + inflate.compress_vba(data)
 	  page.parent.cgsf.gsf_output_write (child,len(value),value)
 
 	else: # Directory
@@ -633,7 +626,7 @@ def dump_tree (page, parent, outfile):
 
 	  for i in range(model.iter_n_children(parent)):
 		piter = model.iter_nth_child(parent,i)
-		dump_tree (model, piter, child)
+		dump_tree (page, piter, child)
 
 	page.parent.cgsf.gsf_output_close (child)
 
@@ -650,3 +643,4 @@ def save (page, fname):
 	page.parent.cgsf.gsf_output_close(outfile)
 	page.parent.cgsf.gsf_shutdown()
 
+handlers.register("doc", recs, ("hd","data"))
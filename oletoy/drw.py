@@ -15,6 +15,7 @@
 #
 
 import struct
+import handlers
 from utils import *
 
 rectypes = {1:"Background",2:"FaceName",3:"Version",4:"ID",\
@@ -146,4 +147,4 @@ def open (page,buf,parent,off=0):
 		if rtype == 33:
 			symbolversion(page,rdata)
 
-
+handlers.register("drw", recfuncs, ("hd","data","page"))
@@ -18,6 +18,7 @@ import sys,struct
 import gtk
 import tree
 import hexdump
+import handlers
 from utils import *
 
 
@@ -696,3 +697,5 @@ emr_ids = {1:Header,2:Polybezier,3:Polygon,4:Polyline,5:PolybezierTo,\
 	0x79:ClrMatchToTargetW,
 	#0x7a:'CreateColorSpaceW'
 	}
+
+handlers.register("emf", emr_ids)
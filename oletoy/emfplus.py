@@ -18,6 +18,7 @@ import sys,struct
 import gtk
 import tree
 import hexdump
+import handlers
 
 UnitType = {0:"World",1:"Display",2:"Pixel",3:"Point",
   4:"Inch",5:"Document",6:"Millimeter"}
@@ -1652,3 +1653,5 @@ emfplus_ids = {
 #0x4037:"StrokeFillPath",
 #0x4038:"SerializableObject", 0x4039:"SetTSGraphics", 0x403A:"SetTSClip"
 }
+
+handlers.register("emf+", emfplus_ids, ("hd","data"))
@@ -19,6 +19,7 @@ import gtk
 import tree
 import hexdump
 import cdr # for disp_expose
+import handlers
 from utils import *
 
 
@@ -704,3 +705,4 @@ def parse (model,data,parent,doctype=""):
 	except:
 		print "Failed to parse Escher stream",len(data)
 
+handlers.register("escher", odraw_ids, stype="odraw")
@@ -16,8 +16,12 @@
 
 import binascii
 import sys,struct,tree,zlib,gtk,gobject
+import log
+import handlers
 from utils import *
 
+lg = log.get("fh")
+
 
 # 3 - rgb
 # 4 - cmyk
@@ -3534,66 +3538,81 @@ class FHDoc():
 
 	def parse_agd_iter (self, step=500, offset=0, start=0, num=-1):
 		j = start
-		self.page.view.freeze_child_notify()
-		for i in self.reclist[start:]:
-			j += 1
-			if j%5000 == 0:
-				print j
-			if self.dictitems[i] in self.chunks:
-				#try:
-				if 1:
-					res = self.chunks[self.dictitems[i]](offset,j)
-					subList=[]
-					if type(res) is int:
-						rLen=res
-					else:
-						rLen,subList=res
-					if -1 < rLen <= len(self.data)-offset:
-						uid = ""
-						if self.dictitems[i] in ("ImageImport","polygonFigure","Extrusion","Layer","Rectangle","Oval","ClipGroup","Group","CompositePath"):
-							uid = "(%02x)"%(struct.unpack(">H",self.data[offset+6:offset+8])[0])
-						elif self.dictitems[i] == "Path":
-							uid = "(%02x)"%(struct.unpack(">H",self.data[offset+8:offset+10])[0])
-						elif self.dictitems[i] == "TextColumn":
-							uid = "(%02x)"%(struct.unpack(">H",self.data[offset+14:offset+16])[0])
-						niter = add_pgiter(self.page,"[%02x] %s %s"%(j,self.dictitems[i],uid),"fh",self.dictitems[i],self.data[offset:offset+rLen],self.diter)
-						self.page.model.set_value(niter,4,(j-1,offset))
-						offset += rLen
-						if uid != "":
-							print self.dictitems[i],uid
-						self.nodes[j] = (self.dictitems[i],niter)
-						for i in range(len(subList)):
-							subName,subType,subOff,subLen=subList[i]
-							subData=self.data[subOff:subOff+subLen]
-							add_pgiter(self.page,subName,"fh",subType,subData,niter)
-					else:
+		view = self.page.view
+		if self.page.headless:
+			view = None
+		frozen = False
+		if view:
+			view.freeze_child_notify()
+			frozen = True
+		try:
+			for i in self.reclist[start:]:
+				j += 1
+				if j%5000 == 0:
+					lg.debug("%d",j)
+				if self.dictitems[i] in self.chunks:
+					#try:
+					if 1:
+						res = self.chunks[self.dictitems[i]](offset,j)
+						subList=[]
+						if type(res) is int:
+							rLen=res
+						else:
+							rLen,subList=res
+						if -1 < rLen <= len(self.data)-offset:
+							uid = ""
+							if self.dictitems[i] in ("ImageImport","polygonFigure","Extrusion","Layer","Rectangle","Oval","ClipGroup","Group","CompositePath"):
+								uid = "(%02x)"%(struct.unpack(">H",self.data[offset+6:offset+8])[0])
+							elif self.dictitems[i] == "Path":
+								uid = "(%02x)"%(struct.unpack(">H",self.data[offset+8:offset+10])[0])
+							elif self.dictitems[i] == "TextColumn":
+								uid = "(%02x)"%(struct.unpack(">H",self.data[offset+14:offset+16])[0])
+							niter = add_pgiter(self.page,"[%02x] %s %s"%(j,self.dictitems[i],uid),"fh",self.dictitems[i],DataView(self.data,offset,rLen),self.diter)
+							self.page.model.set_value(niter,4,(j-1,offset))
+							offset += rLen
+							if uid != "":
+								lg.trace("%s %s",self.dictitems[i],uid)
+							self.nodes[j] = (self.dictitems[i],niter)
+							for i in range(len(subList)):
+								subName,subType,subOff,subLen=subList[i]
+								subData=DataView(self.data,subOff,subLen)
+								add_pgiter(self.page,subName,"fh",subType,subData,niter)
+						else:
+							add_pgiter(self.page,"!!! %s"%self.dictitems[i],"fh","unknown",self.data[offset:offset+256],self.diter)
+							for k in range(10):
+								try:
+									add_pgiter(self.page,"!!! %s"%self.dictitems[self.reclist[i+k]],"fh","unknown","",self.diter)
+								except:
+									lg.debug("kk %d",k)
+							lg.error("Failed on record %d (%s) %s",j,self.dictitems[i],rLen)
+							lg.error("Next is %s",self.dictitems[self.reclist[j+1]])
+							return
+					#except:
+					#	add_pgiter(self.page,"!!! %s"%self.dictitems[i],"fh","unknown",self.data[offset:offset+256],self.diter)
+					#	print "Failed on record %d (%s)"%(j,self.dictitems[i])
+					#	print "Next is",self.dictitems[self.reclist[j+1]]
+					#	return
+
+				else:
+						lg.warn("Unknown record type: %s (%02x)",self.dictitems[i],j)
 						add_pgiter(self.page,"!!! %s"%self.dictitems[i],"fh","unknown",self.data[offset:offset+256],self.diter)
-						for k in range(10):
-							try:
-								add_pgiter(self.page,"!!! %s"%self.dictitems[self.reclist[i+k]],"fh","unknown","",self.diter)
-							except:
-								print "kk",k
-						print "Failed on record %d (%s)"%(j,self.dictitems[i]),rLen
-						print "Next is",self.dictitems[self.reclist[j+1]]
+						if j < len(self.reclist):
+							add_pgiter(self.page,"!!! %s"%self.dictitems[self.reclist[j]],"fh","unknown","",self.diter)
 						return
-				#except:
-				#	add_pgiter(self.page,"!!! %s"%self.dictitems[i],"fh","unknown",self.data[offset:offset+256],self.diter)
-				#	print "Failed on record %d (%s)"%(j,self.dictitems[i])
-				#	print "Next is",self.dictitems[self.reclist[j+1]]
-				#	return
-
-			else:
-					print "Unknown record type: %s (%02x)"%(self.dictitems[i],j)
-					add_pgiter(self.page,"!!! %s"%self.dictitems[i],"fh","unknown",self.data[offset:offset+256],self.diter)
-					if j < len(self.reclist):
-						add_pgiter(self.page,"!!! %s"%self.dictitems[self.reclist[j]],"fh","unknown","",self.diter)
-					return
-			if (j % step) == 0:
-				self.page.view.thaw_child_notify()
-				yield True
-				self.page.view.freeze_child_notify()
-
-		self.page.view.thaw_child_notify()
+				if (j % step) == 0:
+					if view:
+						view.thaw_child_notify()
+						frozen = False
+					yield True
+					if view:
+						view.freeze_child_notify()
+						frozen = True
+		finally:
+			# early returns too, and generator close at a yield
+			if frozen:
+				view.thaw_child_notify()
+			self.page.loading = False
+			self.page.loaded()
 		# stop idle_add()
 		yield False
 
@@ -3601,7 +3620,14 @@ class FHDoc():
 		if start == 0:
 			self.reclist.append("FHTail")
 		loader = self.parse_agd_iter(500,off,start)
-		gobject.idle_add(loader.next)
+		if self.page.headless:
+			# no main loop to run the loader, or not the one of this thread
+			for more in loader:
+				if not more:
+					break
+		else:
+			self.page.loading = True
+			gobject.idle_add(loader.next)
 
 	def parse_list(self,data,offset):
 		size = struct.unpack('>L', data[offset:offset+4])[0]
@@ -3771,7 +3797,7 @@ def fh_open (buf,page,parent=None,mode=1):
 			off = read1c(buf,page,parent,off)
 
 	piter = add_pgiter(page,"FH file","fh","file",buf,parent)
-	page.dictmod = gtk.TreeStore(gobject.TYPE_STRING, gobject.TYPE_STRING, gobject.TYPE_STRING)
+	page.dictmod = side_store(page,"gchararray","gchararray","gchararray")
 
 	page.appdoc = FHDoc(output,page,piter)
 	offset = offset + size
@@ -3782,3 +3808,5 @@ def fh_open (buf,page,parent=None,mode=1):
 		return "FH"
 	except:
 		print "Failed in FH parsing"
+
+handlers.register("fh", hdp, ("hd","data","page"))
@@ -15,6 +15,7 @@
 #
 
 import struct
+import handlers
 from utils import *
 
 class ZoneHeader:
@@ -992,3 +993,5 @@ fh12_ids = {
         "Transform":TransformHdl,
         "TransformGroup":TransformGroupHdl
 }
+
+handlers.register("fh12", fh12_ids, ("hd","size","data","stype"))
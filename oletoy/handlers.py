@@ -0,0 +1,126 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+
+# Record handlers that fill the hexdump panel, by row type. A row type is
+# the tuple in column 1: (ftype, stype[, key]). Format modules register
+# their tables when they are imported; the module of an ftype is imported
+# the first time a row of that ftype is shown.
+#
+#	register(ftype, ids, args)			ids[stype]
+#	register(ftype, ids, args, stype)	ids[key] for rows (ftype, stype, key)
+#	register_fallback(ftype, func, args)	anything else of ftype
+#
+# args name what a handler gets, in order: hd, size, data, page, ftype,
+# stype, ntype, model, iter; anything else is passed as is.
+
+import sys
+
+hsd = ("hd","size","data")
+
+# ftype -> module that registers it
+modules = {"vprm":"yep", "yep":"yep", "drw":"drw", "escher":"escher",
+	"quill":"quill", "vsd":"vsd", "vsd2":"vsdchunks", "vsd24":"vsdchunks",
+	"vsdv":"vsdchunks5", "vba":"vba", "ppp":"ppp", "emf":"emfparse",
+	"wmf":"wmfparse", "svm":"svm", "cmx":"cmx", "cdr":"cdr", "wld":"wld",
+	"pub":"pub", "lrf":"lrf", "wls":"wls", "wt602":"wt602", "c602":"c602",
+	"t602":"t602", "imp":"sbimp", "emf+":"emfplus", "xls":"xls", "doc":"doc",
+	"mdb":"mdb", "cfb":"ole", "ole":"ole", "rx2":"rx2", "palm":"palm",
+	"pm":"pm6", "fh":"fh", "fh12":"fh12", "zmf2":"zmf", "zmf4":"zmf",
+	"zbr":"zbr", "iwa":"iwa", "plist":"plist", "bmi":"bmi", "qxp":"qxp",
+	"xml":"otxml"}
+
+# ftypes with a version or variant in the name are handled as their prefix
+prefixes = (("vsd2","vsd2"), ("vsdv","vsdv"), ("pub","pub"), ("qxp","qxp"))
+
+tables = {} # ftype -> [(ids, args)]
+subtables = {} # (ftype, stype) -> [(ids, args)]
+fallbacks = {} # ftype -> (func, args)
+aliases = {} # ftype -> registered ftype, or None if there is none
+
+def register(ftype, ids, args=hsd, stype=None):
+	if stype == None:
+		tables.setdefault(ftype,[]).append((ids,args))
+	else:
+		subtables.setdefault((ftype,stype),[]).append((ids,args))
+
+def register_fallback(ftype, func, args=hsd):
+	fallbacks[ftype] = (func,args)
+
+def resolve(ftype):
+	# registered ftype for a row ftype; imports its module the first time
+	try:
+		return aliases[ftype]
+	except KeyError:
+		pass
+	except TypeError:
+		return None
+	name = ftype
+	if not modules.has_key(name):
+		name = None
+		if isinstance(ftype,basestring):
+			for p,n in prefixes:
+				if ftype.startswith(p):
+					name = n
+					break
+	if name != None and modules.has_key(name) and sys.modules.get(modules[name]) == None:
+		m = __import__(modules[name])
+		import utils
+		for hook in utils.import_hooks:
+			hook(m)
+	aliases[ftype] = name
+	return name
+
+def search(tlist, key):
+	for ids,args in tlist:
+		try:
+			if ids.has_key(key):
+				return ids[key],args
+		except TypeError:
+			return None
+	return None
+
+def find(ntype):
+	# (handler, args) for a row type, or None
+	if not isinstance(ntype,tuple) or len(ntype) < 2:
+		return None
+	ftype = resolve(ntype[0])
+	if ftype == None:
+		return None
+	h = None
+	if len(ntype) > 2:
+		try:
+			tlist = subtables.get((ftype,ntype[1]))
+		except TypeError:
+			tlist = None
+		if tlist:
+			h = search(tlist,ntype[2])
+	if h == None and tables.has_key(ftype):
+		h = search(tables[ftype],ntype[1])
+	if h == None:
+		h = fallbacks.get(ftype)
+	return h
+
+def call(hd, size, data, page, ntype, model=None, iter1=None):
+	# runs the handler of the row; False if there is none
+	h = find(ntype)
+	if h == None:
+		return False
+	func,args = h
+	env = {"hd":hd, "size":size, "data":data, "page":page, "ftype":ntype[0],
+		"stype":ntype[1], "ntype":ntype, "model":model, "iter":iter1}
+	func(*[env.get(a,a) if isinstance(a,str) else a for a in args])
+	return True
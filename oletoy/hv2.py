@@ -18,6 +18,73 @@ import gtk
 import cairo
 import struct
 import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from piecetable import PieceTable
+
+# text of a byte in the hex column
+hexchars = ["%02x "%i for i in range(256)]
+# bytes out of 0x20-0x7e are shown as the middle dot, which is 0xb7 in latin-1
+ascchars = "".join([chr(i) if i > 31 and i < 127 else "\xb7" for i in range(256)])
+
+
+class Highlights(dict):
+	# highlights by id: (offset,len,r,g,b,a)
+	# kept sorted by offset for overlap queries, the index is rebuilt lazily after changes
+	def __init__(self,*args,**kwargs):
+		dict.__init__(self,*args,**kwargs)
+		self.index = None
+
+	def __setitem__(self,key,value):
+		dict.__setitem__(self,key,value)
+		self.index = None
+
+	def __delitem__(self,key):
+		dict.__delitem__(self,key)
+		self.index = None
+
+	def clear(self):
+		dict.clear(self)
+		self.index = None
+
+	def pop(self,key,*default):
+		self.index = None
+		return dict.pop(self,key,*default)
+
+	def update(self,*args,**kwargs):
+		dict.update(self,*args,**kwargs)
+		self.index = None
+
+	def add(self,items):
+		# bulk add of (id,(offset,len,r,g,b,a)) pairs or a dict
+		self.update(items)
+
+	def remove(self,ids):
+		# bulk removal, unknown ids are ignored
+		for i in ids:
+			dict.pop(self,i,None)
+		self.index = None
+
+	def build(self):
+		hls = sorted([(v[0],v[0]+max(v[1],1),k) for k,v in self.iteritems()])
+		starts = [h[0] for h in hls]
+		ends = [h[1] for h in hls]
+		# maxend[i] is the largest end of the first i+1 highlights
+		maxend = []
+		m = -1
+		for e in ends:
+			m = max(m,e)
+			maxend.append(m)
+		self.index = starts,ends,maxend,[h[2] for h in hls]
+
+	def overlap(self,start,end):
+		# ids of highlights which overlap bytes start..end-1, ordered by offset
+		if self.index == None:
+			self.build()
+		starts,ends,maxend,ids = self.index
+		i = bisect_right(maxend,start)
+		j = bisect_left(starts,end)
+		return [ids[k] for k in range(i,j) if ends[k] > start]
 
 
 class HexView():
@@ -48,14 +115,15 @@ class HexView():
 		self.offnum = 0					# offset in lines
 		self.tdx = -1						# width of one glyph
 		self.tht = 0						# height of one glyph
-		self.hvlines = []				# cached text of lines
+		self.hvlines = OrderedDict()	# cached text of lines, least recently used first
+		self.maxlines = 512			# size of the cache
 		self.selr = None
 		self.selc = None
 		self.drag = 0						# flag to track if we drag something
 		self.kdrag = 0					# flag to reinit selection if shift was released/pressed
 		self.curr = 0						# current row
 		self.curc = 0						# current column
-		self.mode = ""					# flag to jump to the current scrollbar offset or scroll back to hv cursor
+		self.mode = ""					# "" to redraw everything on expose, "c" to redraw only what was changed
 		self.prer = 0						# previous row
 		self.prec = 0						# previous column
 		self.shift = 0
@@ -66,8 +134,15 @@ class HexView():
 		self.edpos = 0
 		self.modified = 0
 		self.ch = unicode("\xC2\xB7","utf8") # symbol for non-ascii
-		self.hl = {} # highligths (offset,len,colour=clr1)
+		self.hl = Highlights() # highligths (offset,len,colour=clr1)
 		self.numtl = 0 # number of the lines on the screen
+		self.surface = None # back buffer with the last drawn screen
+		self.bsurface = None # spare buffer to scroll the back buffer
+		self.surfoff = 0 # offnum of the back buffer
+		self.surfsel = None # selection drawn in the back buffer
+		self.damage = set() # rows changed since the last expose
+		self.dirty = 1 # back buffer has to be redrawn from scratch
+		self.mttrect = None # area of the window under selection size tip
 
 		# connect signals and call some init functions
 		self.hv.set_can_focus(True)
@@ -110,9 +185,8 @@ class HexView():
 		self.lines = len(self.data)/16 # number of lines in file
 		if len(self.data)%16 != 0:
 			self.lines += 1
-		for i in range(self.lines+1):
-			self.hvlines.append("")
-
+		self.hvlines.clear()
+		self.dirty = 1
 
 
 	def init_config(self): # redefine UI/behaviour options from file
@@ -148,20 +222,18 @@ class HexView():
 		self.vadj.value = self.offnum
 
 	def get_string(self, num):
-		hex = ""
-		asc = ""
-		slen = 16
-		if num == self.lines -1 and len(self.data)%16 !=0:
-			slen = len(self.data)%16
-		if self.hvlines[num] == "":
-			for j in range(slen):
-				ch = self.data[num*16+j]
-				hex += "%02x "%ord(ch)
-				if ord(ch) < 32 or ord(ch) > 126:
-					ch = self.ch
-				asc += ch
-			self.hvlines[num] = (hex,asc)
-		return self.hvlines[num]
+		line = self.hvlines.pop(num,None)
+		if line == None:
+			data = self.data[num*16:num*16+16]
+			hex = "".join([hexchars[b] for b in bytearray(data)])
+			asc = data.translate(ascchars).decode("latin-1")
+			if self.ch != u"\xb7":
+				asc = asc.replace(u"\xb7",self.ch)
+			line = hex,asc
+			if len(self.hvlines) >= self.maxlines:
+				self.hvlines.popitem(False)
+		self.hvlines[num] = line
+		return line
 
 	def line_size(self,row):
 		# returns size of line or -1 if 'row' is behind
@@ -180,6 +252,7 @@ class HexView():
 				self.parent.update_data()
 			else:
 				self.editmode = 1
+			self.mode = "c"
 			self.expose(None,event)
 
 	def okp_selall(self,event):
@@ -188,6 +261,7 @@ class HexView():
 			if maxc == 0:
 				maxc = 16
 			self.sel = 0,0,self.lines-1,maxc
+			self.mode = "c"
 			self.expose(None,event)
 
 	def okp_copy(self,event):
@@ -201,18 +275,13 @@ class HexView():
 					shift = 1
 					end = ""
 				if r1 == r2:
-					text = self.hvlines[r1][shift][c1*3:c2*3]
+					text = self.get_string(r1)[shift][c1*3:c2*3]
 				else:
-					text = self.hvlines[r1][shift][c1*3:] + end
+					text = [self.get_string(r1)[shift][c1*3:] + end]
 					for i in range(min(r2-r1-1,self.lines-1)):
-						if self.hvlines[r1+i+1] == "":
-							text += self.get_string(r1+i+1)[shift] + end
-						else:
-							text += self.hvlines[r1+i+1][shift] + end
-					if self.hvlines[r2] == "":
-						text += self.get_string(r2)[shift][:c2*3]
-					else:
-						text += self.hvlines[r2][shift][:c2*3]
+						text.append(self.get_string(r1+i+1)[shift] + end)
+					text.append(self.get_string(r2)[shift][:c2*3])
+					text = "".join(text)
 				clp.set_text(text)
 				clp.store()
 
@@ -221,24 +290,26 @@ class HexView():
 			pos = self.curr*16+self.curc
 			v = ord(self.data[pos])
 			self.modified = 1
+			if not isinstance(self.data,PieceTable):
+				self.data = PieceTable(self.data)
 			if self.edpos == 0:
 				v1 = self.edmap[event.keyval]*16+(v&0xF)
 				self.edpos = 1
-				self.data = self.data[:pos]+chr(v1)+self.data[pos+1:]
-				self.hvlines[self.curr] = ""
-				self.get_string(self.curr)
+				self.data.replace(pos,chr(v1))
+				self.hvlines.pop(self.curr,None)
+				self.damage.add(self.curr)
+				self.mode = "c"
 				self.exposed = 1
 			else:
 				v1 = (v&0xF0)+self.edmap[event.keyval]
 				self.edpos = 0
-				self.data = self.data[:pos]+chr(v1)+self.data[pos+1:]
-				self.hvlines[self.curr] = ""
-				self.get_string(self.curr)
+				self.data.replace(pos,chr(v1))
+				self.hvlines.pop(self.curr,None)
+				self.damage.add(self.curr)
+				self.mode = "c"
+				self.exposed = 1
 				if pos != len(self.data)-1:
 					self.okp_right(event)
-				else:
-					self.hv.hide()
-					self.hv.show()
 			pn = self.parent.notebook.get_current_page()
 			if pn != -1:
 				treeSelection = self.parent.das[pn].view.get_selection()
@@ -246,7 +317,7 @@ class HexView():
 				ntype = model.get_value(iter1,1)
 				if ntype == ("escher","odraw","Blip"):
 					pixbufloader = gtk.gdk.PixbufLoader()
-					pixbufloader.write(self.data)
+					pixbufloader.write(str(self.data))
 					pixbufloader.close()
 					self.parent.das[pn].hd.pixbuf = pixbufloader.get_pixbuf()
 
@@ -258,7 +329,6 @@ class HexView():
 			if self.curr > 0:
 				self.curr -= 1
 				self.curc = 15
-				self.mode = ""
 			else:
 				self.curc = 0
 		self.shift = 1
@@ -284,7 +354,6 @@ class HexView():
 					self.curr = self.lines-1
 				if self.curr < self.offnum:
 					self.curr = self.offnum
-				self.mode = ""
 			else:
 				self.curc = 15
 		self.shift = -1
@@ -296,7 +365,6 @@ class HexView():
 		self.mode = "c"
 		if self.offnum > 0 and self.curr < self.offnum+1:
 			self.offnum -= 1
-			self.mode = ""
 		self.curr -= 1
 		if self.curr < 0:
 			self.curr = 0
@@ -314,7 +382,6 @@ class HexView():
 			self.curr = 0
 		if self.offnum > 0 and self.curr < self.offnum+1:
 			self.offnum -= (self.numtl-2)
-			self.mode = ""
 		if self.offnum < 0:
 			self.offnum = 0
 		if self.curr > self.offnum + self.numtl:
@@ -328,7 +395,6 @@ class HexView():
 		self.mode = "c"
 		if self.offnum < self.lines-self.numtl+1 and self.curr >= self.offnum+self.numtl-3:
 			self.offnum += 1
-			self.mode = ""
 		self.curr += 1
 		if self.curr > self.lines-1:
 			self.curr = self.lines-1
@@ -348,7 +414,6 @@ class HexView():
 			self.curr = self.lines-1
 		if self.offnum < self.lines-self.numtl and self.curr >= self.offnum+self.numtl-3:
 			self.offnum += (self.numtl-2)
-			self.mode = ""
 		if self.offnum > self.lines-self.numtl:
 			self.offnum = self.lines-self.numtl
 		if self.curr < self.offnum:
@@ -367,7 +432,6 @@ class HexView():
 		if event.state == gtk.gdk.CONTROL_MASK:
 			self.curr = 0
 			self.offnum = 0
-			self.mode = ""
 		return 1
 
 	def okp_end(self,event):
@@ -376,7 +440,6 @@ class HexView():
 		if event.state == gtk.gdk.CONTROL_MASK:
 			self.curr = self.lines-1
 			self.offnum = self.lines-self.numtl
-			self.mode = ""
 		self.curc = 15
 		if self.curr == self.lines -1 and len(self.data)%16 != 0:
 			self.curc = len(self.data)%16 - 1
@@ -437,6 +500,7 @@ class HexView():
 			else:
 				self.mtt = None
 			if c1 != c1o or c2 != c2o or r1 != r1o or r2 != r2o:
+				self.mode = "c"
 				self.expose(widget,event)
 			self.parent.calc_status(self.data[r1*16+c1:r2*16+c2],s)
 
@@ -446,7 +510,7 @@ class HexView():
 		# handle keyboard input
 		flag = 0
 		self.exposed = 0
-		self.mode = ""
+		self.mode = "c"
 		self.shift = 0
 		self.prer = self.curr
 		self.prec = self.curc
@@ -535,7 +599,6 @@ class HexView():
 							c1 = self.curc
 
 				self.sel = r1,c1,r2,c2
-				self.mode = ""
 				self.exposed = 1
 				y = (r2-self.offnum+1.5)*self.tht # +1
 				x = (self.curc*3+11.5)*self.tdx
@@ -569,6 +632,7 @@ class HexView():
 		if event.keyval == 65505 or event.keyval == 65506:
 			self.kdrag = 0
 			self.mtt = None
+			self.mode = "c"
 			self.expose(view,event)
 
 	def on_vadj_changed (self, vadj):
@@ -576,14 +640,15 @@ class HexView():
 		if int(vadj.value) != self.offnum:
 			self.offnum = int(vadj.value)
 #			self.vadj.upper = self.lines-self.numtl+2
-			self.hv.hide()
-			self.hv.show()
+			self.mode = "c"
+			self.expose(None,None)
 		return True
 
 
 	def on_button_release (self, widget, event):
 		self.drag = 0
 		self.mtt = None
+		self.mode = "c"
 		self.expose(widget,event)
 
 
@@ -638,22 +703,9 @@ class HexView():
 		return r0,c0,r1,c1
 
 	def inhl(self,ctx,r,c):
-		for i in self.hl:
+		for i in self.hl.overlap(r*16+c,r*16+c+1):
 			hl = self.hl[i]
-			r0,c0,r1,c1 = self.ol2quad(hl[0],hl[1])
-			if r0 != -1:
-				if r0 == r1:
-					if r == r0 and c >= c0 and c < c1:
-						ctx.set_source_rgba(hl[2],hl[3],hl[4],hl[5])
-				else:
-					if r == r0:
-						if c >= c0 and c <= 15:
-							ctx.set_source_rgba(hl[2],hl[3],hl[4],hl[5])
-					elif r == r1:
-						if c < c1:
-							ctx.set_source_rgba(hl[2],hl[3],hl[4],hl[5])
-					elif r > r0 and r < r1:
-						ctx.set_source_rgba(hl[2],hl[3],hl[4],hl[5])
+			ctx.set_source_rgba(hl[2],hl[3],hl[4],hl[5])
 
 
 	def draw_selection(self,ctx,r0,c0,r1,c1,clr=(0.5,0.5,0.5,0.5)):
@@ -692,163 +744,82 @@ class HexView():
 		ctx.set_source_rgb(0,0,0)
 		ctx.stroke()
 
-	def expose(self,widget,event):
-		if len(self.data) < 1:
-			return
-		x,y,width,height = self.hv.allocation
-
-		mctx = self.hv.window.cairo_create()
-		cs = cairo.ImageSurface (cairo.FORMAT_ARGB32, width, height)
-		ctx = cairo.Context (cs)
-		ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-		ctx.set_font_size(self.fontsize)
-		ctx.set_line_width(1)
-		cmnt_off = (-1,-1)
-		if self.tdx == -1:
-			self.set_dxdy()
-		self.numtl = min(int((height - self.tht-4)/self.tht)+1,self.lines+1)
-
-		self.hbox2.set_size_request(max(width-self.tdx*(10+16*3),0),0)
-		if self.numtl >= self.lines:
-			self.vs.hide()
-		else:
-			self.vs.show()
-		if width >= self.tdx*(9+16*3):
-			self.hs.hide()
-		else:
-			self.hs.show()
+	def draw_sep(self,ctx,height):
+		# vertical lines between columns
+		ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
+		ctx.move_to(self.tdx*9+0.5,0)
+		ctx.line_to(self.tdx*9+0.5,height)
+		ctx.move_to(self.tdx*(10+16*3)+0.5,0)
+		ctx.line_to(self.tdx*(10+16*3)+0.5,height)
+		ctx.move_to(self.tdx*(12+16*4)+0.5,0)
+		ctx.line_to(self.tdx*(12+16*4)+0.5,height)
+		ctx.stroke()
 
-		if self.mode == "":
-			# clear top address lane
-			ctx.rectangle(0,0,width,self.tht+4)
-			ctx.set_source_rgb(self.hdrclr[0],self.hdrclr[1],self.hdrclr[2])
-			ctx.fill()
-			# clear everything else
-			ctx.rectangle(0,self.tht+4,width,height)
-			ctx.set_source_rgb(1,1,1)
-			ctx.fill()
-			# draw lines
-			ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
-			ctx.move_to(self.tdx*9+0.5,0)
-			ctx.line_to(self.tdx*9+0.5,height)
-			ctx.move_to(self.tdx*(10+16*3)+0.5,0)
-			ctx.line_to(self.tdx*(10+16*3)+0.5,height)
-			ctx.move_to(self.tdx*(12+16*4)+0.5,0)
-			ctx.line_to(self.tdx*(12+16*4)+0.5,height)
-			ctx.stroke()
-
-#  Selection
-			if self.sel and ((self.sel[0] >= self.offnum and self.sel[0] <= self.offnum + self.numtl) or (self.sel[2] >= self.offnum and self.sel[2] <= self.offnum + self.numtl) or (self.sel[0] < self.offnum and self.sel[2] > self.offnum+self.numtl)):
-				self.draw_selection(ctx,self.sel[0],self.sel[1],self.sel[2],self.sel[3],self.selclr)
-
-# Highlights
-			for i in self.hl:
-				r0,c0,r1,c1 = self.ol2quad(self.hl[i][0],self.hl[i][1])
-				if r0 != -1 and ((r0 >= self.offnum and r0 <= self.offnum + self.numtl) or (r1 >= self.offnum and r1 <= self.offnum + self.numtl) or (r0 < self.offnum and r1 > self.offnum+self.numtl)):
-					self.draw_selection(ctx,r0,c0,r1,c1,(self.hl[i][2],self.hl[i][3],self.hl[i][4],self.hl[i][5]))
-
-#hdr
-			hdr = ""
-			ctx.move_to(self.tdx*(10+self.curc*3),self.tht+1.5)
-			ctx.line_to(self.tdx*(12+self.curc*3),self.tht+1.5)
-			ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
-			ctx.stroke()
-			ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
-			for i in range(16):
-				hdr += "%02x "%i
-			ctx.move_to(self.tdx*10,self.tht)
-			ctx.show_text(hdr)
-			ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
-			if self.global_off != None:
-				haddr = "%02x %04x"%(self.curr*16+self.curc,self.global_off+self.curr*16+self.curc)
-			else:
-				haddr = "%02x"%(self.curr*16+self.curc)
-			ctx.move_to(self.tdx*(11+16*3),self.tht)
-			ctx.show_text(haddr)
-			ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
-			
-#addr 
-			for i in range(min(self.lines-self.offnum,self.numtl)):
-				ctx.move_to(0,(i+2)*self.tht+4)
-				if i == self.curr-self.offnum:
-					ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
-				ctx.show_text("%08x"%((i+self.offnum)*16))
-				ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
-# hex/asc  part
-			for i in range(min(self.lines-self.offnum,self.numtl)):
-				ctx.set_source_rgb(0,0,0)
-				hex,asc = self.get_string(i+self.offnum)
-				ctx.move_to(self.tdx*10,(i+2)*self.tht+4)
-				ctx.show_text(hex)
-				ctx.move_to(self.tdx*(10+1+16*3),self.tht*(i+2)+4)
-				ctx.show_text(asc)
-
-			self.draw_edit(ctx)
-
-		# clear prev hdr cursor
+	def draw_hdr(self,ctx,width,height):
+		# top address lane: column numbers, cursor offset and edit flag
+		ctx.save()
+		ctx.rectangle(0,0,width,self.tht+4)
+		ctx.clip()
+		ctx.rectangle(0,0,width,self.tht+4)
 		ctx.set_source_rgb(self.hdrclr[0],self.hdrclr[1],self.hdrclr[2])
-		ctx.move_to(self.tdx*(10+self.prec*3),self.tht+1.5)
-		ctx.line_to(self.tdx*(12+self.prec*3),self.tht+1.5)
-		ctx.stroke()
-		# clear prev hdr address
-		ctx.rectangle(self.tdx*(11+16*3),0,self.tdx*16,self.tht+1.5)
 		ctx.fill()
-		# draw new hdr cursor
-		ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
+		self.draw_sep(ctx,height)
 		ctx.move_to(self.tdx*(10+self.curc*3),self.tht+1.5)
 		ctx.line_to(self.tdx*(12+self.curc*3),self.tht+1.5)
+		ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
 		ctx.stroke()
-		
-		#draw haddr
+		ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
+		ctx.move_to(self.tdx*10,self.tht)
+		ctx.show_text("".join(hexchars[:16]))
+		ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
 		if self.global_off != None:
 			haddr = "%02x %04x"%(self.curr*16+self.curc,self.global_off+self.curr*16+self.curc)
 		else:
 			haddr = "%02x"%(self.curr*16+self.curc)
 		ctx.move_to(self.tdx*(11+16*3),self.tht)
 		ctx.show_text(haddr)
-
-		#clear old and new hex and asc
-		if self.prer-self.offnum > -1:
-			ctx.set_source_rgb(1,1,1)
-			
-			if self.sel:
-				if self.sel[0] == self.sel[2]:
-					if self.prer == self.sel[0] and self.prec >= self.sel[1] and self.prec < self.sel[3]:
-						ctx.set_source_rgb(self.selclr[0],self.selclr[1],self.selclr[2])
-				else:
-					#1st row
-					if self.prer == self.sel[0]:
-						if self.prec >= self.sel[1] and self.prec <= 15:
-							ctx.set_source_rgb(self.selclr[0],self.selclr[1],self.selclr[2])
-					elif self.prer == self.sel[2]:
-						if self.prec < self.sel[3]:
-							ctx.set_source_rgb(self.selclr[0],self.selclr[1],self.selclr[2])
-					elif self.prer > self.sel[0] and self.prer < self.sel[2]:
-						ctx.set_source_rgb(self.selclr[0],self.selclr[1],self.selclr[2])
-
-			if len(self.hl)> 0:
-				self.inhl(ctx,self.prer,self.prec)
-
-			if self.prec > -1 and self.prec < 16:
-				# old hex char
-				ctx.rectangle(self.tdx*(10+3*self.prec),(self.prer-self.offnum+1)*self.tht+6.5,self.tdx*2+1,self.tht)
-				# old asc char
-				ctx.rectangle(self.tdx*(11+self.prec+3*16),(self.prer-self.offnum+1)*self.tht+6,self.tdx+1,self.tht+1.5)
-				ctx.fill()
+		self.draw_edit(ctx)
+		ctx.restore()
+
+	def draw_rows(self,ctx,r0,r1,width,height):
+		# redraw screen rows r0..r1 of the back buffer
+		# glyphs and selection boxes of a row spill a few pixels into the next one,
+		# so the neighbours are drawn too and everything is clipped to the band
+		ctx.save()
+		ctx.rectangle(0,(r0+1)*self.tht+4,width,(r1-r0+1)*self.tht)
+		ctx.clip()
+		ctx.rectangle(0,(r0+1)*self.tht+4,width,(r1-r0+1)*self.tht)
+		ctx.set_source_rgb(1,1,1)
+		ctx.fill()
+		self.draw_sep(ctx,height)
+
+		last = self.offnum + self.numtl
+		if self.sel and ((self.sel[0] >= self.offnum and self.sel[0] <= last) or (self.sel[2] >= self.offnum and self.sel[2] <= last) or (self.sel[0] < self.offnum and self.sel[2] > last)):
+			self.draw_selection(ctx,self.sel[0],self.sel[1],self.sel[2],self.sel[3],self.selclr)
+		for i in self.hl.overlap((self.offnum+max(r0-1,0))*16,(self.offnum+r1+2)*16):
+			r0h,c0h,r1h,c1h = self.ol2quad(self.hl[i][0],self.hl[i][1])
+			if r0h != -1:
+				self.draw_selection(ctx,r0h,c0h,r1h,c1h,(self.hl[i][2],self.hl[i][3],self.hl[i][4],self.hl[i][5]))
+
+		for i in range(max(r0-1,0),min(r1+2,self.lines-self.offnum)):
+			# addr
+			ctx.move_to(0,(i+2)*self.tht+4)
+			if i == self.curr-self.offnum:
+				ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
+			else:
+				ctx.set_source_rgb(self.lineclr[0],self.lineclr[1],self.lineclr[2])
+			ctx.show_text("%08x"%((i+self.offnum)*16))
+			# hex/asc
 			ctx.set_source_rgb(0,0,0)
-			if self.prec > -1 and self.prec < 16:
-				# location of hex
-				ctx.move_to(self.tdx*(10+3*self.prec),(self.prer-self.offnum+2)*self.tht+4)
-				ctx.show_text("%02x "%ord(self.data[self.prer*16+self.prec]))
-				# location of asc
-				ctx.move_to(self.tdx*(11+self.prec+3*16),(self.prer-self.offnum+2)*self.tht+4)
-				ch = self.data[self.prer*16+self.prec]
-				if ord(ch) < 32 or ord(ch) > 126:
-					ch = self.ch
-				ctx.show_text(ch)
-
-		if self.curr-self.offnum > -1:
-			ctx.rectangle(self.tdx*(10+3*self.curc),(self.curr-self.offnum+1)*self.tht+6.5,self.tdx*2+1,self.tht)
+			hex,asc = self.get_string(i+self.offnum)
+			ctx.move_to(self.tdx*10,(i+2)*self.tht+4)
+			ctx.show_text(hex)
+			ctx.move_to(self.tdx*(10+1+16*3),self.tht*(i+2)+4)
+			ctx.show_text(asc)
+
+		r = self.curr-self.offnum
+		if r >= r0-1 and r <= r1+1 and r >= 0:
+			ctx.rectangle(self.tdx*(10+3*self.curc),(r+1)*self.tht+6.5,self.tdx*2+1,self.tht)
 			ctx.set_source_rgb(1,1,1)
 			if self.sel:
 				if self.sel[0] == self.sel[2]:
@@ -866,56 +837,132 @@ class HexView():
 						ctx.set_source_rgb(self.selclr[0],self.selclr[1],self.selclr[2])
 			if len(self.hl)> 0:
 				self.inhl(ctx,self.curr,self.curc)
-
 			ctx.fill()
-			ctx.rectangle(self.tdx*(11+self.curc+3*16),(self.curr-self.offnum+1)*self.tht+6,self.tdx,self.tht+1)
+			ctx.rectangle(self.tdx*(11+self.curc+3*16),(r+1)*self.tht+6,self.tdx,self.tht+1)
 			ctx.set_source_rgb(self.aschlclr[0],self.aschlclr[1],self.aschlclr[2])
 			ctx.fill()
 			ctx.set_source_rgb(self.txtcurclr[0],self.txtcurclr[1],self.txtcurclr[2])
-			ctx.move_to(self.tdx*(10+3*self.curc),(self.curr-self.offnum+2)*self.tht+4)
+			ctx.move_to(self.tdx*(10+3*self.curc),(r+2)*self.tht+4)
 			ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-			ctx.show_text("%02x "%ord(self.data[self.curr*16+self.curc]))
+			ctx.show_text(hexchars[ord(self.data[self.curr*16+self.curc])])
 			ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
 			ctx.set_source_rgb(0,0,0)
-			ctx.move_to(self.tdx*(11+self.curc+3*16),(self.curr-self.offnum+2)*self.tht+4)
-			ch = self.data[self.curr*16+self.curc]
-			if ord(ch) < 32 or ord(ch) > 126:
-				ch = self.ch
-			ctx.show_text(ch)
-
-		if self.prer != self.curr: # need to clear/draw addr
-			if self.prer-self.offnum > -1:
-				ctx.rectangle(0,(self.prer-self.offnum+1)*self.tht+4,self.tdx*8,self.tht)
-				ctx.set_source_rgb(1,1,1)
-				ctx.fill()
-				ctx.set_source_rgb(0,0,0)
-				ctx.move_to(0,(self.prer-self.offnum+2)*self.tht+4)
-				ctx.show_text("%08x"%(self.prer*16))
-			if self.curr-self.offnum > -1:
-				ctx.rectangle(0,(self.curr-self.offnum+1)*self.tht+4,self.tdx*8,self.tht)
-				ctx.set_source_rgb(1,1,1)
-				ctx.fill()
-				ctx.set_source_rgb(self.curclr[0],self.curclr[1],self.curclr[2])
-				ctx.move_to(0,(self.curr-self.offnum+2)*self.tht+4)
-				ctx.show_text("%08x"%(self.curr*16))
+			ctx.move_to(self.tdx*(11+self.curc+3*16),(r+2)*self.tht+4)
+			ctx.show_text(self.get_string(self.curr)[1][self.curc])
+		ctx.restore()
+
+	def scroll_surface(self,d,width,height):
+		# move rows of the back buffer up (d>0) or down (d<0) by d lines
+		ctx = cairo.Context(self.bsurface)
+		ctx.set_operator(cairo.OPERATOR_SOURCE)
+		ctx.set_source_surface(self.surface,0,-d*self.tht)
+		ctx.rectangle(0,self.tht+4,width,height)
+		ctx.fill()
+		self.surface,self.bsurface = self.bsurface,self.surface
 
-# math.floor(math.log10(self.mtt[2])
-		if self.mtt:
-			mttstr = "%s/%x"%(self.mtt[2],self.mtt[2])
-			sh = len(mttstr)
-			ctx.rectangle(self.mtt[0]-self.tdx*0.5,self.mtt[1]-self.tht-6,self.tdx*(2+sh),self.tht+4) #-6
-			ctx.set_source_rgba(self.mttclr[0],self.mttclr[1],self.mttclr[2],self.mttclr[3])
-			ctx.fill()
-			ctx.set_source_rgb(self.mttxtclr[0],self.mttxtclr[1],self.mttxtclr[2])
-			ctx.move_to(self.mtt[0],self.mtt[1]-6) #-6
-			ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-			ctx.show_text(mttstr)
-			ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+	def expose(self,widget,event):
+		if len(self.data) < 1:
+			return
+		x,y,width,height = self.hv.allocation
 
+		mctx = self.hv.window.cairo_create()
+		if self.tdx == -1:
+			self.set_dxdy()
+		self.numtl = min(int((height - self.tht-4)/self.tht)+1,self.lines+1)
+		nrows = int((height - self.tht-4)/self.tht)+1 # rows on the screen, including empty ones
+
+		self.hbox2.set_size_request(max(width-self.tdx*(10+16*3),0),0)
+		if self.numtl >= self.lines:
+			self.vs.hide()
+		else:
+			self.vs.show()
+		if width >= self.tdx*(9+16*3):
+			self.hs.hide()
+		else:
+			self.hs.show()
+
+		if event and event.type == gtk.gdk.EXPOSE:
+			# window was uncovered, nothing changed unless someone forgot to tell us
+			self.mode = "c"
+		d = self.offnum - self.surfoff
+		if self.surface == None or self.surface.get_width() != width or self.surface.get_height() != height:
+			self.surface = cairo.ImageSurface (cairo.FORMAT_ARGB32, width, height)
+			self.bsurface = cairo.ImageSurface (cairo.FORMAT_ARGB32, width, height)
+			self.dirty = 1
+		if self.mode == "" or self.dirty or abs(d) >= nrows:
+			self.dirty = 1
+
+		ctx = cairo.Context (self.surface)
+		ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+		ctx.set_font_size(self.fontsize)
+		ctx.set_line_width(1)
+
+		if self.dirty:
+			self.draw_hdr(ctx,width,height)
+			self.draw_rows(ctx,0,nrows,width,height)
+			mctx.rectangle(0,0,width,height)
+		else:
+			# rows to redraw, in screen lines
+			rows = set([self.prer-self.offnum,self.curr-self.offnum])
+			for r in self.damage:
+				rows.add(r-self.offnum)
+			if self.sel != self.surfsel:
+				sels = [s for s in (self.sel,self.surfsel) if s]
+				r0 = max(min([s[0] for s in sels])-self.offnum,0)
+				r1 = min(max([s[2] for s in sels])-self.offnum,nrows)
+				rows.update(range(r0,r1+1))
+			if d:
+				self.scroll_surface(d,width,height)
+				ctx = cairo.Context (self.surface)
+				ctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+				ctx.set_font_size(self.fontsize)
+				ctx.set_line_width(1)
+				if d > 0:
+					rows.update(range(nrows-d-1,nrows+1))
+				else:
+					rows.update(range(0,-d+1))
+				mctx.rectangle(0,self.tht+4,width,height)
+			rows = sorted([r for r in rows if r >= 0 and r <= nrows])
+			# join neighbouring rows into bands
+			i = 0
+			while i < len(rows):
+				j = i
+				while j+1 < len(rows) and rows[j+1] == rows[j]+1:
+					j += 1
+				self.draw_rows(ctx,rows[i],rows[j],width,height)
+				mctx.rectangle(0,(rows[i]+1)*self.tht+4,width,(rows[j]-rows[i]+1)*self.tht)
+				i = j+1
+			self.draw_hdr(ctx,width,height)
+			mctx.rectangle(0,0,width,self.tht+4)
+			if self.mttrect:
+				mctx.rectangle(*self.mttrect)
+			if event and event.type == gtk.gdk.EXPOSE:
+				mctx.rectangle(*event.area)
+
+		self.dirty = 0
+		self.damage.clear()
+		self.surfoff = self.offnum
+		self.surfsel = self.sel
 		self.mode = ""
 
-		mctx.set_source_surface(cs,0,0)
+		mctx.clip()
+		mctx.set_source_surface(self.surface,0,0)
 		mctx.paint()
+		mctx.reset_clip()
 
+		# selection size tip is drawn on the window only
+		self.mttrect = None
+		if self.mtt:
+			mttstr = "%s/%x"%(self.mtt[2],self.mtt[2])
+			sh = len(mttstr)
+			self.mttrect = self.mtt[0]-self.tdx*0.5-1,self.mtt[1]-self.tht-7,self.tdx*(2+sh)+2,self.tht+6
+			mctx.rectangle(self.mtt[0]-self.tdx*0.5,self.mtt[1]-self.tht-6,self.tdx*(2+sh),self.tht+4) #-6
+			mctx.set_source_rgba(self.mttclr[0],self.mttclr[1],self.mttclr[2],self.mttclr[3])
+			mctx.fill()
+			mctx.set_source_rgb(self.mttxtclr[0],self.mttxtclr[1],self.mttxtclr[2])
+			mctx.move_to(self.mtt[0],self.mtt[1]-6) #-6
+			mctx.select_font_face(self.font, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
+			mctx.set_font_size(self.fontsize)
+			mctx.show_text(mttstr)
 
 		return True
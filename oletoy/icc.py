@@ -15,7 +15,6 @@
 #
 
 import sys,struct
-import gtk
 from utils import *
 
 def header (hd,size,data):
@@ -16,80 +16,69 @@
 
 import struct
 
-def inflate_vba_stream (data):
-  i = 0
-  pos = 0
-  buf = ""
-  res = ""
-  while i < len(data):
+# MS-OVBA: a chunk is a sequence of flag bytes, each followed by 8 tokens;
+# flag bit 0 is a literal byte, 1 is a 2-byte copy token. The split of the
+# copy token into offset and length bits depends on the position in the
+# decompressed chunk.
+vba_bits = [4]*4096
+for n in range(17,4096):
+  vba_bits[n] = max((n-1).bit_length(),4)
+
+def inflate_vba_tokens (data, i, end, out, chunks=False):
+  # appends the tokens of data[i:end] to out (bytearray); with chunks the
+  # tokens of the next chunk follow once 4096 bytes are out, after its header
+  base = len(out)
+  while i < end:
     flag = ord(data[i])
     i += 1
-    for mask in (1,2,4,8,16,32,64,128):
-     try:
-      if flag&mask:
-        addr = struct.unpack("<H",data[i:i+2])[0]
-        i += 2
-        win_pos = pos % 4096
-        if win_pos <= 0x80:
-          if win_pos <= 0x20:
-            if win_pos <= 0x10:
-              shift = 12
-            else:
-              shift = 11
-          else:
-            if win_pos <= 0x40:
-              shift = 10
-            else:
-              shift = 9
-        else:
-          if win_pos <= 0x200:
-            if win_pos <= 0x100:
-              shift = 8
-            else:
-              shift = 7
-          elif win_pos <= 0x800:
-            if win_pos <= 0x400:
-              shift = 6
-            else:
-              shift = 5
-          else:
-            shift = 4
-        blen = (addr & ((1 << shift) - 1)) + 3
-        distance = addr >> shift
-        clean = True
-        for j in range(blen):
-          srcpos = (pos - distance - 1) % 4096
-          c = buf[srcpos]
-          buf = buf[:pos % 4096] + c + buf[pos % 4096 + 1:]
-          pos +=1
-      else:  
-        if pos != 0 and pos % 4096 == 0 and clean:
-          i += 2  # why? (check gsf_msole_inflate)
-          clean = False
-          res += buf
+    for bit in range(8):
+      pos = len(out) - base
+      if not flag&(1<<bit):
+        if pos == 4096 and chunks:
+          i += 2
+          base = len(out)
           break
-        if i < len(data):
-          c = data[i]
-          buf = buf[:pos % 4096] + c + buf[pos % 4096 + 1:]
-          pos += 1
+        if i < end:
+          out.append(data[i])
           i += 1
-        clean = True
-     except:
-			 # FIXME!  Better handling of LZ stream ends?
-       print "Not enough bytes to decompress. Flag/Mask were %02x/%02x"%(flag,mask)
-       i += 1
-       break
-  if pos % 4096:
-    res += buf
-  return res
+        continue
+      if i + 2 > end:
+        print "Not enough bytes to decompress. Flag/Mask were %02x/%02x"%(flag,1<<bit)
+        return i
+      token = ord(data[i]) | (ord(data[i+1]) << 8)
+      i += 2
+      shift = 16 - vba_bits[pos & 0xfff]
+      blen = (token & ((1 << shift) - 1)) + 3
+      src = len(out) - (token >> shift) - 1
+      if src < 0:
+        print "Wrong copy token %04x at %d"%(token,len(out))
+        return i
+      if src + blen <= len(out):
+        out += out[src:src+blen]
+      else:
+        # overlapping copy repeats the last bytes
+        pat = out[src:]
+        out += (pat*(blen/len(pat)+1))[:blen]
+  return i
+
+def inflate_vba_stream (data):
+  # tokens of one chunk, or of full chunks one after another
+  out = bytearray()
+  inflate_vba_tokens(data,0,len(data),out,True)
+  return str(out)
 
 def inflate_vba_oletoy (data,ptype):
   if ord(data[0]) != 1:
     print "Attempt to inflate wrong stream"
     return ""
 
+  # streams written by the spec (e.g. by compress_vba) are read as they are
+  res = decompress_vba(data,True)
+  if res != None:
+    return res
+
   off = 1
-  res = ""
+  res = bytearray()
   while off < len(data):
     flags = struct.unpack("<H",data[off:off+2])[0]
     cf = (flags&0xf000)/0x1000
@@ -99,12 +88,139 @@ def inflate_vba_oletoy (data,ptype):
 # XLS is slightly different than PPT and DOC
 
     if cf == 0xb and clen > 0 and ((ptype[:3] != "XLS" and len(data)-off < 4096) or ptype[:3] == "XLS"):
-      res += inflate_vba_stream(data[off+2:off+2+clen+1])
+      inflate_vba_tokens(data,off+2,min(off+2+clen+1,len(data)),res)
       off += clen+3
+    elif cf == 3:
+      # uncompressed chunk
+      res += data[off+2:off+4098]
+      off += 4098
     else:
-      res += inflate_vba_stream(data[off+2:off+4096])
+      inflate_vba_tokens(data,off+2,min(off+4096,len(data)),res,True)
       off += 4096
-  return res
+  return str(res)
+
+def decompress_vba (data, strict=False):
+  # CompressedContainer as in the spec: every chunk by its header;
+  # strict returns None unless all chunks are valid and only the last is short
+  if data[:1] != "\x01":
+    return None
+  off = 1
+  res = bytearray()
+  while off + 2 <= len(data):
+    flags = ord(data[off]) | (ord(data[off+1]) << 8)
+    end = off + (flags & 0xfff) + 3
+    if strict:
+      if flags & 0x7000 != 0x3000 or end > len(data) or len(res) % 4096:
+        return None
+      if not flags & 0x8000 and end != off + 4098:
+        return None
+    end = min(end, len(data))
+    if flags & 0x8000:
+      start = len(res)
+      if inflate_vba_tokens(data,off+2,end,res) < end and strict:
+        return None
+      if strict and len(res) - start > 4096:
+        return None
+    else:
+      res += data[off+2:off+4098]
+      end = off + 4098
+    off = end
+  if strict and off != len(data):
+    return None
+  return str(res)
+
+def deflate_vba_chunk (data, start, end, depth=32):
+  # greedy LZ77 with hash chains over the 3 byte prefixes; the match may
+  # overlap the current position
+  out = bytearray()
+  head = {}
+  prev = [-1]*(end-start)
+  p = start
+  flagpos = -1
+  nbits = 8
+  while p < end:
+    if nbits == 8:
+      flagpos = len(out)
+      out.append(0)
+      nbits = 0
+    pos = p - start
+    best = 0
+    if pos > 0 and p + 3 <= end:
+      bits = vba_bits[pos]
+      maxlen = min((1 << (16 - bits)) + 2, end - p)
+      minsrc = p - (1 << bits)
+      key = data[p:p+3]
+      cand = head.get(key,-1)
+      n = depth
+      while cand >= minsrc and cand >= start and n:
+        l = 3
+        while l < maxlen and data[cand+l] == data[p+l]:
+          l += 1
+        if l > best:
+          best = l
+          bsrc = cand
+          if l == maxlen:
+            break
+        cand = prev[cand-start]
+        n -= 1
+    if best >= 3:
+      shift = 16 - vba_bits[pos]
+      token = ((p - bsrc - 1) << shift) | (best - 3)
+      out[flagpos] |= 1 << nbits
+      out.append(token & 0xff)
+      out.append(token >> 8)
+      step = best
+    else:
+      out.append(data[p])
+      step = 1
+    for q in range(p, min(p+step, end-2)):
+      key = data[q:q+3]
+      prev[q-start] = head.get(key,-1)
+      head[key] = q
+    p += step
+    nbits += 1
+  return out
+
+def compress_vba (data):
+  # CompressedContainer for data; chunks that do not get smaller are stored
+  res = bytearray("\x01")
+  for start in range(0,len(data),4096):
+    end = min(start+4096,len(data))
+    chunk = deflate_vba_chunk(data,start,end)
+    if len(chunk) <= 4096:
+      res += struct.pack("<H",0xb000|(len(chunk)-1))
+      res += chunk
+    else:
+      # raw chunks always hold 4096 bytes; a short last one only gets
+      # here if it does not fit compressed
+      res += "\xff\x3f"
+      res += data[start:end]
+      res += "\x00"*(4096-(end-start))
+  return str(res)
+
+def bench_vba (size=1<<20):
+  # round trip of a module-like text of size bytes
+  import random,time
+  random.seed(size)
+  words = ["Dim","As","Integer","String","If","Then","End","Sub","Function",
+    "For","Next","Each","In","Set","Nothing","Call","ActiveSheet","Cells",
+    "Range","Value","=","+","(",")",",","\r\n","\r\n  ","i","j","sName"]
+  text = []
+  n = 0
+  while n < size:
+    w = random.choice(words)+" "
+    text.append(w)
+    n += len(w)
+  data = "".join(text)[:size]
+  t = time.time()
+  comp = compress_vba(data)
+  t1 = time.time()
+  dec = decompress_vba(comp)
+  t2 = time.time()
+  dec2 = inflate_vba(comp,"XLS")
+  t3 = time.time()
+  print "%d -> %d bytes, compress %.2fs, decompress %.2fs, inflate_vba %.2fs, %s"%(
+    len(data),len(comp),t1-t,t2-t1,t3-t2,dec == data and dec2 == data and "ok" or "MISMATCH")
 
 def inflate_vba_gsf (data,ptype):
   import ctypes as C
@@ -123,48 +239,47 @@ def inflate_vba (data,ptype):
     return inflate_vba_oletoy (data,ptype)
 
 # vsd inflate
-def inflate(ptr,vsd):
-#    print "Inf %02x %02x %02x %02x %02x"%(ptr.type,ptr.address,ptr.offset,ptr.length,ptr.format),len(vsd)
-    res = ''
-    buff = ['\x00']*4096
-    pos = 0
+# LZSS with a 4096 byte ring that starts zeroed and is written from 0xfee;
+# flag bit 1 is a literal, 0 is a 2-byte copy token with the ring address
+# of the source and length-3 in the low nibble of the second byte.
+def inflate_vsd(data, start=0, end=None):
+    if end == None:
+        end = len(data)
+    src = bytearray(data[start:end])
+    n = len(src)
+    # output follows the initial ring content, so copies are plain slices
+    out = bytearray(4096)
     i = 0
-    offset = ptr.offset
-    while i < ptr.length:
-        try:
-            flag = ord(vsd[offset])
-            offset=offset+1
-            i = i + 1
-            for mask in (1,2,4,8,16,32,64,128):
-                if flag&mask: # this bit in flag is ON
-                    pst = pos&4095
-                    buff[pst] =  vsd[offset]
-                    offset=offset+1
-                    res = res + buff[pst]
-                    pos=pos+1
-                    i = i + 1
+    while i < n:
+        flag = src[i]
+        i += 1
+        for bit in range(8):
+            if flag&(1<<bit):
+                if i >= n:
+                    break
+                out.append(src[i])
+                i += 1
+            else:
+                if i + 2 > n:
+                    break
+                point = ((src[i+1]&0xf0)<<4)|src[i]
+                dlen = (src[i+1]&15) + 3
+                i += 2
+                # distance to the byte at that ring address, up to 4096 back
+                pos = len(out)
+                dist = ((pos - point - 18)&4095) or 4096
+                if dist >= dlen:
+                    out += out[pos-dist:pos-dist+dlen]
                 else:
-                    if offset-ptr.offset > ptr.length - 2:
-                        break
-                    addr1 = ord(vsd[offset])
-                    offset=offset+1
-                    addr2 = ord(vsd[offset])
-                    offset=offset+1
-                    dlen = (addr2&15) + 3
-                    point = (addr2&240)*16+addr1
-                    i = i + 2
-                    if point > 4078:
-                        point = point - 4078
-                    else:
-                        point = point + 18
-                    for j in range (dlen):
-                        buff[(pos+j)&4095]=buff[(point+j)&4095]
-                        res = res + buff[(point+j)&4095]
-                    pos = pos + dlen
-        except:
-            print 'Inflate failed',i,ptr.length
-            return res
-    return res
+                    pat = out[pos-dist:]
+                    out += (pat*(dlen/dist+1))[:dlen]
+    return str(out[4096:])
+
+def inflate(ptr,vsd):
+#    print "Inf %02x %02x %02x %02x %02x"%(ptr.type,ptr.address,ptr.offset,ptr.length,ptr.format),len(vsd)
+    if ptr.offset + ptr.length > len(vsd):
+        print 'Inflate failed',len(vsd)-ptr.offset,ptr.length
+    return inflate_vsd(vsd,ptr.offset,ptr.offset+ptr.length)
 
 # vsd deflate
 def deflate_piastre (buf, flavour=0):
@@ -182,6 +297,95 @@ def deflate_piastre (buf, flavour=0):
   res += '\x00'*n
   return res
 
-def deflate (buf, flavour):
-  # wrapper to avoid later renaming if I implement something better then 'piastre' ;-)
+def deflate_vsd (buf, depth=32):
+    # greedy LZSS for inflate_vsd with hash chains over the 3 byte prefixes;
+    # the zeroed ring before the data is matched too
+    data = '\x00'*4096 + buf
+    out = bytearray()
+    head = {}
+    prev = {}
+    p = 4096
+    end = len(data)
+    # runs of zeros can start from the ring
+    for q in range(4096-18,min(4096,end-2)):
+        key = data[q:q+3]
+        prev[q] = head.get(key,-1)
+        head[key] = q
+    flagpos = -1
+    nbits = 8
+    while p < end:
+        if nbits == 8:
+            flagpos = len(out)
+            out.append(0)
+            nbits = 0
+        best = 0
+        if p + 3 <= end:
+            maxlen = min(18, end - p)
+            cand = head.get(data[p:p+3],-1)
+            n = depth
+            while cand >= p - 4096 and n:
+                l = 3
+                while l < maxlen and data[cand+l] == data[p+l]:
+                    l += 1
+                if l > best:
+                    best = l
+                    bsrc = cand
+                    if l == maxlen:
+                        break
+                cand = prev.get(cand,-1)
+                n -= 1
+        if best >= 3:
+            point = (bsrc - 4096 - 18)&4095
+            out.append(point&0xff)
+            out.append(((point>>4)&0xf0)|(best-3))
+            step = best
+        else:
+            out[flagpos] |= 1<<nbits
+            out.append(data[p])
+            step = 1
+        for q in range(p, min(p+step, end-2)):
+            key = data[q:q+3]
+            prev[q] = head.get(key,-1)
+            head[key] = q
+        p += step
+        nbits += 1
+    return str(out)
+
+def deflate (buf, flavour=0):
+  # flavour 1 is for the 'piastre' output with VBA style flags
+  if flavour == 0:
+    return deflate_vsd (buf)
   return deflate_piastre (buf, flavour)
+
+def bench_vsd (size=1<<20):
+  # round trip of chunk records like in page and stencil streams
+  import random,time
+  random.seed(size)
+  recs = []
+  n = 0
+  ix = 0
+  while n < size:
+    ctype = random.choice([0x83,0x85,0x8a,0x9b,0x92,0x9c,0x8b])
+    body = "".join([struct.pack("<Bd",0x20,random.choice([0.,0.25,1.,2.5,random.random()])) for i in range(random.randint(2,8))])
+    rec = struct.pack("<IIIIBBB",ctype,ix,0,len(body),1,2,0)+body
+    recs.append(rec)
+    n += len(rec)
+    ix += 1
+  data = "".join(recs)[:size]
+  t = time.time()
+  comp = deflate_vsd(data)
+  t1 = time.time()
+  dec = inflate_vsd(comp)
+  t2 = time.time()
+  print "%d -> %d bytes, compress %.2fs, decompress %.2fs, %s"%(
+    len(data),len(comp),t1-t,t2-t1,dec == data and "ok" or "MISMATCH")
+
+if __name__ == '__main__':
+  import sys
+  bench = bench_vba
+  args = sys.argv[1:]
+  if args and args[0] in ("vba","vsd"):
+    bench = {"vba":bench_vba,"vsd":bench_vsd}[args[0]]
+    args = args[1:]
+  for a in args or ["1048576"]:
+    bench(int(a))
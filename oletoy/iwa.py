@@ -14,8 +14,10 @@
 # USA
 #
 
+import __builtin__
 import struct
 
+import handlers
 from utils import add_iter, add_pgiter, bflag2txt, key2txt, rdata
 
 ### General utils
@@ -86,68 +88,148 @@ def read_var(data, offset):
 #     order. The nnnnnn bits of reference are length - 1.
 
 def uncompress(data):
+	src = bytearray(data)
 	result = bytearray()
 
-	def append_ref(offset, length):
-		assert offset <= len(result)
-		if offset >= length:
-			start = len(result) - offset
-			result.extend(result[start:start + length])
-		else:
-			# The run of literals is inserted repeatedly
-			i = len(result) - offset
-			while length > 0:
-				result.append(result[i])
-				i += 1
-				length -= 1
-
 	off = 0
 	(uncompressed_length, off) = read_var(data, off)
 
-	while off < len(data):
+	while off < len(src):
 		# print('at offset %x:' % (off + 4))
-		c = ord(data[off])
+		c = src[off]
 		off += 1
 		typ = c & 0x3
 
 		if typ == 0: # literals
 			if (c & 0xf0) == 0xf0:
 				count = (c >> 2) & 0x3
-				length = ord(data[off]) + 1
+				length = src[off] + 1
 				off += 1
 				i = 1
 				while i <= count:
-					b = ord(data[off])
-					length += (b << i * 8)
+					length += (src[off] << i * 8)
 					i += 1
 					off += 1
 			else:
 				length = (c >> 2) + 1
 			# print('  literal run: length = %x' % length)
-			result.extend(data[off:off + length])
+			result += src[off:off + length]
 			off += length
+			continue
 		elif typ == 1: # near reference
 			length = ((c >> 2) & 0x7) + 4
-			high = c >> 5
-			low = ord(data[off])
-			offset = (high << 8) | low
+			offset = ((c >> 5) << 8) | src[off]
 			off += 1
 			# print('  near ref: offset = %x, length = %x' % (offset, length))
-			append_ref(offset, length)
 		elif typ == 2: # far reference
 			length = (c >> 2) + 1
-			offset = ord(data[off]) | (ord(data[off + 1]) << 8)
+			offset = src[off] | (src[off + 1] << 8)
 			off += 2
 			# print('  far ref: offset = %x, length = %x' % (offset, length))
-			append_ref(offset, length)
 		else:
 			print("unknown type at offset 0x%x inside block" % (off + 4))
 			assert False
 
+		assert 0 < offset <= len(result)
+		start = len(result) - offset
+		if offset >= length:
+			result += result[start:start + length]
+		else:
+			# The run of literals is inserted repeatedly; every copy
+			# doubles the run available for the next one
+			while length > 0:
+				n = min(len(result) - start, length)
+				result += result[start:start + n]
+				length -= n
+
 	assert uncompressed_length == len(result)
 
 	return result
 
+def write_var(n):
+	"""Write a variable length number."""
+	cs = []
+	while n > 0x7f:
+		cs.append(chr((n & 0x7f) | 0x80))
+		n >>= 7
+	cs.append(chr(n))
+	return ''.join(cs)
+
+def compress(data):
+	"""Compress a block for uncompress(), with references up to 64 KiB back."""
+	result = [write_var(len(data))]
+
+	def literals(start, end):
+		while start < end:
+			length = min(end - start, 0x10000)
+			if length <= 60:
+				result.append(chr((length - 1) << 2))
+			elif length <= 0x100:
+				result.append('\xf0' + chr(length - 1))
+			else:
+				result.append('\xf4' + struct.pack('<H', length - 1))
+			result.append(data[start:start + length])
+			start += length
+
+	table = {}
+	lit = 0
+	off = 0
+	end = len(data) - 4
+	while off <= end:
+		key = data[off:off + 4]
+		cand = table.get(key, -1)
+		table[key] = off
+		if cand < 0 or off - cand > 0xffff:
+			off += 1
+			continue
+		length = 4
+		limit = len(data) - off
+		while length < limit and data[cand + length] == data[off + length]:
+			length += 1
+		literals(lit, off)
+		offset = off - cand
+		off += length
+		lit = off
+		while length > 0:
+			if 4 <= length <= 11 and offset < 0x800:
+				result.append(chr(((offset >> 8) << 5) | ((length - 4) << 2) | 1) + chr(offset & 0xff))
+				length = 0
+			else:
+				n = min(length, 64)
+				result.append(chr(((n - 1) << 2) | 2) + struct.pack('<H', offset))
+				length -= n
+	literals(lit, len(data))
+	return ''.join(result)
+
+def split_chunks(data):
+	"""Return the (offset, length) of compressed blocks in an IWA stream."""
+	chunks = []
+	off = 0
+	while off + 4 <= len(data):
+		length = struct.unpack('<I', data[off:off + 4])[0] >> 8
+		off += 4
+		chunks.append((off, length))
+		off += length
+	return chunks
+
+def uncompress_chunks(data, imap=map):
+	"""Uncompress chunks of an IWA stream one by one.
+
+	The chunks do not refer to each other, so imap can be a parallel map,
+	e.g. multiprocessing.Pool().imap.
+	"""
+	blocks = (data[off:off + length] for (off, length) in split_chunks(data))
+	for uncompressed in imap(uncompress, blocks):
+		yield uncompressed
+
+def compress_chunks(data):
+	"""Make an IWA stream from uncompressed data."""
+	result = []
+	for off in range(0, len(data), 0x10000):
+		block = compress(data[off:off + 0x10000])
+		result.append('\x00' + struct.pack('<I', len(block))[:3] + block)
+	return ''.join(result)
+
 ### Protocol buffers parser
 
 # Description of the wire format: https://developers.google.com/protocol-buffers/docs/encoding
@@ -1560,13 +1642,47 @@ class IWAParser(object):
 		self.tile_row_data = None
 		self.tile_row_iter = None
 		self.tile_row_offsets = {}
-
-	def parse(self):
-		off = 0
-		obj_num = 0
+		self.start = 0
+		self.obj_num = 0
+		self.pending = []
+		self.pending_len = 0
+		self.need = 0
+
+	def feed(self, data):
+		"""Add more data and parse the objects that are complete now.
+
+		Chunks are only collected until the object being read can be
+		complete, so an object spanning many chunks is joined once.
+		"""
+		self.pending.append(data)
+		self.pending_len += len(data)
+		if len(self.data) - self.start + self.pending_len >= self.need:
+			self.parse(False)
+
+	def parse(self, final=True):
+		if self.pending:
+			# offsets are relative to the data not parsed yet; nodes only
+			# keep slices of it
+			self.data = self.data[self.start:] + ''.join(self.pending)
+			self.start = 0
+			self.pending = []
+			self.pending_len = 0
+		self.need = 0
+		off = self.start
+		obj_num = self.obj_num
 		while off < len(self.data):
 			obj_start = off
+			if not final:
+				end = off
+				while end < len(self.data) and ord(self.data[end]) & 0x80:
+					end += 1
+				if end >= len(self.data):
+					self.need = end + 1 - obj_start
+					break
 			(hdr_len, off) = read_var(self.data, off)
+			if not final and off + hdr_len > len(self.data):
+				self.need = off + hdr_len - obj_start
+				break
 			hdr = self._parse_header(off, hdr_len)
 			data_len = 0
 			obj_id = None
@@ -1578,6 +1694,9 @@ class IWAParser(object):
 					obj_type = hdr.value[2][0].value[1][0].value
 				if hdr.value[2][0].value.has_key(3):
 					data_len = hdr.value[2][0].value[3][0].value
+			if not final and off + hdr_len + data_len > len(self.data):
+				self.need = off + hdr_len + data_len - obj_start
+				break
 			obj_data = self.data[obj_start:off + hdr_len + data_len]
 			obj_name = None
 			if obj_type:
@@ -1598,6 +1717,8 @@ class IWAParser(object):
 				self._add_pgiter('Data', data, off, off + data_len, objiter)
 				off += data_len
 			obj_num += 1
+			self.start = off
+			self.obj_num = obj_num
 
 	_HEADER_MSG = message({1: ('ID', int64), 2: ('Data info',
 		{
@@ -1931,24 +2052,28 @@ def open(data, page, parent, subtype):
 		objects.update(NUMBERS_OBJECTS)
 		objects.update(PAGES_OBJECTS)
 
-	n = 0
-	off = 0
-	uncompressed_data = bytearray()
-
-	while off < len(data):
-		off += 1
-		(length, off) = rdata(data, off, '<H')
-		off += 1
-
-		block = data[off - 4:off + int(length)]
-		uncompressed = uncompress(block[4:])
-		uncompressed_data.extend(uncompressed)
-
-		n += 1
-		off += length
-
-	uncompressed_data = str(uncompressed_data)
-	parser = IWAParser(uncompressed_data, page, parent, objects)
+	# objects are shown as soon as the chunk that completes them is read
+	parser = IWAParser('', page, parent, objects)
+	for uncompressed in uncompress_chunks(data):
+		parser.feed(str(uncompressed))
 	parser.parse()
 
+def save(page, fname):
+	model = page.view.get_model()
+	data = []
+	iter1 = model.get_iter_first()
+	while iter1 != None:
+		if model.get_value(iter1, 1) == ('iwa', 'iwa_object'):
+			data.append(model.get_value(iter1, 3))
+		iter1 = model.iter_next(iter1)
+	if not data:
+		print('No IWA objects at the top level')
+		return
+	# open() in this module is the parser entry point
+	f = __builtin__.open(fname, 'wb')
+	f.write(compress_chunks(''.join(data)))
+	f.close()
+
+handlers.register("iwa", iwa_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
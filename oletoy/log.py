@@ -0,0 +1,100 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+
+# Messages of the parsers. Every module gets a Logger with one method per
+# level; methods of disabled levels are a no-op, so a disabled message costs
+# a call and is never formatted. In a hot loop check the level first:
+#	if lg.on(log.TRACE): ...
+# A message format is printed limit times, the rest are counted and
+# reported by summary(), which App calls after a file is loaded.
+
+import sys
+
+OFF,ERROR,WARN,INFO,DEBUG,TRACE = 0,1,2,3,4,5
+names = {"off":OFF, "error":ERROR, "warn":WARN, "info":INFO, "debug":DEBUG, "trace":TRACE}
+
+level = INFO # for modules not in levels
+levels = {} # module name -> level
+limit = 20 # times a message format is printed before it is only counted
+out = sys.stdout
+
+loggers = {}
+counts = {} # (module, format) -> number of calls
+
+def none(*args):
+	pass
+
+class Logger():
+	def __init__(self, name):
+		self.name = name
+		self.level = OFF
+		self.setup()
+
+	def setup(self):
+		self.level = levels.get(self.name,level)
+		for n,l in names.items():
+			if l != OFF:
+				if l <= self.level:
+					setattr(self,n,self.emitter(n))
+				else:
+					setattr(self,n,none)
+
+	def on(self, l):
+		return l <= self.level
+
+	def emitter(self, lname):
+		def emit(fmt, *args):
+			k = (self.name,fmt)
+			n = counts.get(k,0) + 1
+			counts[k] = n
+			if n > limit:
+				return
+			if args:
+				fmt = fmt%args
+			if lname == "info":
+				out.write("%s\n"%fmt)
+			else:
+				out.write("%s %s: %s\n"%(self.name,lname,fmt))
+		return emit
+
+def get(name):
+	lg = loggers.get(name)
+	if lg == None:
+		lg = loggers[name] = Logger(name)
+	return lg
+
+def parse_level(l):
+	if isinstance(l,basestring):
+		return names[l.lower()]
+	return l
+
+def set_level(l, module=None):
+	# l is a number or one of the names; module None sets the default
+	global level
+	if module == None:
+		level = parse_level(l)
+	else:
+		levels[module] = parse_level(l)
+	for lg in loggers.values():
+		lg.setup()
+
+def summary():
+	# repeated messages that were not printed; the counts start over
+	for (name,fmt),n in sorted(counts.items()):
+		if n > limit:
+			out.write("%s: %d more of \"%s\"\n"%(name,n-limit,fmt))
+	counts.clear()
@@ -21,6 +21,7 @@ import struct
 import zlib
 
 import otxml
+import handlers
 from utils import add_iter, add_pgiter, key2txt, rdata
 
 def read_unistr(data, off, bytelen):
@@ -1057,4 +1058,6 @@ def open(buf, page, parent):
 	reader = lrf_parser(buf, page, parent)
 	reader.read()
 
+handlers.register("lrf", lrf_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
@@ -15,6 +15,7 @@
 #
 
 import sys,struct,gtk
+import handlers
 from utils import *
 
 
@@ -204,7 +205,7 @@ def parse (buf,page,parent):
 		page.model.set_value(iter1,0,"Block %02x"%i)
 		page.model.set_value(iter1,1,("mdb",0))
 		page.model.set_value(iter1,2,0x1000)
-		page.model.set_value(iter1,3,buf[offset:offset+0x1000])
+		page.model.set_value(iter1,3,DataView(buf,offset,0x1000))
 		bt = struct.unpack("<H",buf[offset:offset+2])[0]
 		if block_types.has_key(bt):
 			bts = block_types[bt][0]
@@ -216,3 +217,5 @@ def parse (buf,page,parent):
 		page.model.set_value(iter1,6,page.model.get_string_from_iter(iter1))
 		offset += 0x1000
 		i += 1
+
+handlers.register("mdb", rec_ids, ("hd","data"))
@@ -0,0 +1,258 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+# In-memory record tree with the part of the gtk.TreeStore API used by the
+# parsers, so they can run without GTK widgets. Nodes are the iters.
+
+ncols = 10
+
+class Node(object):
+	__slots__ = ("parent","children","row","idx","dirty")
+
+	def __init__(self, parent, row=None):
+		self.parent = parent
+		self.children = []
+		# name, type, length, data, value2, colour, path, type string, command, tooltip
+		self.row = [None,None,0,None,None,None,None,None,None,None]
+		if row != None:
+			self.row[:len(row)] = row
+		self.idx = 0
+		self.dirty = False # already in NodeStore.changed
+
+	@property
+	def name(self):
+		return self.row[0]
+
+	@property
+	def ftype(self):
+		return self.row[1]
+
+	@property
+	def length(self):
+		return self.row[2]
+
+	@property
+	def data(self):
+		return self.row[3]
+
+
+class Info():
+	# stands in for hexdump.hexdump where parsers keep page-wide values
+	def __init__(self):
+		self.version = None
+		self.context = None
+		self.width = 0
+		self.height = 0
+		self.dispscale = 1.
+
+
+class Cancelled(Exception):
+	pass
+
+
+class NodeStore():
+	def __init__(self, types=None):
+		self.root = Node(None)
+		self.types = types # gobject type names when it stands for a side gtk.TreeStore
+		self.added = None # list of new nodes in creation order, for a background loader
+		self.changed = None # nodes whose rows were set since the loader took them
+		self.cancelled = False # the next insert raises Cancelled
+
+	def node(self, iter1):
+		if iter1 == None:
+			return self.root
+		return iter1
+
+	def top(self, node):
+		# root is not an iter
+		if node is self.root:
+			return None
+		return node
+
+	def renumber(self, node, start=0):
+		for i in range(start,len(node.children)):
+			node.children[i].idx = i
+
+	def insert(self, parent, position, row=None):
+		if self.cancelled:
+			raise Cancelled()
+		p = self.node(parent)
+		n = Node(p,row)
+		if position < 0 or position >= len(p.children):
+			n.idx = len(p.children)
+			p.children.append(n)
+		else:
+			p.children.insert(position,n)
+			self.renumber(p,position)
+		if self.added != None:
+			self.added.append(n)
+		return n
+
+	def append(self, parent, row=None):
+		if self.cancelled:
+			raise Cancelled()
+		p = self.node(parent)
+		n = Node(p,row)
+		n.idx = len(p.children)
+		p.children.append(n)
+		if self.added != None:
+			self.added.append(n)
+		return n
+
+	def prepend(self, parent, row=None):
+		return self.insert(parent,0,row)
+
+	def insert_before(self, parent, sibling, row=None):
+		if sibling == None:
+			return self.append(parent,row)
+		return self.insert(self.top(sibling.parent),sibling.idx,row)
+
+	def insert_after(self, parent, sibling, row=None):
+		if sibling == None:
+			return self.prepend(parent,row)
+		return self.insert(self.top(sibling.parent),sibling.idx+1,row)
+
+	def remove(self, iter1):
+		# unlike gtk.TreeStore, iter1 is not moved to the next row
+		p = iter1.parent
+		del p.children[iter1.idx]
+		self.renumber(p,iter1.idx)
+		iter1.parent = None
+		return False
+
+	def clear(self):
+		for n in self.root.children:
+			n.parent = None
+		self.root.children = []
+
+	def set_value(self, iter1, col, value):
+		iter1.row[col] = value
+		if self.changed != None and not iter1.dirty:
+			iter1.dirty = True
+			self.changed.append(iter1)
+
+	def set(self, iter1, *args):
+		if len(args) == 1 and isinstance(args[0],dict):
+			args = reduce(lambda a,b: a+b, args[0].items(), ())
+		row = iter1.row
+		for i in range(0,len(args)-1,2):
+			row[args[i]] = args[i+1]
+		if self.changed != None and not iter1.dirty:
+			iter1.dirty = True
+			self.changed.append(iter1)
+
+	def get_value(self, iter1, col):
+		return iter1.row[col]
+
+	def get_n_columns(self):
+		if self.types != None:
+			return len(self.types)
+		return ncols
+
+	def iter_n_children(self, iter1):
+		return len(self.node(iter1).children)
+
+	def iter_nth_child(self, parent, n):
+		ch = self.node(parent).children
+		if 0 <= n < len(ch):
+			return ch[n]
+		return None
+
+	def iter_children(self, iter1):
+		return self.iter_nth_child(iter1,0)
+
+	def iter_has_child(self, iter1):
+		return len(iter1.children) > 0
+
+	def iter_next(self, iter1):
+		p = iter1.parent
+		if p == None or iter1.idx + 1 >= len(p.children):
+			return None
+		return p.children[iter1.idx+1]
+
+	def iter_parent(self, iter1):
+		return self.top(iter1.parent)
+
+	def get_iter_first(self):
+		return self.iter_nth_child(None,0)
+
+	def is_ancestor(self, iter1, descendant):
+		p = descendant.parent
+		while p != None:
+			if p is iter1:
+				return True
+			p = p.parent
+		return False
+
+	def get_path(self, iter1):
+		path = []
+		n = iter1
+		while n.parent != None:
+			path.append(n.idx)
+			n = n.parent
+		path.reverse()
+		return tuple(path)
+
+	def get_string_from_iter(self, iter1):
+		return ":".join([str(i) for i in self.get_path(iter1)])
+
+	def find(self, path):
+		# node at path or None; path is a tuple, an int or a "0:1:2" string
+		if isinstance(path,basestring):
+			try:
+				path = [int(i) for i in path.split(":")]
+			except ValueError:
+				return None
+		elif isinstance(path,int):
+			path = (path,)
+		n = self.root
+		for i in path:
+			if i < 0 or i >= len(n.children):
+				return None
+			n = n.children[i]
+		return self.top(n)
+
+	def get_iter(self, path):
+		n = self.find(path)
+		if n == None:
+			raise ValueError("invalid tree path")
+		return n
+
+	def get_iter_from_string(self, path):
+		return self.get_iter(path)
+
+	def foreach(self, func, *data):
+		# like gtk.TreeModel.foreach; func returns True to stop
+		for n in self.walk():
+			if func(self,self.get_path(n),n,*data):
+				return
+
+	def walk(self, iter1=None):
+		# all nodes below iter1 in tree order
+		stack = [self.node(iter1).children[::-1]]
+		while stack:
+			if not stack[-1]:
+				stack.pop()
+				continue
+			n = stack[-1].pop()
+			yield n
+			if n.children:
+				stack.append(n.children[::-1])
+
+	def __getitem__(self, path):
+		if isinstance(path,Node):
+			return path.row
+		return self.get_iter(path).row
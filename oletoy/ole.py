@@ -15,180 +15,301 @@
 
 
 import os
-import sys,struct,subprocess
-from tempfile import mkstemp
-import gtk
-import tree
-import hexdump
-import pub, pubblock, escher, quill
-import vsd, xls, ppt, vba, doc, qpw, ppp, vsd2, pm6, dsf
-import wls
-import wt602
-import zmf
-import bmi
+import sys,struct
+from collections import OrderedDict
+import handlers
 from utils import *
 
+lazy_import("""pub pubblock escher quill vsd xls ppt vba doc qpw ppp vsd2 pm6 dsf
+	wls wt602 zmf bmi""", globals())
+
 ropen = ""
 
-def cdir_to_treeiter(page,parent,cdir,dircache):
-	dirspl = cdir.split("/")
-	pn = parent
-	pnn = ""
-	for i in dirspl:
-		jn = pnn+"/"+i
-		if not jn in dircache.keys():
-			pn = add_pgiter(page,i,"ole",jn,"",pn)
-			dircache[jn] = pn
-		pnn = jn
+# size in bytes of stream data kept in memory per opened OLE container
+cache_limit = 64*1024*1024
+
+cfb_nostream = 0xffffffff
+
+class StreamCache():
+	# LRU of stream data limited by the total size in bytes
+	def __init__(self,limit):
+		self.limit = limit
+		self.size = 0
+		self.items = OrderedDict()
+
+	def get(self,key):
+		data = self.items.pop(key,None)
+		if data is not None:
+			self.items[key] = data
+		return data
+
+	def put(self,key,data):
+		old = self.items.pop(key,None)
+		if old is not None:
+			self.size -= len(old)
+		if len(data) > self.limit:
+			return
+		self.items[key] = data
+		self.size += len(data)
+		while self.size > self.limit:
+			k,v = self.items.popitem(False)
+			self.size -= len(v)
+
+class CFBEntry():
+	def __init__(self,sid,data):
+		namelen = struct.unpack("<H",data[0x40:0x42])[0]
+		self.sid = sid
+		self.name = unicode(data[0:max(namelen-2,0)],"utf-16le").encode("utf-8")
+		self.type = ord(data[0x42])
+		self.color = ord(data[0x43])
+		self.left,self.right,self.child = struct.unpack("<III",data[0x44:0x50])
+		self.start = struct.unpack("<I",data[0x74:0x78])[0]
+		self.size = struct.unpack("<Q",data[0x78:0x80])[0]
+		self.path = ""
+
+
+class CFB():
+	# in-process reader for Compound File Binary (OLE2) containers
+	def __init__(self,buf):
+		if buf[:8] != "\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
+			raise ValueError("No OLE signature found")
+		self.buf = buf
+		self.majver = struct.unpack("<H",buf[0x1a:0x1c])[0]
+		self.secsize = 1 << struct.unpack("<H",buf[0x1e:0x20])[0]
+		self.minisecsize = 1 << struct.unpack("<H",buf[0x20:0x22])[0]
+		nfatsec,self.dirsecloc = struct.unpack("<II",buf[0x2c:0x34])
+		self.cutoff,self.minifatloc,nminifat,difatloc,ndifat = struct.unpack("<5I",buf[0x38:0x4c])
+
+		# DIFAT: 109 entries in the header, the rest chained through DIFAT sectors
+		self.difat = list(struct.unpack("<109I",buf[0x4c:0x200]))
+		self.difatsec = []
+		per_sec = self.secsize/4 - 1
+		while difatloc < cfb_nostream - 1 and len(self.difatsec) < ndifat:
+			self.difatsec.append(difatloc)
+			ids = struct.unpack("<%dI"%(per_sec+1),self.sector(difatloc))
+			self.difat += ids[:per_sec]
+			difatloc = ids[per_sec]
+		self.difat = [i for i in self.difat[:nfatsec] if i < cfb_nostream - 1]
+
+		fat = "".join([self.sector(i) for i in self.difat])
+		self.fat = struct.unpack("<%dI"%(len(fat)/4),fat)
+		minifat = "".join([self.sector(i) for i in self.chain(self.minifatloc)])
+		self.minifat = struct.unpack("<%dI"%(len(minifat)/4),minifat)
+
+		dirdata = "".join([self.sector(i) for i in self.chain(self.dirsecloc)])
+		self.entries = []
+		for off in range(0,len(dirdata)-0x7f,0x80):
+			self.entries.append(CFBEntry(off/0x80,dirdata[off:off+0x80]))
+		for e in self.entries:
+			if self.majver == 3:
+				e.size &= 0xffffffff
+		self.root = self.entries[0]
+		self.ministream = None
+		self.cache = StreamCache(cache_limit)
+
+	def sector(self,idx):
+		return self.buf[(idx+1)*self.secsize:(idx+2)*self.secsize]
+
+	def chain(self,idx,fat=None,count=-1):
+		if fat is None:
+			fat = self.fat
+		chain = []
+		while idx < len(fat) and len(chain) <= len(fat) and len(chain) != count:
+			chain.append(idx)
+			idx = fat[idx]
+		return chain
+
+	def read_chain(self,idx,size):
+		count = (size+self.secsize-1)/self.secsize
+		return "".join([self.sector(i) for i in self.chain(idx,None,count)])[:size]
+
+	def read(self,entry,size=None):
+		# whole stream, or only its first 'size' bytes
+		if entry.type != 2:
+			return ""
+		if size is None or size > entry.size:
+			size = entry.size
+		if entry.size < self.cutoff:
+			if self.ministream is None:
+				self.ministream = self.read_chain(self.root.start,self.root.size)
+			ss = self.minisecsize
+			ms = self.ministream
+			count = (size+ss-1)/ss
+			return "".join([ms[i*ss:(i+1)*ss] for i in self.chain(entry.start,self.minifat,count)])[:size]
+		return self.read_chain(entry.start,size)
+
+	def stream(self,entry):
+		# read() through the LRU cache, for on-demand access to the streams
+		data = self.cache.get(entry.sid)
+		if data is None:
+			data = self.read(entry)
+			self.cache.put(entry.sid,data)
+		return data
+
+	def children(self,entry):
+		# in-order walk of the red-black tree of the storage's children
+		res = []
+		stack = []
+		seen = set()
+		sid = entry.child
+		while 1:
+			while sid < len(self.entries) and not sid in seen:
+				seen.add(sid)
+				stack.append(sid)
+				sid = self.entries[sid].left
+			if not stack:
+				return res
+			sid = stack.pop()
+			res.append(self.entries[sid])
+			sid = self.entries[sid].right
+
+	def walk(self,entry=None,path=""):
+		# depth-first list of (entry,parent entry); sets entry.path
+		if entry is None:
+			entry = self.root
+		res = []
+		for e in self.children(entry):
+			name = e.name
+			if len(name) and ord(name[0]) < 32:
+				name = name[1:]
+			e.path = path+name
+			res.append((e,entry))
+			if e.type == 1:
+				res += self.walk(e,e.path+"/")
+		return res
+
+
+class OLEStream():
+	# column 4 payload of a stream row: the data is read from the container
+	# and the format parser runs only when the row is activated or expanded
+	def __init__(self,cfb,entry,parser=None):
+		self.cfb = cfb
+		self.entry = entry
+		self.parser = parser
+
+	def read(self):
+		return self.cfb.stream(self.entry)
+
+	def load(self,page,iter1):
+		if self.parser is None:
+			return
+		parser = self.parser
+		self.parser = None
+		child = page.model.iter_children(iter1)
+		if child and page.model.get_value(child,1) == ("ole","pending"):
+			page.model.remove(child)
+		# page type was settled when the container was opened
+		ptype = page.type
+		parser(page,self.read(),iter1)
+		page.type = ptype
+
+
+def load_all(page):
+	# read and parse all pending streams, e.g. before saving
+	# iters of the tree models persist while their rows exist
+	iters = []
+	def collect(model,path,iter1):
+		if isinstance(model.get_value(iter1,4),OLEStream):
+			iters.append(iter1)
+	page.model.foreach(collect)
+	for iter1 in iters:
+		stream = page.model.get_value(iter1,4)
+		stream.load(page,iter1)
+		# rows edited in the hexdump already have their data
+		if page.model.get_value(iter1,3) is None:
+			page.model.set_value(iter1,3,stream.read())
+		page.model.set_value(iter1,4,None)
+
+
+def stream_parser(fn,fullname,cfb,e,ftype):
+	# returns (ftype,row type,parser) for the stream; only the first bytes are read here
+	head = cfb.read(e,16)
+	if fn == "DesignerDoc":
+		return "dsf",("dsf",0),dsf.open
+	if fn == "EscherStm" or fn == "EscherDelayStm":
+		# currently I don't parse it automagically for MSDOC
+		return "escher",("escher",0),lambda page,data,iter1: escher.parse(page.model,data,iter1,"pub")
+	if fn == "MagicTab":
+		return "wls",("wls",0),wls.parse
+	if fn == "CONTENTS":
+		if head[6:11] == "WT602":
+			return "wt602",("wt602",0),wt602.parse
+		elif fullname.split('/')[0] == "OleObjects":
+			# Nested OLE objects (or images) in WT602
+			return ftype,None,wt602.parse_object
+		return "quill",("quill",0),quill.parse
+	if fn == "Contents" and head[:2] == "\xe8\xac": # take signature into account
+		return "pub",("pub",0),pub.parse
+	if fn == "VisioDocument":
+		return "vsd",("vsd",0),vsd.parse
+	if fn == "PageMaker":
+		return "pm",("pm",0),pm6.open
+	if fn == "WordDocument":
+		return "doc",("doc",0),doc.parse
+	if fn == "Book" or fn == "Workbook":
+		ftype = "XLS"
+		if head[:2] == "\x09\x08" and head[4:6] == "\x00\x05":
+			ftype = "XLS5"
+		elif head[:2] == "\x09\x08" and head[4:6] == "\x00\x06":
+			ftype = "XLS8"
+		return ftype,("xls",0),xls.parse
+	if fn == "PowerPoint Document" or fn == "Pictures":
+		return "ppt",("ppt",0),ppt.parse
+	if fn == "NativeContent_MAIN":
+		return "qpw",("qpw",0),qpw.parse
+	if (fn == "contents" or fn == "SCFFPreview") and ftype == "ppp":
+		return ftype,None,lambda page,data,iter1: ppp.parse(page,data,iter1,fn)
+	# I've no idea if this is really the signature, but it is
+	# present in all files I've seen so far
+	if (fn == "Header" and head[0xc:0xf] == 'xV4') or fn[-4:] == '.zmf':
+		return "zmf",None,lambda page,data,iter1: zmf.zmf2_open(page,data,iter1,fn)
+	if fn[-4:] == '.BMI' and fullname.split('/')[0] == 'Bitmaps':
+		return "bmi",None,lambda page,data,iter1: bmi.open(data,page,iter1)
+	if "vba/dir" in fullname.lower():
+		return ftype,("vba",0),vba.parse
+	return ftype,None,None
 
 
 def my_open (buf,page,parent=None):
-	dircache = {}
-	vbaiter = None
-	docdata = ""
-	docdataiter = None
-	tbliter = None
-	dirflag=0
 	ftype = ""
-	tmpfile = None
 	try:
-		if parent is None:
-			gsffilename = page.fname
-		else:
-			# need to save tmp file to pass to gsf
-			(tmpfd, tmpfile) = mkstemp()
-			gsffilename = tmpfile
-			os.write(tmpfd, buf)
-			os.close(tmpfd)
-		gsfout = subprocess.check_output(["gsf", "list", gsffilename])
-		print gsfout
-		print "-----------------"
-		for i in gsfout.split("\n")[1:-1]:
-			if i[0] == "f":
-				# gsf sometimes lists date even for files. Or, rather, it
-				# seems that it misrepresents empty dirs as (empty) files.
-				# I have observed this with 'Objects' in many .pub files.
-				if i[5] != ' ':
-					fullname = " ".join(i.split()[4:])
-				else:
-					fullname = " ".join(i.split()[2:])
-				if not len(fullname):
-					fullname = " ".join(i.split()[2:])
-				if "/" in fullname:
-					fns = fullname.split("/")
-					cdir = "/".join(fns[:-1])
-					fn = fns[-1]
-				else:
-					fn = fullname
-					cdir = ""
-				if len(fn) and ord(fn[0]) < 32: 
-					fn = fn[1:]
-				if cdir:
-					cdir_to_treeiter(page,parent,cdir,dircache)
-					pn = dircache["/"+cdir]
-				else:
-					pn = parent
-				data = subprocess.check_output(["gsf", "cat", gsffilename, fullname])
-				iter1 = add_pgiter(page,fn,"ole",fn,data,pn)
-				
-				if fn == "DesignerDoc":
-					ftype = "dsf"
-					page.model.set_value(iter1,1,("dsf",dirflag))
-					dsf.open (page, data, iter1)
-				
-				if (fn == "EscherStm" or fn == "EscherDelayStm"): # and infchild.size()>0:
-					ftype = "escher"
-					page.model.set_value(iter1,1,("escher",dirflag))
-					escher.parse (page.model,data,iter1,"pub") # currently I don't parse it automagically for MSDOC
-				if fn == "MagicTab":
-					ftype = "wls"
-					page.model.set_value(iter1,1,("wls",dirflag))
-					wls.parse (page,data,iter1)
-				if fn == "CONTENTS":
-					if data[6:11] == "WT602":
-						ftype = "wt602"
-						page.model.set_value(iter1,1,("wt602",dirflag))
-						wt602.parse (page,data,iter1)
-                                        elif fullname.split('/')[0] == "OleObjects":
-						# Nested OLE objects (or images) in WT602
-						wt602.parse_object(page, data, iter1)
-					else:
-						ftype = "quill"
-						page.model.set_value(iter1,1,("quill",dirflag))
-						quill.parse (page,data,iter1)
-				if fn == "Contents":
-					if data[:2] == "\xe8\xac": # take signature into account
-						ftype = "pub"
-						page.model.set_value(iter1,1,("pub",dirflag))
-						pub.parse (page,data,iter1)
-				if fn == "VisioDocument":
-					ftype = "vsd"
-					page.model.set_value(iter1,1,("vsd",dirflag)) # level = 1?
-					vsd.parse (page, data, iter1)
-				if fn == "PageMaker":
-					ftype = "pm"
-					page.model.set_value(iter1,1,("pm",dirflag))
-					pm6.open (page, data, iter1)
-				if fn == "WordDocument":
-					ftype = "doc"
-					page.model.set_value(iter1,1,("doc",dirflag)) #level = 1
-					doc.parse (page, data, iter1)
-				if fn == "1Table" or fn == "0Table":
-					page.wtable = iter1
-				if fn == "Data" and page.type == "DOC":
-					page.wdata = iter1
-				if fn == "Book" or fn == "Workbook":
-					page.model.set_value(iter1,1,("xls",dirflag))
-					ftype = xls.parse (page, data, iter1)
-				if fn == "PowerPoint Document" or fn == "Pictures":
-					ftype = "ppt"
-					page.model.set_value(iter1,1,("ppt",dirflag))
-					ppt.parse (page, data, iter1)
-				if fn == "NativeContent_MAIN":
-					ftype = "qpw"
-					page.model.set_value(iter1,1,("qpw",dirflag))
-					qpw.parse (page, data, iter1)
-				if fn == "Signature" and data[:4] == '\x60\x67\x01\x00':
-					ftype = "ppp"  #PagePlus OLE version (9.x?)
-				if (fn == "contents" or fn == "SCFFPreview") and ftype == "ppp":
-					ppp.parse(page,data,iter1,fn)
-				
-				# I've no idea if this is really the signature, but it is
-				# present in all files I've seen so far
-				if fn == "Header" and data[0xc:0xf] == 'xV4':
-					ftype = 'zmf'
-					zmf.zmf2_open(page, data, iter1, fn)
-				if fn[-4:] == '.zmf':
-					ftype = 'zmf'
-					zmf.zmf2_open(page, data, iter1, fn)
-				if fn[-4:] == '.BMI' and fullname.split('/')[0] == 'Bitmaps':
-					ftype = 'bmi'
-					bmi.open(data, page, iter1)
-
-				if fn == "VBA":
-					page.type = "vba"
-					ftype = "vba"
-				#if (ftype == "vba" and fn == "dir") or 
-				if "vba/dir" in fullname.lower():
-					page.model.set_value(iter1,1,("vba",dirflag))
-					vbaiter = iter1
-					vbadata = data
-				
-				if "SummaryInformation" in fn:
-					page.model.set_value(iter1,1,("ole","propset"))
-			else:
-				if i.split()[2] == "VBA":
-					page.type = "vba"
-					ftype = "vba"
-		if vbaiter != None:
-			vba.parse (page, vbadata, vbaiter)
-	
-	except subprocess.CalledProcessError:
-		print "Failed to run gsf. Please install libgsf."
-
-	if tmpfile:
-		try: os.remove(tmpfile)
-		except: pass
+		cfb = CFB(buf)
+	except:
+		print "Failed to read OLE container",sys.exc_info()[1]
+		return ftype
+
+	# directory order puts "contents" before "Signature", check PagePlus first
+	for e in cfb.children(cfb.root):
+		if e.name == "Signature" and cfb.read(e,4) == '\x60\x67\x01\x00':
+			ftype = "ppp"
+
+	iters = {cfb.root.sid:parent}
+	for e,pe in cfb.walk():
+		pn = iters[pe.sid]
+		fullname = e.path
+		fn = fullname.split("/")[-1]
+		if e.type == 1:
+			iters[e.sid] = add_pgiter(page,fn,"ole","/"+fullname,"",pn)
+			if fn == "VBA":
+				page.type = "vba"
+				ftype = "vba"
+			continue
+
+		ftype,rtype,parser = stream_parser(fn,fullname,cfb,e,ftype)
+		iter1 = add_pgiter(page,fn,"ole",fn,None,pn)
+		page.model.set_value(iter1,2,e.size)
+		page.model.set_value(iter1,4,OLEStream(cfb,e,parser))
+		if rtype:
+			page.model.set_value(iter1,1,rtype)
+		if parser:
+			add_pgiter(page,"...","ole","pending",None,iter1)
+
+		if fn == "1Table" or fn == "0Table":
+			page.wtable = iter1
+		if fn == "Data" and page.type == "DOC":
+			page.wdata = iter1
+		if "SummaryInformation" in fn:
+			page.model.set_value(iter1,1,("ole","propset"))
 
 	return ftype
 
@@ -587,97 +708,45 @@ def parse_dir(page,buf,parent):
 		off += 0x80
 	return mdirstart,mdirsize
 
-def take_chain(chains,idx):
-	chain = []
-	chain.append(idx)
-	while 1:
-		try:
-			off = idx*4
-			idx = struct.unpack("<I",chains[off:off+4])[0]
-			if idx == 0xfffffffe:
-				return chain
-			else:
-				chain.append(idx)
-		except:
-			print "Failed in take_chain"
-			return chain
-
 # to debug libgsf, implement CFB
 def parse (buf,page,iter=None):
-	#check for signature again
-	if buf[:8] != "\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
+	try:
+		cfb = CFB(buf)
+	except:
 		print "No OLE signature found"
 		return
 
 	oiter = add_pgiter (page,"CFB","cfb",None,buf)
-	majver = struct.unpack("<H",buf[0x1a:0x1c])[0]
-	dirsec = {}
-	minidirsec = {}
-	minidata = {}
-
-	if majver == 3:
-		hdrsize = 512
-	else:
-		hdrsize = 4096
+	hdrsize = cfb.secsize
 	add_pgiter (page,"CF Header","cfb","hdr",buf[0:hdrsize],oiter)
-	ndirsec = struct.unpack("<I",buf[0x28:0x2c])[0]
-	nfatsec = struct.unpack("<I",buf[0x2c:0x30])[0]
-	dirsecloc = struct.unpack("<I",buf[0x30:0x34])[0]
-	minisecloc = struct.unpack("<I",buf[0x3c:0x40])[0]
-	nminisec = struct.unpack("<I",buf[0x44:0x48])[0]
-	ndifatsec = struct.unpack("<I",buf[0x48:0x4c])[0]
-
-	off = 0x4c
-	fatlist = {}
-	
-	# FIXME! no parsing for DIFAT sectors at the moment
-	while off < hdrsize:
-		difat = struct.unpack("<I",buf[off:off+4])[0]
-		fatlist[difat] = "fat"
-		off += 4
-		if difat == 0xffffffff:
-			off = hdrsize
-
-	chains = ""
-	for i in fatlist:
-		chains += buf[(i+1)*hdrsize:(i+2)*hdrsize]
-
-	chain = take_chain(chains,dirsecloc)
-	for i in chain:
-		dirsec[i] = "dir"
-
-	minichains = ""
-	mdirchain = take_chain(chains,minisecloc)
-	for i in mdirchain:
-		minidirsec[i] = "mdir"
+
+	secs = {}
+	for i in cfb.difat:
+		secs[i] = ("FAT","fat")
+	for i in cfb.difatsec:
+		secs[i] = ("DIFAT","difat")
+	for i in cfb.chain(cfb.dirsecloc):
+		secs[i] = ("Dir","")
+	for i in cfb.chain(cfb.minifatloc):
+		secs[i] = ("MiniDir","mdir")
+	for i in cfb.chain(cfb.root.start):
+		secs[i] = ("MiniData","mdata")
 
 	i = 0
+	off = hdrsize
 	while off < len(buf):
 		sname = "Sector %02x"%i
-		if dirsec.has_key(i):
-			sname += " (Dir)"
-			diriter = add_pgiter (page,sname,"cfb","",buf[off:off+hdrsize],oiter)
-			m1,m2 = parse_dir(page,buf[off:off+hdrsize],diriter)
-			if m1 != -1:
-				mdirstart = m1
-				mdirsize = m2
-				mdatachain = take_chain(chains,mdirstart)
-				for j in mdatachain:
-					minidata[j] = "mdata"
-				
-		elif minidirsec.has_key(i):
-			sname += " (MiniDir)"
-			add_pgiter (page,sname,"cfb","mdir",buf[off:off+hdrsize],oiter)
-		elif fatlist.has_key(i):
-			sname += " (FAT)"
-			add_pgiter (page,sname,"cfb","fat",buf[off:off+hdrsize],oiter)
-			chains += buf[off:off+hdrsize]
-		elif minidata.has_key(i):
-			sname += " (MiniData)"
-			add_pgiter (page,sname,"cfb","mdata",buf[off:off+hdrsize],oiter)
+		if secs.has_key(i):
+			sname += " (%s)"%secs[i][0]
+			siter = add_pgiter (page,sname,"cfb",secs[i][1],buf[off:off+hdrsize],oiter)
+			if secs[i][0] == "Dir":
+				parse_dir(page,buf[off:off+hdrsize],siter)
 		else:
 			add_pgiter (page,sname,"cfb",4,buf[off:off+hdrsize],oiter)
 		i += 1
 		off += hdrsize
 
 	return "cfb"
+
+handlers.register("cfb", cfb_ids, ("hd","data"))
+handlers.register("ole", {"propset":suminfo}, ("hd","data"))
@@ -18,17 +18,22 @@
 
 import sys
 import binascii
+import traceback
 
 import App
+import ole
+from utils import pgdata
+import handlers
+import log
 
-import fh,fh12
+lg = log.get("oledump")
 
 def dump_rec_content(doc,model,iter,level,file):
     ntype=model.get_value(iter,1)
     if ntype == 0:
         return
     size = model.get_value(iter,2)
-    data = model.get_value(iter,3)
+    data = pgdata(model,iter)
     if size==0:
         return
     tmpDoc=App.Page()
@@ -40,14 +45,13 @@ def dump_rec_content(doc,model,iter,level,file):
             done=True
         except:
             pass
-    if done:
-        pass
-    elif ntype[0] == "fh":
-        if fh.hdp.has_key(ntype[1]):
-            fh.hdp[ntype[1]](tmpDoc,data,doc)
-    elif ntype[0] == "fh12":
-        if fh12.fh12_ids.has_key(ntype[1]):
-            fh12.fh12_ids[ntype[1]](tmpDoc,size,data,ntype[1])
+    if not done:
+        # handlers that need the hexdump widget fail without a GUI;
+        # rows added before the failure are still written
+        try:
+            handlers.call(tmpDoc,size,data,doc,ntype,model,iter)
+        except Exception:
+            lg.warn("Handler failed on %s\n%s",ntype,traceback.format_exc())
     tmpModel=tmpDoc.model
     tmpIter = tmpModel.get_iter_first()
     if tmpIter == None:
@@ -70,10 +74,10 @@ def dump_rec(doc,model,iter,level,file):
     prefix=' '*level
     suffix=""
     if model.get_value(iter,2)>2000:
-        suffix=binascii.hexlify(model.get_value(iter,3)[0:2000])
+        suffix=binascii.hexlify(pgdata(model,iter)[0:2000])
         suffix+="...[+%dbytes]"%(model.get_value(iter,2)-2000)
     else:
-        suffix=binascii.hexlify(model.get_value(iter,3))
+        suffix=binascii.hexlify(pgdata(model,iter))
     type=model.get_value(iter,1)[1]
     for i in range((len(suffix)+199)//200):
         file.write("%s%s:%s%s\n"%(prefix,type,"" if i==0 else "[_%d]"%i,suffix[i*200:(i+1)*200]))
@@ -108,6 +112,7 @@ def main():
     if buf:
         doc=App.Page()
         if doc.fload(buf)==0:
+            ole.load_all(doc)
             if doc.type=="FH":
                 # fh.py use idle function, so we must called them by hand
                 try:
@@ -15,8 +15,12 @@
 #
 
 import sys,struct,gtk
+import handlers
 from utils import *
 
+def hd_text (hd,data):
+	add_iter (hd,"",data,0,len(data),"txt")
+
 def open (buf,page,parent):
 	print "Probably XML",page.model.get_value(parent,0)
         if buf[0:2] == '\xff\xfe':
@@ -60,3 +64,5 @@ def open (buf,page,parent):
 			piter = citer.pop()
 
 	return "xml"
+
+handlers.register_fallback("xml", hd_text, ("hd","data"))
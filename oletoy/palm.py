@@ -20,6 +20,7 @@
 import struct
 import zlib
 
+import handlers
 from utils import add_iter, add_pgiter, rdata
 
 def read(data, offset, fmt):
@@ -30,54 +31,111 @@ class lz77_error:
 
 """Handler of LZ77 compression method, as used by PalmDoc."""
 def lz77_decompress(data):
-	buffer = []
-	length = len(data)
+	src = bytearray(data)
+	buffer = bytearray()
+	length = len(src)
 
 	i = 0
-	while i != length:
-		c = data[i]
-		o = ord(c)
+	while i < length:
+		o = src[i]
+		i += 1
 
 		if o == 0 or (o >= 0x9 and o <= 0x7f):
-			buffer.extend(c)
-			i += 1
+			buffer.append(o)
 
 		elif o >= 1 and o <= 8:
-			end = i + c
-			if end >= length:
+			# the next o bytes are literals
+			if i + o > length:
 				raise lz77_error
-			while i != end:
-				cc = data[i]
-				buffer.extend(cc)
-			i += 1
+			buffer += src[i:i + o]
+			i += o
 
 		elif o >= 0x80 and o <= 0xbf:
+			if i >= length:
+				raise lz77_error
+			combined = ((o & 0x3f) << 8) | src[i]
 			i += 1
-			byte1 = o & 0x3f
-			byte2 = ord(data[i])
-			combined = (byte1 << 8) | byte2
-			distance = (combined & 0xfff8) >> 3
-			length = (combined & 0x7) + 3
+			distance = combined >> 3
+			count = (combined & 0x7) + 3
 
-			if distance > len(buffer):
-				raise lz77_error
-			if distance == 0:
+			if distance > len(buffer) or distance == 0:
 				raise lz77_error
 
-			if length < distance:
-				buffer.append(buffer[len(buffer) - distance:length])
+			start = len(buffer) - distance
+			if count <= distance:
+				buffer += buffer[start:start + count]
 			else:
-				repeated = buffer[len(buffer) - distance]
-				buffer.append([repeated for j in range(length)])
-
-			i += 1
+				# overlapping copy repeats the last distance bytes
+				while count > 0:
+					n = min(len(buffer) - start, count)
+					buffer += buffer[start:start + n]
+					count -= n
 
 		else:
-			buffer.extend(' ')
-			buffer.extend(chr(o ^ 0x80))
-			i += 1
+			buffer.append(0x20)
+			buffer.append(o ^ 0x80)
+
+	return str(buffer)
 
-	return buffer
+class lazy_text(object):
+	"""Column 4 payload of a text row; the data is decompressed when read."""
+
+	def __init__(self, decompress, data):
+		self.decompress = decompress
+		self.data = data
+
+	def read(self):
+		try:
+			return self.decompress(self.data)
+		except (lz77_error, zlib.error):
+			print('Failed to decompress text')
+			return ''
+
+class ztxt_text(object):
+	"""Text records of a zTXT document, which form one zlib stream.
+
+	Records are decompressed in order, keeping the decompressor between
+	them. In random access mode every record ends with a full flush, so
+	a record other than the first can be inflated on its own.
+	"""
+
+	def __init__(self, random_access):
+		self.random_access = random_access
+		self.records = []
+		self.texts = []
+		self.z = None
+
+	def __getstate__(self):
+		# the decompressor can not be pickled; start again when needed
+		return {'random_access': self.random_access, 'records': self.records, 'texts': [], 'z': None}
+
+	def read(self, n):
+		try:
+			if self.random_access and n > 0:
+				return zlib.decompressobj(-zlib.MAX_WBITS).decompress(self.records[n])
+			if self.z == None:
+				self.z = zlib.decompressobj()
+				self.texts = []
+			while len(self.texts) <= n:
+				self.texts.append(self.z.decompress(self.records[len(self.texts)]))
+			return self.texts[n]
+		except zlib.error:
+			print('Failed to decompress text record %d' % n)
+			return ''
+
+class ztxt_record(object):
+
+	def __init__(self, text, n):
+		self.text = text
+		self.n = n
+
+	def read(self):
+		return self.text.read(self.n)
+
+def add_text_pgiter(page, name, loader, parent):
+	iter1 = add_pgiter(page, name, 'palm', 0, None, parent)
+	page.model.set_value(iter1, 4, loader)
+	return iter1
 
 class palm_parser(object):
 
@@ -183,8 +241,7 @@ class palmdoc_parser(palm_parser):
 	def parse_data_record(self, n, data, parent):
 		reciter = add_pgiter(self.page, "Text %d" % n, 'palm', 0, data, parent)
 		if self.compression == 2:
-			uncompressed = lz77_decompress(data)
-			add_pgiter(self.page, "Uncompressed", 'palm', 0, uncompressed, reciter)
+			add_text_pgiter(self.page, "Uncompressed", lazy_text(lz77_decompress, data), reciter)
 
 # specification: http://www.fifi.org/doc/plucker/manual/DBFormat.html
 # (2013)
@@ -246,11 +303,9 @@ class plucker_parser(palm_parser):
 				add_pgiter(self.page, 'Text', 'palm', 0, text, reciter)
 			elif typ == 1:
 				if self.version == 1:
-					uncompressed = lz77_decompress(text)
-					add_pgiter(self.page, 'Text', 'palm', 0, uncompressed, reciter)
+					add_text_pgiter(self.page, 'Text', lazy_text(lz77_decompress, text), reciter)
 				elif self.version == 2:
-					uncompressed = zlib.decompress(text)
-					add_pgiter(self.page, 'Text', 'palm', 0, uncompressed, reciter)
+					add_text_pgiter(self.page, 'Text', lazy_text(zlib.decompress, text), reciter)
 
 # specification: http://wiki.mobileread.com/wiki/TealDoc (2013)
 class tealdoc_parser(palm_parser):
@@ -260,12 +315,12 @@ class tealdoc_parser(palm_parser):
 
 	def parse_index_record(self, data, parent):
 		add_pgiter(self.page, 'Index', 'palm', 'tealdoc_index', data, parent)
+		self.compression = read(data, 0, '>H')
 
 	def parse_data_record(self, n, data, parent):
 		reciter = add_pgiter(self.page, "Record %d" % n, 'palm', 0, data, parent)
 		if self.compression == 2:
-			uncompressed = lz77_decompress(data)
-			add_pgiter(self.page, "Uncompressed", 'palm', 0, uncompressed, reciter)
+			add_text_pgiter(self.page, "Uncompressed", lazy_text(lz77_decompress, data), reciter)
 
 class tomeraider3_parser(palm_parser):
 
@@ -288,6 +343,7 @@ class ztxt_parser(palm_parser):
 		self.record_size = 0
 		self.text_length = 0
 		self.compression = 0
+		self.text = None
 
 	def parse_index_record(self, data, parent):
 		off = 0
@@ -298,9 +354,13 @@ class ztxt_parser(palm_parser):
 		off += 8
 		(self.compression, off) = rdata(data, off, 'B')
 		add_pgiter(self.page, 'Index', 'palm', 'ztxt_index', data, parent)
+		self.text = ztxt_text(self.compression == 1)
 
 	def parse_data_record(self, n, data, parent):
-		add_pgiter(self.page, "Record %d" % n, 'palm', 0, data, parent)
+		reciter = add_pgiter(self.page, "Record %d" % n, 'palm', 0, data, parent)
+		if n <= self.record_count and self.text:
+			self.text.records.append(data)
+			add_text_pgiter(self.page, "Uncompressed", ztxt_record(self.text, n - 1), reciter)
 
 def add_generic_index(hd, size, data):
 	pass
@@ -506,4 +566,6 @@ def open(buf, page, parent, palmtype):
 			parser = generic_parser
 		parser(buf, page, parent).parse()
 
+handlers.register("palm", palm_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
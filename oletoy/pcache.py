@@ -0,0 +1,230 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+# On-disk cache of parsed record trees. The key is the hash of the file
+# content plus the hash of the parser sources, so any change of the code
+# invalidates old entries. An entry is a zlib-compressed sequence of pickles:
+# page-wide values, the rows in tree order, the state parsers left on the page.
+# Record data that points into the file itself is stored as a reference.
+
+import os,zlib,hashlib,types
+import cPickle
+import cStringIO
+import nodes
+try:
+	import gtk, gobject
+	iter_types = (gtk.TreeIter,nodes.Node)
+	store_types = (gtk.TreeStore,nodes.NodeStore)
+except ImportError:
+	# headless, e.g. batch.py without PyGTK
+	gtk = gobject = None
+	iter_types = (nodes.Node,)
+	store_types = (nodes.NodeStore,)
+
+magic = "OTPC1"
+
+# page attributes that belong to the GUI or are set again on load
+skip_attrs = ("model","view","scrolled","hd","win","hpaned","parent","dictview",
+	"dictwin","search","fname","pname","cache","loading","headless","loader")
+
+code_hash = None
+
+class Uncacheable(Exception):
+	pass
+
+def code_version():
+	# hash of all parser sources; computed once
+	global code_hash
+	if code_hash == None:
+		h = hashlib.sha1()
+		top = os.path.dirname(os.path.abspath(__file__))
+		files = []
+		for d,dirs,names in os.walk(top):
+			for n in names:
+				if n.endswith(".py"):
+					files.append(os.path.relpath(os.path.join(d,n),top))
+		for f in sorted(files):
+			h.update(f)
+			h.update(open(os.path.join(top,f),"rb").read())
+		code_hash = h.hexdigest()
+	return code_hash
+
+def key(buf):
+	h = hashlib.sha1()
+	for i in range(0,len(buf),0x100000):
+		h.update(buf[i:i+0x100000])
+	return h.hexdigest()+code_version()[:16]
+
+def entry(cdir, k):
+	return os.path.join(cdir,k[:2],k)
+
+def rows(model, parent=None, depth=0, res=None):
+	if res == None:
+		res = []
+	n = model.get_n_columns()
+	for i in range(model.iter_n_children(parent)):
+		it = model.iter_nth_child(parent,i)
+		res.append((depth,[model.get_value(it,c) for c in range(n)]))
+		rows(model,it,depth+1,res)
+	return res
+
+def store_rows(store):
+	# side stores like page.dictmod; their iters would be taken for page.model ones
+	if isinstance(store,nodes.NodeStore):
+		# made by utils.side_store() while parsing headless
+		tlist = list(store.types)
+	else:
+		tlist = [store.get_column_type(i).name for i in range(store.get_n_columns())]
+	rlist = rows(store)
+	for depth,row in rlist:
+		for v in row:
+			if isinstance(v,iter_types):
+				raise Uncacheable("iter in a side store")
+	return tlist,rlist
+
+def fill(model, rlist):
+	stack = [None]
+	for depth,row in rlist:
+		del stack[depth+1:]
+		stack.append(model.append(stack[depth],row))
+
+def save(page, cdir, k, buf):
+	# returns True if the tree was written; pages with state that can not
+	# be pickled (widgets, lambdas, open files) are not cached
+	ids = {id(page):"page", id(page.model):"model", id(buf):"buf"}
+	if page.hd != None:
+		ids[id(page.hd)] = "hd"
+	if page.view != None:
+		ids[id(page.view)] = "view"
+	inrows = [True]
+
+	def pid(obj):
+		p = ids.get(id(obj))
+		if p != None:
+			return p
+		if isinstance(obj,store_types):
+			return ("store",store_rows(obj))
+		if isinstance(obj,iter_types):
+			if inrows[0]:
+				raise Uncacheable("iter in a row")
+			return ("iter",page.model.get_path(obj))
+		if isinstance(obj,types.MethodType) and obj.im_self != None:
+			return ("method",obj.im_self,obj.im_func.__name__)
+		return None
+
+	f = cStringIO.StringIO()
+	p = cPickle.Pickler(f,2)
+	p.persistent_id = pid
+	try:
+		meta = {}
+		if page.hd != None:
+			meta["hd"] = (page.hd.version,page.hd.width,page.hd.height)
+		p.dump(meta)
+		p.dump(rows(page.model))
+		inrows[0] = False
+		state = {}
+		for a,v in page.__dict__.items():
+			if a not in skip_attrs:
+				state[a] = v
+		p.dump(state)
+	except Exception,e:
+		print "Parse cache: not cached (%s)"%e
+		return False
+	name = entry(cdir,k)
+	try:
+		if not os.path.isdir(os.path.dirname(name)):
+			os.makedirs(os.path.dirname(name))
+		tmp = name+".%d"%os.getpid()
+		out = open(tmp,"wb")
+		out.write(magic)
+		out.write(zlib.compress(f.getvalue(),1))
+		out.close()
+		os.rename(tmp,name)
+	except (IOError,OSError),e:
+		print "Parse cache: failed to write (%s)"%e
+		return False
+	return True
+
+def prune(cdir, limit):
+	# drops the least recently used entries until the cache fits in limit bytes
+	files = []
+	total = 0
+	for d,dirs,names in os.walk(cdir):
+		for n in names:
+			name = os.path.join(d,n)
+			try:
+				st = os.stat(name)
+			except OSError:
+				continue
+			files.append((st.st_mtime,st.st_size,name))
+			total += st.st_size
+	files.sort()
+	for mtime,size,name in files:
+		if total <= limit:
+			break
+		try:
+			os.remove(name)
+			total -= size
+		except OSError:
+			pass
+
+def load(page, cdir, k, buf):
+	# rebuilds the tree and page state from the cache; False on a miss
+	name = entry(cdir,k)
+	if not os.path.isfile(name):
+		return False
+	try:
+		# mtime is the last use for prune()
+		os.utime(name,None)
+		data = open(name,"rb").read()
+		if data[:len(magic)] != magic:
+			return False
+		f = cStringIO.StringIO(zlib.decompress(data[len(magic):]))
+	except (IOError,OSError,zlib.error):
+		return False
+	objs = {"page":page, "model":page.model, "buf":buf, "hd":page.hd, "view":page.view}
+
+	def pload(p):
+		if type(p) is str:
+			return objs[p]
+		if p[0] == "iter":
+			return page.model.get_iter(p[1])
+		if p[0] == "store":
+			tlist,rlist = p[1]
+			if page.headless:
+				store = nodes.NodeStore(tlist)
+			else:
+				store = gtk.TreeStore(*[gobject.type_from_name(t) for t in tlist])
+			fill(store,rlist)
+			return store
+		if p[0] == "method":
+			return getattr(p[1],p[2])
+
+	u = cPickle.Unpickler(f)
+	u.persistent_load = pload
+	try:
+		meta = u.load()
+		rlist = u.load()
+		fill(page.model,rlist)
+		state = u.load()
+	except Exception,e:
+		print "Parse cache: broken entry (%s)"%e
+		page.model.clear()
+		return False
+	if page.hd != None and meta.has_key("hd"):
+		page.hd.version,page.hd.width,page.hd.height = meta["hd"]
+	page.__dict__.update(state)
+	return True
@@ -0,0 +1,176 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+# colupatr/piecetable.py is a link to this file
+
+from bisect import bisect_right
+
+class PieceTable(object):
+	# editable buffer over an immutable original; inserted bytes go to an
+	# append-only add buffer and the text is a list of (src,off,size) pieces,
+	# src 0 being the original and 1 the add buffer; slicing gives str
+	# reads bisect the piece starts; an edit rebuilds the starts after it,
+	# so it costs O(pieces)
+	__slots__ = ("orig","add","pieces","starts","size","joined")
+
+	def __init__(self, data=""):
+		if isinstance(data,PieceTable):
+			# snapshot: buffers are shared, the add buffer is never overwritten
+			self.orig = data.orig
+			self.add = data.add
+			self.pieces = list(data.pieces)
+			self.starts = list(data.starts)
+			self.size = data.size
+			self.joined = data.joined
+			return
+		self.orig = data
+		self.add = bytearray()
+		self.size = len(data)
+		self.pieces = []
+		self.starts = []
+		if self.size:
+			self.pieces.append((0,0,self.size))
+			self.starts.append(0)
+		self.joined = None
+
+	def snapshot(self):
+		return PieceTable(self)
+
+	def __len__(self):
+		return self.size
+
+	def __str__(self):
+		if self.joined == None:
+			self.joined = self.read(0,self.size)
+		return self.joined
+
+	def __repr__(self):
+		return "PieceTable(%d, %d pieces)"%(self.size,len(self.pieces))
+
+	def read(self, start, stop):
+		res = []
+		i = max(bisect_right(self.starts,start)-1,0)
+		while i < len(self.pieces) and self.starts[i] < stop:
+			src,off,size = self.pieces[i]
+			s = max(start-self.starts[i],0)
+			e = min(stop-self.starts[i],size)
+			if src:
+				res.append(str(self.add[off+s:off+e]))
+			else:
+				res.append(self.orig[off+s:off+e])
+			i += 1
+		return "".join(res)
+
+	def __getitem__(self, k):
+		if isinstance(k,slice):
+			start,stop,step = k.indices(self.size)
+			if step != 1:
+				return str(self)[k]
+			if stop <= start:
+				return ""
+			if self.joined != None:
+				return self.joined[start:stop]
+			return self.read(start,stop)
+		if k < 0:
+			k += self.size
+		if k < 0 or k >= self.size:
+			raise IndexError("PieceTable index out of range")
+		if self.joined != None:
+			return self.joined[k]
+		i = bisect_right(self.starts,k)-1
+		src,off,size = self.pieces[i]
+		if src:
+			return chr(self.add[off+k-self.starts[i]])
+		return self.orig[off+k-self.starts[i]]
+
+	def __getslice__(self, i, j):
+		# negative indices are already adjusted by len()
+		return self.__getitem__(slice(max(i,0),max(j,0)))
+
+	def __add__(self, other):
+		return str(self) + str(other)
+
+	def __radd__(self, other):
+		return str(other) + str(self)
+
+	def __eq__(self, other):
+		return str(self) == str(other)
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __nonzero__(self):
+		return self.size > 0
+
+	def find(self, s, start=0, end=None):
+		return str(self).find(s,start,self.size if end == None else end)
+
+	def piece_at(self, pos):
+		# index of the piece holding byte 'pos', len(pieces) at the end
+		i = bisect_right(self.starts,pos)-1
+		if i < 0:
+			return 0
+		if self.starts[i]+self.pieces[i][2] <= pos:
+			i += 1
+		return i
+
+	def replace(self, pos, data, length=None):
+		# put data in place of 'length' bytes at pos (len(data) by default)
+		if length == None:
+			length = len(data)
+		pos = min(max(pos,0),self.size)
+		length = min(max(length,0),self.size-pos)
+		end = pos + length
+		i = self.piece_at(pos)
+		k = self.piece_at(end)
+		n = len(self.pieces)
+		new = []
+		if i < n and self.starts[i] < pos:
+			src,off,size = self.pieces[i]
+			new.append((src,off,pos-self.starts[i]))
+		elif i > 0:
+			# previous piece may be extended if it ends in the add buffer
+			i -= 1
+			new.append(self.pieces[i])
+		if data:
+			aoff = len(self.add)
+			self.add.extend(data)
+			if new and new[-1][0] == 1 and new[-1][1]+new[-1][2] == aoff:
+				new[-1] = (1,new[-1][1],new[-1][2]+len(data))
+			else:
+				new.append((1,aoff,len(data)))
+		if k < n and self.starts[k] < end:
+			src,off,size = self.pieces[k]
+			cut = end-self.starts[k]
+			new.append((src,off+cut,size-cut))
+			k += 1
+		self.pieces[i:k] = new
+		del self.starts[i:]
+		s = self.starts[-1]+self.pieces[i-1][2] if i else 0
+		for src,off,size in new:
+			self.starts.append(s)
+			s += size
+		for src,off,size in self.pieces[i+len(new):]:
+			self.starts.append(s)
+			s += size
+		self.size += len(data) - length
+		self.joined = None
+
+	def insert(self, pos, data):
+		self.replace(pos,data,0)
+
+	def delete(self, pos, length):
+		self.replace(pos,"",length)
@@ -17,6 +17,7 @@
 import datetime
 import struct
 
+import handlers
 from utils import add_iter, add_pgiter, key2txt, rdata
 
 EPOCH_BEGIN = 978307200
@@ -335,4 +336,6 @@ def open(data, page, parent):
 	parser = plist_parser(page, data, parent)
 	parser.parse()
 
+handlers.register("plist", plist_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
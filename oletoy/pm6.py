@@ -12,6 +12,7 @@
 # USA
 
 import struct
+import handlers
 from utils import *
 
 def val2txt(value, unit='%', default='normal', scale=.1):
@@ -687,3 +688,5 @@ def open (page,buf,parent,off=0):
 		if grp == 0:
 			rec_id += 1
 	page.type = "PM"
+
+handlers.register("pm", hd_ids, ("hd","data","page"))
@@ -16,24 +16,31 @@
 
 import sys,struct,zlib
 import gtk
+import log
 from utils import *
 
+lg = log.get("pngot")
+
 def firewrk_mkbs (page, buf, parent=None):
 	piters = []
 	if parent:
 		piters.append(parent)
 	spl = buf.split("{")
 	ind = 0
+	# the progress line joins the rest of the buffer, only do it when asked for
+	trace = lg.on(log.TRACE)
 	while len(spl) > 1:
 		name = spl[0]
 		value = spl[1]
-		print ind,name,value,len(spl),"%02x"%(len(buf)-len(" ".join(spl))),"%d%%"%(100-100*len(" ".join(spl))/len(buf)) 
+		if trace:
+			left = len(" ".join(spl))
+			lg.trace("%s %s %s %s %02x %d%%",ind,name,value,len(spl),len(buf)-left,100-100*left/len(buf))
 		ind += 1
 		spl.remove(name)
 		spl.remove(value)
 		flag = 0
 		if name[3] == "s":
-			print "STR",name
+			lg.trace("STR %s",name)
 			vlen = struct.unpack(">H",value[:2])[0]*2
 			while vlen > len(value[2:]):
 				rval = spl[0]
@@ -14,6 +14,7 @@
 # USA
 
 import sys,struct,zlib,gtk,cdr
+import handlers
 from utils import *
 
 def bmp (hd,size,data,page):
@@ -56,3 +57,4 @@ def parse(page,data,parent,stype):
 #	except:
 #		print 'Failed to decompress the stream',stype
 
+handlers.register("ppp", ppp_ids, ("hd","size","data","page"))
@@ -0,0 +1,228 @@
+# Copyright (C) 2007-2013	Valek Filippov (frob@df.ru)
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of version 3 or later of the GNU General Public
+# License as published by the Free Software Foundation.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+
+
+# Opt-in profiler for the parsers. When enabled, Page.fload, add_pgiter,
+# add_iter and the functions in the handler tables (module level dicts
+# named *_ids, fh.hdp and every table in the handlers registry) are
+# replaced with wrappers that count calls,
+# own and cumulative time and bytes of record data per record type.
+# Modules imported later are wrapped as they are loaded.
+# Results can be saved as pstats (python -m pstats file) or as JSON.
+
+import sys,os,time,json,marshal,mmap,threading,types
+from utils import DataView
+
+enabled = False
+stats = {} # (file, line, label) -> [calls, primitive calls, own, cumulative, bytes, {caller: calls}]
+patched = [] # (dict, key, original value)
+seen = set() # modules already scanned
+tables = ("hdp",)
+
+local = threading.local()
+
+def record(key, func, nbytes, args, kwargs):
+	stack = getattr(local,"stack",None)
+	if stack == None:
+		stack = local.stack = []
+	s = stats.get(key)
+	if s == None:
+		s = stats[key] = [0,0,0.,0.,0,{}]
+	# recursive calls add no cumulative time
+	outer = True
+	for f in stack:
+		if f[0] == key:
+			outer = False
+			break
+	if stack:
+		c = stack[-1][0]
+		s[5][c] = s[5].get(c,0) + 1
+	frame = [key,0.]
+	stack.append(frame)
+	start = time.time()
+	try:
+		return func(*args,**kwargs)
+	finally:
+		t = time.time() - start
+		stack.pop()
+		if stack:
+			stack[-1][1] += t
+		s[0] += 1
+		s[2] += t - frame[1]
+		s[4] += nbytes
+		if outer:
+			s[1] += 1
+			s[3] += t
+
+def data_len(args):
+	# size of the first argument that looks like record data
+	for a in args:
+		if isinstance(a,(str,DataView,mmap.mmap)):
+			return len(a)
+	return 0
+
+def where(func):
+	code = getattr(func,"func_code",None)
+	if code == None:
+		return "~",0
+	return os.path.basename(code.co_filename),code.co_firstlineno
+
+def wrap_handler(table, rtype, func):
+	fname,line = where(func)
+	key = (fname,line,"%s[%r] %s"%(table,rtype,getattr(func,"__name__","?")))
+	def handler(*args,**kwargs):
+		return record(key,func,data_len(args),args,kwargs)
+	handler.profiled = func
+	return handler
+
+def wrap_add_pgiter(func):
+	fname,line = where(func)
+	def add_pgiter(page, name, ftype, stype, data, *args, **kwargs):
+		key = (fname,line,"add_pgiter %s/%s"%(ftype,stype))
+		n = 0
+		if data != None:
+			n = len(data)
+		return record(key,func,n,(page,name,ftype,stype,data)+args,kwargs)
+	add_pgiter.profiled = func
+	return add_pgiter
+
+def wrap_add_iter(func):
+	key = where(func)+("add_iter",)
+	def add_iter(*args,**kwargs):
+		return record(key,func,0,args,kwargs)
+	add_iter.profiled = func
+	return add_iter
+
+def wrap_fload(func):
+	key = where(func)+("fload",)
+	def fload(self, buf="", *args, **kwargs):
+		patch_modules()
+		n = len(buf)
+		if n == 0 and self.fname:
+			try:
+				n = os.path.getsize(self.fname)
+			except OSError:
+				pass
+		return record(key,func,n,(self,buf)+args,kwargs)
+	fload.profiled = func
+	return fload
+
+def on_import(module):
+	patch_modules()
+
+def replace(d, k, v):
+	patched.append((d,k,d[k]))
+	d[k] = v
+
+def patch_handlers():
+	# tables registered with handlers.register(), e.g. cdr's {"DISP":disp}
+	import handlers
+	for key,tlist in handlers.tables.items()+handlers.subtables.items():
+		if isinstance(key,tuple):
+			name = "%s/%s"%key
+		else:
+			name = key
+		for ids,args in tlist:
+			for k,h in ids.items():
+				if isinstance(h,(types.FunctionType,types.MethodType)) and not hasattr(h,"profiled"):
+					replace(ids,k,wrap_handler(name,k,h))
+	for ftype,(h,args) in handlers.fallbacks.items():
+		if not hasattr(h,"profiled"):
+			replace(handlers.fallbacks,ftype,(wrap_handler(ftype,"*",h),args))
+
+def patch_modules():
+	# also called for every module LazyModule imports later
+	import utils
+	here = os.path.dirname(os.path.abspath(utils.__file__))
+	wrapped = {}
+	for f in (utils.add_pgiter, utils.add_iter):
+		if hasattr(f,"profiled"):
+			wrapped[id(f.profiled)] = f
+	for mname,m in sys.modules.items():
+		if m == None or mname in seen:
+			continue
+		mfile = getattr(m,"__file__",None)
+		if mfile == None or os.path.dirname(os.path.abspath(mfile)) != here:
+			continue
+		seen.add(mname)
+		g = m.__dict__
+		for name,v in g.items():
+			if wrapped.has_key(id(v)):
+				replace(g,name,wrapped[id(v)])
+			elif isinstance(v,dict) and (name.endswith("_ids") or name in tables):
+				for k,h in v.items():
+					if isinstance(h,(types.FunctionType,types.MethodType)) and not hasattr(h,"profiled"):
+						replace(v,k,wrap_handler(name,k,h))
+	patch_handlers()
+
+def enable():
+	global enabled
+	if enabled:
+		return
+	import utils, App
+	replace(utils.__dict__,"add_pgiter",wrap_add_pgiter(utils.add_pgiter))
+	replace(utils.__dict__,"add_iter",wrap_add_iter(utils.add_iter))
+	fload = App.Page.fload.im_func
+	patched.append((None,"fload",fload))
+	App.Page.fload = wrap_fload(fload)
+	utils.import_hooks.append(on_import)
+	enabled = True
+	patch_modules()
+
+def disable():
+	global enabled
+	import utils, App
+	if on_import in utils.import_hooks:
+		utils.import_hooks.remove(on_import)
+	while patched:
+		d,k,v = patched.pop()
+		if d == None:
+			App.Page.fload = v
+		else:
+			d[k] = v
+	seen.clear()
+	enabled = False
+
+def reset():
+	stats.clear()
+
+def rows():
+	# (label, calls, own, cumulative, bytes, file, line) sorted by own time
+	res = []
+	for (fname,line,label),s in stats.items():
+		res.append((label,s[0],s[2],s[3],s[4],fname,line))
+	res.sort(key=lambda r: -r[2])
+	return res
+
+def save_pstats(fname):
+	st = {}
+	for key,s in stats.items():
+		callers = {}
+		for c,n in s[5].items():
+			callers[c] = (n,n,0.,0.)
+		st[key] = (s[1],s[0],s[2],s[3],callers)
+	f = open(fname,"wb")
+	marshal.dump(st,f)
+	f.close()
+
+def save_json(fname):
+	res = []
+	for label,calls,own,cum,nbytes,fn,line in rows():
+		res.append({"name":label,"calls":calls,"own":round(own,6),"cumulative":round(cum,6),
+			"bytes":nbytes,"file":fn,"line":line})
+	f = open(fname,"w")
+	json.dump(res,f,indent=1)
+	f.close()
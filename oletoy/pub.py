@@ -20,6 +20,7 @@ import tree
 import hexdump
 import pubblock
 import ctypes
+import handlers
 from utils import *
 
 pub98_types = {0x15:"Document",
@@ -376,3 +377,5 @@ def save (page, fname):
 	  iter1 = model.iter_next(iter1)
 	cgsf.gsf_output_close(outfile)
 	cgsf.gsf_shutdown()
+
+handlers.register("pub", pub98_ids)
@@ -19,6 +19,7 @@ import gtk
 import tree
 import hexdump
 import pubblock
+import handlers
 from utils import *
 
 def val2pctxt(val):
@@ -263,3 +264,5 @@ def parse (page,data,parent):
 		else:
 			ch_num = 0
 #	add_pgiter (page,"Tail","quill",0,data[doffset+dlen:],parent)
+
+handlers.register("quill", sub_ids)
@@ -20,6 +20,7 @@ import qxp
 import qxp1
 import qxp33
 import qxp4
+import handlers
 
 def collect_group(data,name,buf,fmt,off,grp_id):
 	grplen = struct.unpack(fmt('H'),buf[off+0x400*(grp_id-1):off+0x400*(grp_id-1)+2])[0]
@@ -266,4 +267,6 @@ def open (page,buf,parent):
 			add_pgiter(page,name,"qxp","txtblock%02x"%i,data,parent)
 		return "QXP6"
 
+handlers.register_fallback("qxp", call, ("hd","size","data","ftype","stype"))
+
 # vim: set ft=python sts=4 sw=4 noet:
@@ -15,6 +15,7 @@
 #
 
 import sys,struct,gtk
+import handlers
 
 def parse (model,buf,offset = 0,parent=None):
 		newT = buf[offset:offset+4]
@@ -280,3 +281,5 @@ rx2_ids = {"EQ  ":rx2_eq, "TRSH":rx2_trsh,  "COMP":rx2_comp, "SLCE":rx2_slce,
 
 def open (buf,page,parent):
 	parse (page.model,buf,0,parent)
+
+handlers.register("rx2", rx2_ids, ("hd","data"))
@@ -20,6 +20,7 @@
 
 import struct
 
+import handlers
 from utils import add_iter, add_pgiter, ins_pgiter, key2txt, rdata
 
 def read(data, offset, fmt):
@@ -38,182 +39,123 @@ class lzss_error:
 	pass
 
 def lzss_decompress(data, big_endian=True, offset_bits=12, length_bits=4, min_length=3, init_byte=' ', text_length=None):
-	buffer = []
-	length = len(data)
-
-	class SlidingWindow(object):
-
-		def __init__(self, size, fill=' '):
-			self.data = [fill for i in range(size)]
-			self.begin = 0
-			self.end = 1
-			self.growing = True
-
-		def push(self, byte):
-			self.data[self.end] = byte
-			self._advance()
-
-		def copy_out(self, offset, length):
-			pos = self.begin
-			pos = self._advance_pos(pos, offset)
-			out = []
-			if self.growing and pos + length > self.end:
-				for i in range(length):
-					out.append(self.data[pos])
-			else:
-				for i in range(length):
-					out.append(self.data[pos])
-					pos = self._advance_pos(pos)
-			self._push(out)
-			return out
-
-		def _push(self, bytes):
-			for b in bytes:
-				self.data[self.end] = b
-				self._advance()
-
-		def _advance(self):
-			self.end = self._advance_pos(self.end)
-			if self.end == self.begin:
-				self.growing = False
-			if not self.growing:
-				self.begin = self._advance_pos(self.begin)
-
-		def _advance_pos(self, pos, inc=1):
-			if inc == 0:
-				return pos
-			return (pos + inc) % len(self.data)
-
-	class BitStream(object):
-
-		MASKS = [0x1, 0x3, 0x7, 0xf, 0x1f, 0x3f, 0x7f, 0xff]
-
-		def __init__(self, data):
-			self.data = data
-			self.pos = 0
-			self.current = None
-			self.available = 0
-
-			assert len(self.data) > 0
-
-		def read(self, bits, big_endian=False):
-			assert bits <= 32
-
-			if bits == 0:
-				return 0
-
-			p = [0, 0, 0, 0]
-
-			if big_endian:
-				i = (bits - 1) / 8
-
-				over = bits % 8
-				if over > 0:
-					p[i] = self._read_bits(over)
-					bits -= over
-					i -= 1
-				assert bits % 8 == 0
-
-				while 8 <= bits:
-					p[i] = self._read_byte()
-					bits -= 8
-					i -= 1
-				assert bits == 0
-
-			else:
-				i = 0
-
-				while 8 <= bits:
-					p[i] = self._read_byte()
-					bits -= 8
-					i += 1
-				assert bits < 8
-
-				if 0 < bits:
-					p[i] = self._read_bits(bits)
-
-			val = p[0] | (p[1] << 8) | (p[2] << 16) | (p[3] << 24)
-			return val
-
-		def at_eos(self):
-			return self.at_last_byte() and self.available == 0
-
-		def at_last_byte(self):
-			if self._at_end():
-				return True
-
-			self._fill()
-			return self._at_end()
-
-		def _at_end(self):
-			return self.pos == len(self.data) - 1
-
-		def _read_u8(self):
-			b = self.data[self.pos]
-			self.pos += 1
-			return b
-
-		def _fill(self):
-			if self.available == 0:
-				self.current = ord(self._read_u8())
-				self.available = 8
-			assert self.available > 0
-
-		def _read_byte(self):
-			return self._read_bits(8)
-
-		def _read_bits(self, bits):
-			assert bits <= 8
-
-			if bits == 0:
-				return 0
-
-			value = 0
-
-			self._fill()
-
-			if bits <= self.available:
-				value = self._read_available_bits(bits)
-			else:
-				bits -= self.available
-				value = self._read_available_bits(self.available)
-				self._fill()
-				value <<= bits
-				value |= self._read_available_bits(bits)
-
-			return value
-
-		def _read_available_bits(self, bits):
-			assert bits <= self.available
-
-			current = self.current
-			if bits < self.available:
-				current >>= self.available - bits
-			self.available -= bits
-
-			return self.MASKS[bits - 1] & current
-
-	stream = BitStream(data)
-	window = SlidingWindow(1 << offset_bits, init_byte)
-
-	def finished():
-		if text_length == None:
-			return stream.at_last_byte()
+	src = bytearray(data)
+	end = len(src)
+	if end == 0:
+		raise lzss_error
+	size = 1 << offset_bits
+
+	# The window is a ring of size bytes filled with init_byte. Output is
+	# written from position 1 on and offsets count from the oldest byte.
+	# Instead of a ring, the window is the tail of the output, which
+	# starts with size init bytes: window position i holds the output
+	# byte k with k + 1 == i (mod size) in the last size bytes.
+	out = bytearray(init_byte * size)
+	written = 0
+
+	# bits are read MSB first through an accumulator
+	pos = 0
+	acc = 0
+	avail = 0
+
+	ref_bits = offset_bits + length_bits
+	length_mask = (1 << length_bits) - 1
+	if text_length == None:
+		# as before, the last byte is never decoded
+		text_length = -1
+
+	while True:
+		if text_length >= 0:
+			if written >= text_length:
+				break
+		else:
+			if pos < end - 1 and avail == 0:
+				acc = src[pos]
+				pos += 1
+				avail = 8
+			if pos == end - 1:
+				break
+
+		if avail == 0:
+			if pos >= end:
+				raise lzss_error
+			acc = src[pos]
+			pos += 1
+			avail = 8
+		avail -= 1
+		flag = acc >> avail
+		acc &= (1 << avail) - 1
+
+		if flag:
+			if avail < 8:
+				if pos >= end:
+					raise lzss_error
+				acc = (acc << 8) | src[pos]
+				pos += 1
+				avail += 8
+			avail -= 8
+			out.append(acc >> avail)
+			acc &= (1 << avail) - 1
+			written += 1
+			continue
+
+		if big_endian:
+			while avail < ref_bits:
+				if pos >= end:
+					raise lzss_error
+				acc = (acc << 8) | src[pos]
+				pos += 1
+				avail += 8
+			avail -= ref_bits
+			ref = acc >> avail
+			acc &= (1 << avail) - 1
+			offset = ref >> length_bits
+			length = (ref & length_mask) + min_length
+		else:
+			# whole bytes first, the rest of the bits on top
+			vals = []
+			for bits in (offset_bits, length_bits):
+				val = 0
+				shift = 0
+				while bits > 0:
+					n = min(bits, 8)
+					if avail < n:
+						if pos >= end:
+							raise lzss_error
+						acc = (acc << 8) | src[pos]
+						pos += 1
+						avail += 8
+					avail -= n
+					val |= (acc >> avail) << shift
+					acc &= (1 << avail) - 1
+					shift += n
+					bits -= n
+				vals.append(val)
+			offset = vals[0]
+			length = vals[1] + min_length
+
+		if written < size - 1:
+			begin = 0
 		else:
-			return len(buffer) >= text_length
-
-	while not finished():
-		encoded = stream.read(1, big_endian)
-		if encoded == 0:
-			offset = int(stream.read(offset_bits, big_endian))
-			length = int(stream.read(length_bits, big_endian)) + min_length
-			buffer.extend(window.copy_out(offset, length))
+			begin = written + 2
+		i = (begin + offset) % size
+		# the output byte at window position i
+		k = written - size + (i - 1 - written) % size
+		if written < size - 1 and i + length > written + 1:
+			# the window has not filled yet and the copy runs past its
+			# end: the first byte is repeated
+			out += out[size + k:size + k + 1] * length
 		else:
-			c = chr(stream.read(8, big_endian))
-			buffer.append(c)
-			window.push(c)
+			# bytes are read as they were before the copy: past the
+			# newest byte the window continues with the oldest one
+			while length > 0:
+				n = min(length, written - k)
+				out += out[size + k:size + k + n]
+				k += n - size
+				length -= n
+		written = len(out) - size
 
-	return ''.join(buffer)
+	return str(out[size:])
 
 imp_version = 0
 # default for v.2
@@ -781,7 +723,7 @@ class imp_parser(object):
 			textiter = add_pgiter(self.page, 'Text', 'imp', 'imp_text', filedata, fileiter)
 		else:
 			dataiter = add_pgiter(self.page, 'Compressed text', 'imp', 0, filedata, fileiter)
-			uncompressed = lzss_decompress(filedata, True, self.window_bits, self.length_bits, self.text_length)
+			uncompressed = lzss_decompress(filedata, True, self.window_bits, self.length_bits, text_length=self.text_length)
 			textiter = add_pgiter(self.page, 'Text', 'imp', 'imp_text', uncompressed, dataiter)
 
 	def _decompress_record(self, data, length):
@@ -1595,4 +1537,45 @@ def open(buf, page, parent):
 	parser = imp_parser(buf, page, parent)
 	parser.parse()
 
+handlers.register("imp", imp_ids)
+
+def bench_lzss(size=1 << 20):
+	# decode a random mix of literals and references with the parameters
+	# of IMP text and of v.2 records
+	import random, time
+	random.seed(size)
+	for (name, args) in (('text', (True, 14, 3, 3, ' ')), ('record', (True, 9, 1, 2, chr(0)))):
+		(big_endian, offset_bits, length_bits, min_length, init_byte) = args
+		chunks = []
+		acc = 0
+		bits = 0
+		length = 0
+		while length < size:
+			if random.random() < 0.5:
+				token = (1 << 8) | random.randint(0, 255)
+				tbits = 9
+				length += 1
+			else:
+				ln = random.randint(0, (1 << length_bits) - 1)
+				token = (random.randint(0, (1 << offset_bits) - 1) << length_bits) | ln
+				tbits = 1 + offset_bits + length_bits
+				length += ln + min_length
+			acc = (acc << tbits) | token
+			bits += tbits
+			while bits >= 8:
+				bits -= 8
+				chunks.append(chr((acc >> bits) & 0xff))
+			acc &= (1 << bits) - 1
+		chunks.append(chr((acc << (8 - bits)) & 0xff))
+		data = ''.join(chunks)
+		start = time.time()
+		out = lzss_decompress(data, big_endian, offset_bits, length_bits, min_length, init_byte, length)
+		t = time.time() - start
+		print('%s: %d -> %d bytes in %.2fs, %.1f MB/s' % (name, len(data), len(out), t, len(out) / t / 1e6))
+
+if __name__ == '__main__':
+	import sys
+	for a in sys.argv[1:] or ['1048576']:
+		bench_lzss(int(a))
+
 # vim: set ft=python ts=4 sw=4 noet:
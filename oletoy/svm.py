@@ -19,6 +19,7 @@
 #
 
 import struct
+import handlers
 
 def Line (hd, size, value):
 	iter1 = hd.model.append(None, None)
@@ -105,3 +106,5 @@ def open (buf,page,parent):
 		page.model.set(iter1,0,cmdname,1,("svm",cmd),2,size+8,3,buf[offset:offset+size+8])
 		page.model.set_value(iter1,6,page.model.get_string_from_iter(iter1))
 		offset += size + 8
+
+handlers.register("svm", svm_ids)
@@ -14,6 +14,7 @@
 # USA
 #
 
+import handlers
 from utils import add_iter, add_pgiter, key2txt, rdata
 
 controls = {
@@ -135,4 +136,6 @@ def parse(data, page, parent):
 	p = parser(page, data, parent)
 	p.parse()
 
+handlers.register("t602", ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
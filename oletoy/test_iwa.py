@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import os
+import random
+import tempfile
+import unittest
+
+import iwa
+
+class Model:
+	"""Top level rows of a page tree: (type, data) pairs."""
+	def __init__(self, rows):
+		self.rows = rows
+
+	def get_iter_first(self):
+		if self.rows:
+			return 0
+		return None
+
+	def iter_next(self, i):
+		if i + 1 < len(self.rows):
+			return i + 1
+		return None
+
+	def get_value(self, i, col):
+		if col == 1:
+			return self.rows[i][0]
+		return self.rows[i][1]
+
+class View:
+	def __init__(self, model):
+		self.model = model
+
+	def get_model(self):
+		return self.model
+
+class Page:
+	def __init__(self, rows):
+		self.view = View(Model(rows))
+
+class SaveTest(unittest.TestCase):
+	def save(self, rows):
+		(fd, fname) = tempfile.mkstemp()
+		os.close(fd)
+		try:
+			iwa.save(Page(rows), fname)
+			f = open(fname, 'rb')
+			data = f.read()
+			f.close()
+		finally:
+			os.remove(fname)
+		return data
+
+	def test_round_trip(self):
+		rnd = random.Random(16)
+		objects = []
+		for n in (0, 1, 17, 300, 0x10000, 0x12345):
+			objects.append(''.join([chr(rnd.choice((0, 1, 0x41, rnd.randint(0, 255)))) for i in range(n)]))
+		rows = [(('iwa', 'iwa_object'), obj) for obj in objects]
+		rows.insert(2, (('iwa', 'iwa_compressed_block'), 'skipped'))
+		data = self.save(rows)
+		self.assertEqual(''.join(map(str, iwa.uncompress_chunks(data))), ''.join(objects))
+
+	def test_nothing_to_save(self):
+		self.assertEqual(self.save([(('iwa', 'iwa_compressed_block'), 'x')]), '')
+
+if __name__ == '__main__':
+	unittest.main()
+
+# vim: set ft=python ts=4 sw=4 noet:
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+import App
+
+def first(buf):
+	for sig in App.match(buf):
+		return sig[4]
+	return None
+
+class MatchOrderTest(unittest.TestCase):
+	"""The first match is the format the old if-chain of fload took."""
+
+	def test_clp_before_emf(self):
+		buf = "\x50\xc3" + "\0"*38 + " EMF" + "\0"*20
+		self.assertEqual(first(buf), "CLP")
+
+	def test_cdr2_before_palm(self):
+		buf = "WL" + "\0"*0x3a + "DATA"
+		self.assertEqual(first(buf), "CDR2")
+
+	def test_fh9_before_later_headers(self):
+		# found by search, yet tried before the ZMF and QXP1 headers
+		tail = "FreeHand" + "\0"*16 + "AGD\x09"
+		self.assertEqual(first("\0"*8 + "xV4" + "\0"*5 + tail), "FH9")
+		self.assertEqual(first("\x00\x1c\x00\x1c" + tail), "FH9")
+
+	def test_fh_not_fh9(self):
+		buf = "AGD\x03" + "FreeHand" + "\0"*16
+		self.assertEqual([s[4] for s in App.match(buf)], ["FH"])
+
+	def test_fh4_before_zmf(self):
+		buf = "FH\0\0" + "\0"*4 + "xV4" + "FHDocHeader"
+		self.assertEqual([s[4] for s in App.match(buf)], ["FH4", "ZMF"])
+
+	def test_fh12_before_fh4(self):
+		buf = "FHD2" + "FHDocHeader"
+		self.assertEqual(first(buf), "FH12")
+
+	def test_limit(self):
+		buf = "\0"*100 + "FreeHand" + "AGD"
+		self.assertEqual(first(buf), "FH9")
+		self.assertEqual(first(buf), first(buf[:200]))
+		self.assertEqual(list(App.match(buf, 100)), [])
+
+class SniffTest(unittest.TestCase):
+	def setUp(self):
+		fd,self.path = tempfile.mkstemp()
+		os.close(fd)
+
+	def tearDown(self):
+		os.remove(self.path)
+
+	def sniff(self, data):
+		f = open(self.path, "wb")
+		f.write(data)
+		f.close()
+		return App.sniff(self.path)
+
+	def test_header(self):
+		self.assertEqual(self.sniff("\x50\xc3" + "\0"*100), ("CLP", 50))
+		self.assertEqual(self.sniff("\x89PNG\x0d\x0a\x1a\x0a"), ("PNG", 100))
+
+	def test_empty(self):
+		self.assertEqual(self.sniff(""), None)
+
+	def test_tail(self):
+		# T602 wants the last byte of the file, past sniff_size
+		data = "@CT 0\r\n" + "x"*App.sniff_size + "\x1a"
+		self.assertEqual(self.sniff(data), ("T602", 60))
+
+	def test_search_limit(self):
+		data = "FreeHand" + "AGD"
+		self.assertEqual(self.sniff(data), ("FH9", 20))
+		self.assertEqual(self.sniff("\x01"*App.sniff_size + data), None)
+
+if __name__ == '__main__':
+	unittest.main()
+
+# vim: set ft=python ts=4 sw=4 noet:
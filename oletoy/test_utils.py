@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+import struct
+import unittest
+
+import nodes
+from utils import pgdata, edit_row, copy_row, paste_row
+
+class Stream:
+	"""Column 4 loader of a lazily read row."""
+	def __init__(self, data):
+		self.data = data
+		self.reads = 0
+
+	def read(self):
+		self.reads += 1
+		return self.data
+
+class LazyRowTest(unittest.TestCase):
+	def setUp(self):
+		self.model = nodes.NodeStore()
+		self.stream = Stream("0123456789abcdef")
+		self.iter1 = self.model.append(None, ["Contents", ("ole", 1), 16, None, self.stream])
+
+	def test_edit(self):
+		edit_row(self.model, self.iter1, 4, 4, "<I", "1")
+		self.assertEqual(pgdata(self.model, self.iter1), "0123" + struct.pack("<I", 1) + "89abcdef")
+		edit_row(self.model, self.iter1, 0, 3, "txt", "xyz")
+		self.assertEqual(pgdata(self.model, self.iter1), "xyz3" + struct.pack("<I", 1) + "89abcdef")
+
+	def test_copy_paste(self):
+		row = copy_row(self.model, self.iter1)
+		niter = paste_row(self.model, self.iter1, row)
+		self.assertEqual(self.model.get_value(niter, 0), "Contents")
+		self.assertEqual(self.model.get_value(niter, 3), "0123456789abcdef")
+		self.assertEqual(self.model.get_value(niter, 4), None)
+		self.assertEqual(self.model.get_path(niter), (1,))
+		# the source row stays lazy
+		self.assertEqual(self.model.get_value(self.iter1, 3), None)
+
+if __name__ == '__main__':
+	unittest.main()
+
+# vim: set ft=python ts=4 sw=4 noet:
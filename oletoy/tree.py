@@ -16,6 +16,7 @@
 
 import gobject
 import gtk, pango
+import nodes
 
 
 def treeview_copy_row(treeview, srcmodel, source, dstmodel, target, drop_position):
@@ -56,24 +57,180 @@ def on_drag_data_received(treeview, drag_context, x, y, selection_data, info, ev
 	else:
 		drag_context.finish(success=False, del_=False, time=eventtime)
 
-def make_view():
+class NodeModel(gtk.GenericTreeModel):
+	# GTK face of a nodes.NodeStore: the view asks only for the rows it shows,
+	# parsers fill the node tree and get gtk.TreeIters back as with TreeStore
+	column_types = (gobject.TYPE_STRING, gobject.TYPE_PYOBJECT, gobject.TYPE_INT,
+		gobject.TYPE_PYOBJECT, gobject.TYPE_PYOBJECT, gobject.TYPE_STRING,
+		gobject.TYPE_STRING, gobject.TYPE_STRING, gobject.TYPE_PYOBJECT,
+		gobject.TYPE_STRING)
+
+	def __init__(self, store=None):
+		gtk.GenericTreeModel.__init__(self)
+		if store == None:
+			store = nodes.NodeStore()
+		self.store = store
+		# nodes are kept by the store
+		self.set_property("leak-references", False)
+
+	def node(self, iter1):
+		if isinstance(iter1,gtk.TreeIter):
+			return self.get_user_data(iter1)
+		return iter1
+
+	def tree_iter(self, node):
+		if node == None:
+			return None
+		return self.create_tree_iter(node)
+
+	def on_get_flags(self):
+		return gtk.TREE_MODEL_ITERS_PERSIST
+
+	def on_get_n_columns(self):
+		return len(self.column_types)
+
+	def on_get_column_type(self, n):
+		return self.column_types[n]
+
+	def on_get_iter(self, path):
+		return self.store.find(path)
+
+	def on_get_path(self, node):
+		return self.store.get_path(node)
+
+	def on_get_value(self, node, col):
+		return node.row[col]
+
+	def on_iter_next(self, node):
+		return self.store.iter_next(node)
+
+	def on_iter_children(self, node):
+		return self.store.iter_children(node)
+
+	def on_iter_has_child(self, node):
+		return len(node.children) > 0
+
+	def on_iter_n_children(self, node):
+		return self.store.iter_n_children(node)
+
+	def on_iter_nth_child(self, node, n):
+		return self.store.iter_nth_child(node,n)
+
+	def on_iter_parent(self, node):
+		return self.store.iter_parent(node)
+
+	def inserted(self, node):
+		iter1 = self.create_tree_iter(node)
+		self.row_inserted(self.store.get_path(node),iter1)
+		p = self.store.iter_parent(node)
+		if p != None and len(p.children) == 1:
+			self.row_has_child_toggled(self.store.get_path(p),self.create_tree_iter(p))
+		return iter1
+
+	def append(self, parent, row=None):
+		return self.inserted(self.store.append(self.node(parent),row))
+
+	def prepend(self, parent, row=None):
+		return self.inserted(self.store.prepend(self.node(parent),row))
+
+	def insert(self, parent, position, row=None):
+		return self.inserted(self.store.insert(self.node(parent),position,row))
+
+	def insert_before(self, parent, sibling, row=None):
+		return self.inserted(self.store.insert_before(self.node(parent),self.node(sibling),row))
+
+	def insert_after(self, parent, sibling, row=None):
+		return self.inserted(self.store.insert_after(self.node(parent),self.node(sibling),row))
+
+	def remove(self, iter1):
+		node = self.node(iter1)
+		path = self.store.get_path(node)
+		p = self.store.iter_parent(node)
+		self.store.remove(node)
+		self.row_deleted(path)
+		if p != None and len(p.children) == 0:
+			self.row_has_child_toggled(self.store.get_path(p),self.create_tree_iter(p))
+		return False
+
+	def clear(self):
+		for i in range(len(self.store.root.children)-1,-1,-1):
+			self.remove(self.store.root.children[i])
+
+	def set_value(self, iter1, col, value):
+		node = self.node(iter1)
+		node.row[col] = value
+		self.row_changed(self.store.get_path(node),self.create_tree_iter(node))
+
+	def set(self, iter1, *args):
+		node = self.node(iter1)
+		self.store.set(node,*args)
+		self.row_changed(self.store.get_path(node),self.create_tree_iter(node))
+
+	def get_value(self, iter1, col):
+		return self.node(iter1).row[col]
+
+	def iter_n_children(self, iter1):
+		return self.store.iter_n_children(self.node(iter1))
+
+	def iter_nth_child(self, parent, n):
+		return self.tree_iter(self.store.iter_nth_child(self.node(parent),n))
+
+	def iter_children(self, iter1):
+		return self.tree_iter(self.store.iter_children(self.node(iter1)))
+
+	def iter_has_child(self, iter1):
+		return self.store.iter_has_child(self.node(iter1))
+
+	def iter_next(self, iter1):
+		return self.tree_iter(self.store.iter_next(self.node(iter1)))
+
+	def iter_parent(self, iter1):
+		return self.tree_iter(self.store.iter_parent(self.node(iter1)))
+
+	def get_iter_first(self):
+		return self.tree_iter(self.store.get_iter_first())
+
+	def is_ancestor(self, iter1, descendant):
+		return self.store.is_ancestor(self.node(iter1),self.node(descendant))
+
+	def get_path(self, iter1):
+		return self.store.get_path(self.node(iter1))
+
+	def get_string_from_iter(self, iter1):
+		return self.store.get_string_from_iter(self.node(iter1))
+
+	def get_iter(self, path):
+		return self.create_tree_iter(self.store.get_iter(path))
+
+	def get_iter_from_string(self, path):
+		return self.get_iter(path)
+
+	def foreach(self, func, *data):
+		for n in self.store.walk():
+			if func(self,self.store.get_path(n),self.create_tree_iter(n),*data):
+				return
+
+
+def make_view(model=None):
 	# Create the model.
-	model = gtk.TreeStore(
-	gobject.TYPE_STRING,    # Name
-	gobject.TYPE_PYOBJECT,  # Type
-	gobject.TYPE_INT,       # Length
-	gobject.TYPE_PYOBJECT,  # Value
-	gobject.TYPE_PYOBJECT,  # Value2 (peer path for YEP)
-	gobject.TYPE_STRING,    # Colour
-	gobject.TYPE_STRING,    # Path
-	gobject.TYPE_STRING,    # VSD_Stream_Format
-	gobject.TYPE_PYOBJECT,  # Command
-	gobject.TYPE_STRING     # Tooltip
-	)
-    
+	if model == None:
+		model = gtk.TreeStore(
+		gobject.TYPE_STRING,    # Name
+		gobject.TYPE_PYOBJECT,  # Type
+		gobject.TYPE_INT,       # Length
+		gobject.TYPE_PYOBJECT,  # Value
+		gobject.TYPE_PYOBJECT,  # Value2 (peer path for YEP)
+		gobject.TYPE_STRING,    # Colour
+		gobject.TYPE_STRING,    # Path
+		gobject.TYPE_STRING,    # VSD_Stream_Format
+		gobject.TYPE_PYOBJECT,  # Command
+		gobject.TYPE_STRING     # Tooltip
+		)
+
 	# Create the view itself.
 	view = gtk.TreeView(model)
-	view.set_reorderable(True)
+	# rows are moved by drag-n-drop of the TreeStore only
+	view.set_reorderable(not isinstance(model,NodeModel))
 	target_entries = [('oletoy', gtk.TARGET_SAME_APP, 0)]
 	view.enable_model_drag_source(
 		gtk.gdk.BUTTON1_MASK, target_entries, gtk.gdk.ACTION_DEFAULT|gtk.gdk.ACTION_MOVE)
@@ -89,4 +89,9 @@ class PageView:
 			self.page.model.set_value(self.iter, 2, length)
 			self.page.model.set_value(self.iter, 3, self.data[self.offset:self.offset + length])
 
+def hd_view(hd, size, data, stype):
+	# rows added by PageView.add_pgiter keep (parser, context) as their type
+	if isinstance(stype, tuple):
+		stype[0](HdView(hd, None, stype[1]), data, 0, size)
+
 # vim: set ft=python sts=4 sw=4 noet:
@@ -15,22 +15,78 @@
 #
 
 import sys,struct,base64
-import gtk, cairo
-
 try:
-	import gv
-	usegraphviz = True
-except:
-	print 'Graphviz not found. Only used for FreeHand.' # Grid layout will be used.'
-	usegraphviz = False
+	import gtk, gobject, cairo
+except ImportError:
+	# headless parsing works without PyGTK
+	gtk = gobject = cairo = None
+import nodes
+
+# optional modules are probed on first use
+gv = None
+usegraphviz = None
+icu = None
+useicu = None
+
+def use_graphviz():
+	global gv, usegraphviz
+	if usegraphviz == None:
+		try:
+			import gv
+			usegraphviz = True
+		except:
+			print 'Graphviz not found. Only used for FreeHand.' # Grid layout will be used.'
+			usegraphviz = False
+	return usegraphviz
 
-try:
-    import icu
-    icu.Locale(1033) # test if pyicu supports creation of locale from LCID
-    useicu = True
-except:
-    print 'Usable ICU not found. Display of MS locale IDs will be limited. (Used for CDR, PUB and WT602.)'
-    useicu = False
+def use_icu():
+	global icu, useicu
+	if useicu == None:
+		try:
+			import icu
+			icu.Locale(1033) # test if pyicu supports creation of locale from LCID
+			useicu = True
+		except:
+			print 'Usable ICU not found. Display of MS locale IDs will be limited. (Used for CDR, PUB and WT602.)'
+			useicu = False
+	return useicu
+
+# called with every module imported by LazyModule or handlers.resolve
+import_hooks = []
+
+class LazyModule(object):
+	# stands for a parser module until something is taken from it; then the
+	# module is imported and put in its place in the namespace
+	def __init__(self, name, namespace):
+		self.__dict__["_name"] = name
+		self.__dict__["_namespace"] = namespace
+
+	def _load(self):
+		m = sys.modules.get(self._name)
+		if m == None:
+			m = __import__(self._name)
+			for hook in import_hooks:
+				hook(m)
+		if self._namespace.get(self._name) is self:
+			self._namespace[self._name] = m
+		return m
+
+	def __getattr__(self, attr):
+		return getattr(self._load(),attr)
+
+	def __setattr__(self, attr, value):
+		setattr(self._load(),attr,value)
+
+	def __repr__(self):
+		return "<lazy module '%s'>"%self._name
+
+def lazy_import(names, namespace):
+	# like "import a, b, c" in the module of namespace (its globals())
+	for name in names.split():
+		if sys.modules.get(name) != None:
+			namespace[name] = sys.modules[name]
+		else:
+			namespace[name] = LazyModule(name,namespace)
 
 ms_charsets = {0:"Latin", 1:"System default", 2:"Symbol", 77:"Apple Roman",
 	128:"Japanese Shift-JIS",129:"Korean (Hangul)",130:"Korean (Johab)",
@@ -72,6 +128,142 @@ def add_pgiter (page, name, ftype, stype, data, parent = None, coltype = None, v
 	pgiter(page, name, ftype, stype, data, iter1, coltype, vprmsmp)
 	return iter1
 
+class DataView(object):
+	# read-only window into a parent buffer (str or mmap), used as record
+	# data instead of a sliced copy; slicing and concatenation give str
+	__slots__ = ("buf","off","size")
+
+	def __init__(self, buf, off=0, size=None):
+		if isinstance(buf,DataView):
+			off += buf.off
+			end = buf.off + buf.size
+			buf = buf.buf
+		else:
+			end = len(buf)
+		off = min(max(off,0),end)
+		if size == None or off + size > end:
+			size = end - off
+		self.buf = buf
+		self.off = off
+		self.size = max(size,0)
+
+	def __len__(self):
+		return self.size
+
+	def __str__(self):
+		return self.buf[self.off:self.off+self.size]
+
+	def __repr__(self):
+		return "DataView(%d, %d)"%(self.off,self.size)
+
+	def __getitem__(self, k):
+		if isinstance(k,slice):
+			start,stop,step = k.indices(self.size)
+			if step != 1:
+				return str(self)[k]
+			if stop < start:
+				stop = start
+			return self.buf[self.off+start:self.off+stop]
+		if k < 0:
+			k += self.size
+		if k < 0 or k >= self.size:
+			raise IndexError("DataView index out of range")
+		return self.buf[self.off+k]
+
+	def __getslice__(self, i, j):
+		return self.__getitem__(slice(i,j))
+
+	def __iter__(self):
+		for i in range(self.size):
+			yield self.buf[self.off+i]
+
+	def __add__(self, other):
+		return str(self) + str(other)
+
+	def __radd__(self, other):
+		return str(other) + str(self)
+
+	def __mul__(self, n):
+		return str(self) * n
+
+	def __eq__(self, other):
+		if isinstance(other,DataView):
+			other = str(other)
+		return str(self) == other
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __hash__(self):
+		return hash(str(self))
+
+	def __nonzero__(self):
+		return self.size > 0
+
+	def __contains__(self, s):
+		return self.find(s) != -1
+
+	def find(self, s, start=0, end=None):
+		start,end,step = slice(start,end).indices(self.size)
+		r = self.buf.find(s,self.off+start,self.off+max(start,end))
+		if r != -1:
+			r -= self.off
+		return r
+
+	def rfind(self, s, start=0, end=None):
+		start,end,step = slice(start,end).indices(self.size)
+		r = self.buf.rfind(s,self.off+start,self.off+max(start,end))
+		if r != -1:
+			r -= self.off
+		return r
+
+	def startswith(self, s):
+		return self.buf[self.off:self.off+min(len(s),self.size)] == s
+
+def side_store (page, *types):
+	# stores besides page.model, e.g. page.dictmod; types are gobject type
+	# names. Headless parsing makes no gtk objects, the background loader
+	# turns the node store into a gtk.TreeStore on the main thread.
+	if page.headless:
+		return nodes.NodeStore(types)
+	return gtk.TreeStore(*[gobject.type_from_name(t) for t in types])
+
+def pgdata (model, iter1):
+	# record data; rows of lazily read containers keep a loader in column 4
+	data = model.get_value(iter1,3)
+	if data is None:
+		loader = model.get_value(iter1,4)
+		if hasattr(loader,"read"):
+			data = loader.read()
+	elif isinstance(data,DataView):
+		data = str(data)
+	return data
+
+def edit_row (model, iter1, offset, size, fmt, text):
+	# puts a value edited in the hexdump into the record data
+	value = pgdata(model,iter1)
+	if fmt == "clr":
+		value = value[0:offset] + struct.pack("B",int(text[4:6],16))+struct.pack("B",int(text[2:4],16))+struct.pack("B",int(text[0:2],16))+value[offset+3:]
+	elif fmt == "clrgb":
+		value = value[0:offset] + struct.pack("B",int(text[0:2],16))+struct.pack("B",int(text[2:4],16))+struct.pack("B",int(text[4:6],16))+value[offset+3:]
+	elif fmt == "txt":
+		value = value[0:offset]+text+value[offset+size:]
+	elif fmt == "utxt":
+		value = value[0:offset]+text.encode("utf-16-le")+value[offset+size:]
+	else:
+		value = value[0:offset] + struct.pack(fmt,float(text))+value[offset+size:]
+	model.set_value(iter1,3,value)
+
+def copy_row (model, iter1):
+	# the data is read now, a loader in column 4 belongs to the source row
+	return (model.get_value(iter1,0),model.get_value(iter1,1),model.get_value(iter1,2),pgdata(model,iter1))
+
+def paste_row (model, iter1, row):
+	niter = model.insert_after (None, iter1)
+	for i in range(4):
+		model.set_value (niter, i, row[i])
+	return niter
+
 def prep_pgiter (page, name, ftype, stype, data, parent = None, coltype=None):
 	iter1 = page.model.prepend (parent,None)
 	pgiter(page, name, ftype, stype, data, iter1,coltype)
@@ -150,7 +342,7 @@ def bflag2txt(flag,data,txt=""):
 	return txt
 
 def lcid2txt(lcid):
-	if useicu:
+	if use_icu():
 		try:
 			return icu.Locale(lcid).getDisplayName()
 		except:
@@ -307,7 +499,7 @@ def gv_layout(nodes,edges,mode="dot"):
 
 
 def graph_layout (app, doc, algo):
-	if usegraphviz and algo in ("fdp","sfdp","neato","circo","osage","dot","twopi"):
+	if use_graphviz() and algo in ("fdp","sfdp","neato","circo","osage","dot","twopi"):
 		devs = gv_layout(doc.nodes,doc.edges,algo)
 	else:
 		# hinted random placement
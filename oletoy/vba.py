@@ -18,6 +18,7 @@ import gtk
 import tree
 import hexdump
 import inflate
+import handlers
 from utils import *
 
 
@@ -128,7 +129,7 @@ def parse (page, data, parent):
 		citer = model.iter_nth_child(vbaiter,k)
 		cname = model.get_value(citer,0)
 		if mods.has_key(cname):
-			cdata = model.get_value(citer,3)
+			cdata = pgdata(model,citer)
 			if ord(cdata[mods[cname]]) == 1:
 				try:
 					cvalue = inflate.inflate_vba(cdata[mods[cname]:],page.type)
@@ -140,3 +141,5 @@ def parse (page, data, parent):
 					model.set_value(iter1,6,model.get_string_from_iter(iter1))
 				except:
 					print 'VBA Src Inflate failed ',cname
+
+handlers.register("vba", {"dir":vba_dir, "src":vba_src}, ("hd","data"))
@@ -22,31 +22,16 @@ import tree
 import uniview
 import hexdump
 import App, viewCmd
-import escher,quill
-import vsd,vsd2,vsdchunks,vsdchunks5,vsdstream4
-import xls, vba, ole, doc, mdb, pub, ppt, rtf, pm6, qxp
-import emfparse,svm,mf,wmfparse,emfplus
-import rx2,fh
-import fh12
-import cdr,cmx,wld,cpt,ppp,pict,chdraw,yep,midi
-import riff,dsf,drw
-import vfb
-import lrf
-import wls
-import wt602
-import c602
-import t602
-import palm
-import sbimp
-import zmf
-import zbr
-import iwa
-import plist
-import bmi
 import hv2, utils
+import bgload
+import profiler
+import log
+import handlers
 from utils import *
 from hv2 import HexView
 
+lazy_import("vsd xls ole doc pub rtf qxp mf fh cdr yep midi iwa", globals())
+
 try:
 	import indd
 except:
@@ -81,6 +66,7 @@ ui_info = \
 		<menuitem action='Graph'/>
 		<menuitem action='Sync Panels'/>
 		<menuitem action='Diff'/>
+		<menuitem action='Profile'/>
 	</menu>
 	<menu action='HelpMenu'>
 		<menuitem action='Manual'/>
@@ -202,6 +188,7 @@ class ApplicationMainWindow(gtk.Window):
 
 		self.options_win = None
 		self.bup_win = None
+		self.prof_win = None
 		self.offlen = None
 		self.statbuffer = ""
 		self.run_win = None
@@ -209,7 +196,7 @@ class ApplicationMainWindow(gtk.Window):
 		try:
 			self.cgsf = ctypes.cdll.LoadLibrary(self.gsfname)
 		except:
-			print "Libgsf-1 was not found, do not try to open OLE-based files."
+			print "Libgsf-1 was not found, do not try to save OLE-based files."
 
 
 		if len(sys.argv) > 1:
@@ -225,6 +212,14 @@ class ApplicationMainWindow(gtk.Window):
 		self.font = "Monospace"
 		self.fontsize = 14
 		self.gsfname = 'libgsf-1.so'
+		self.olecache = 64
+		self.scanlimit = 64
+		self.nodeview = 0
+		self.parsecache = 0
+		self.bgparse = 0
+		self.profile = 0
+		self.loglevel = "info"
+		self.logmodules = {}
 		self.snipsdir = os.path.join(os.path.expanduser("~"), ".oletoy")
 
 		try:
@@ -232,12 +227,31 @@ class ApplicationMainWindow(gtk.Window):
 			print 'Config loaded...'
 		except:
 			pass
+		ole.cache_limit = self.olecache*1024*1024
+		App.scan_limit = self.scanlimit*1024*1024
+		App.nodeview = self.nodeview
+		if self.parsecache:
+			App.cache_dir = os.path.join(self.snipsdir,"cache")
+			App.cache_limit = self.parsecache*1024*1024
+		if self.profile:
+			profiler.enable()
+		log.set_level(self.loglevel)
+		for m,l in self.logmodules.items():
+			log.set_level(l,m)
 
 	def save_config(self):
 		cfg = open("oletoy.cfg", "w")
 		cfg.write("# Monospace font for HexView\nself.font='%s'\n\n"%self.font)
 		cfg.write("# Font size for HexView\nself.fontsize=%s\n\n"%self.fontsize)
 		cfg.write("# Name of the libgsf\nself.gsfname='%s'\n\n"%self.gsfname)
+		cfg.write("# Megabytes of OLE stream data cached per file\nself.olecache=%s\n\n"%self.olecache)
+		cfg.write("# Megabytes searched for signatures that are not at the file start\nself.scanlimit=%s\n\n"%self.scanlimit)
+		cfg.write("# Keep records in a node tree, the view reads only the rows it shows (no drag-n-drop)\nself.nodeview=%s\n\n"%self.nodeview)
+		cfg.write("# Megabytes of parsed trees kept in ~/.oletoy/cache to reopen files faster (0 - off)\nself.parsecache=%s\n\n"%self.parsecache)
+		cfg.write("# Files of this many megabytes or more are parsed in background (0 - never)\nself.bgparse=%s\n\n"%self.bgparse)
+		cfg.write("# Collect parsing time per record type from the start (View/Profile shows it)\nself.profile=%s\n\n"%self.profile)
+		cfg.write("# Parser messages: off, error, warn, info, debug or trace\nself.loglevel='%s'\n\n"%self.loglevel)
+		cfg.write("# Message levels per module, e.g. {'xls':'trace'}\nself.logmodules=%r\n\n"%self.logmodules)
 
 	def __create_action_group(self):
 		# GtkActionEntry
@@ -294,6 +308,10 @@ class ApplicationMainWindow(gtk.Window):
 				"Diff", "<control>X",					  # label, accelerator
 				"Diff for two records",							 # tooltip
 				self.activate_diff),
+			( "Profile", gtk.STOCK_INDEX,					# name, stock id
+				"_Profile", "",					  # label, accelerator
+				"Parsing time per record type",							 # tooltip
+				self.activate_profile),
 
 			( "Options", None,                    # name, stock id
 				"Op_tions", "<control>T",                      # label, accelerator
@@ -493,6 +511,8 @@ class ApplicationMainWindow(gtk.Window):
 			self.bup_win = None
 		if win == "options":
 			self.options_win = None
+		if win == "profile":
+			self.prof_win = None
 		if win == "dict":
 			pn = self.notebook.get_current_page()
 			if pn != -1:
@@ -519,8 +539,69 @@ class ApplicationMainWindow(gtk.Window):
 			treeSelection = self.das[pn].view.get_selection()
 			model, iter1 = treeSelection.get_selected()
 			if iter1:
-				graph(self.das[pn].hd,model.get_value(iter1,3))
+				graph(self.das[pn].hd,pgdata(model,iter1))
+
 
+	def activate_profile (self, action):
+		# opening the panel starts collecting if it was not on
+		profiler.enable()
+		if self.prof_win != None:
+			self.fill_profile()
+			self.prof_win.present()
+			return
+		# label, calls, own ms, cumulative ms, bytes, file:line
+		self.prof_model = gtk.ListStore(gobject.TYPE_STRING,gobject.TYPE_INT,gobject.TYPE_DOUBLE,
+			gobject.TYPE_DOUBLE,gobject.TYPE_INT64,gobject.TYPE_STRING)
+		view = gtk.TreeView(self.prof_model)
+		cell = gtk.CellRendererText()
+		cell.set_property('family-set',True)
+		cell.set_property('font',"%s %s"%(self.font,'10'))
+		for i,title in enumerate(("Record","Calls","Own, ms","Total, ms","Bytes","Where")):
+			column = gtk.TreeViewColumn(title, cell, text=i)
+			column.set_sort_column_id(i)
+			column.set_resizable(True)
+			view.append_column(column)
+		self.prof_model.set_sort_column_id(2,gtk.SORT_DESCENDING)
+		scrolled = gtk.ScrolledWindow()
+		scrolled.set_policy(gtk.POLICY_AUTOMATIC,gtk.POLICY_AUTOMATIC)
+		scrolled.add(view)
+		scrolled.set_size_request(700,400)
+		hbox = gtk.HBox()
+		for label,cb in (("Refresh",self.fill_profile),("Reset",self.reset_profile),
+			("Save pstats",self.save_profile),("Save JSON",self.save_profile)):
+			button = gtk.Button(label)
+			button.connect("clicked",cb)
+			hbox.pack_start(button,False,False,2)
+		vbox = gtk.VBox()
+		vbox.pack_start(scrolled)
+		vbox.pack_start(hbox,False,False,2)
+		profwin = gtk.Window(gtk.WINDOW_TOPLEVEL)
+		profwin.set_resizable(True)
+		profwin.add(vbox)
+		profwin.set_title("Profile")
+		profwin.connect("destroy", self.del_win,"profile")
+		profwin.show_all()
+		self.prof_win = profwin
+		self.fill_profile()
+
+	def fill_profile (self, button=None):
+		self.prof_model.clear()
+		for label,calls,own,cum,nbytes,fname,line in profiler.rows():
+			self.prof_model.append((label,calls,own*1000,cum*1000,nbytes,"%s:%s"%(fname,line)))
+
+	def reset_profile (self, button):
+		profiler.reset()
+		self.fill_profile()
+
+	def save_profile (self, button):
+		if button.get_label() == "Save JSON":
+			fname = self.file_open('Save',None,None,"profile.json")
+			if fname:
+				profiler.save_json(fname)
+		else:
+			fname = self.file_open('Save',None,None,"profile.pstats")
+			if fname:
+				profiler.save_pstats(fname)
 
 	def activate_bup (self, action):
 		if self.bup_win != None:
@@ -704,7 +785,7 @@ class ApplicationMainWindow(gtk.Window):
 		treeSelection = self.das[pn].view.get_selection()
 		model, iter1 = treeSelection.get_selected()
 		type = model.get_value(iter1,1)[0]
-		value = model.get_value(iter1,3)
+		value = pgdata(model,iter1)
 		if type == "emf":
 			size = model.get_value(iter1,2)+4
 			model.set_value(iter1,3,value[0:4]+struct.pack("<I",size)+value[8:]+'\x00'*4)
@@ -729,7 +810,7 @@ class ApplicationMainWindow(gtk.Window):
 			model, iter1 = treeSelection.get_selected()
 			type = model.get_value(iter1,1)[0]
 			size = model.get_value(iter1,2)
-			value = model.get_value(iter1,3)
+			value = pgdata(model,iter1)
 			if type == "emf" and size > 11:
 				model.set_value(iter1,2,size-4)
 				model.set_value(iter1,3,value[0:4]+struct.pack("<I",size-4)+value[8:size-4])
@@ -748,11 +829,10 @@ class ApplicationMainWindow(gtk.Window):
 		if pn != -1:
 			treeSelection = self.das[pn].view.get_selection()
 			model, iter1 = treeSelection.get_selected()
-			data = model.get_value(iter1,3)
 			fname = self.file_open('Save')
 			if fname:
 				nlen = model.get_value(iter1,2)
-				value = model.get_value(iter1,3)
+				value = pgdata(model,iter1)
 				if nlen != None:
 					f = open(fname,'wb')
 					f.write(value)
@@ -786,7 +866,7 @@ class ApplicationMainWindow(gtk.Window):
 					if model.get_value(iter2,1)[1] == 0x46:
 						if type > 0x4000:
 							cursize = model2.get_value(iter2,2)
-							curval = model2.get_value(iter2,3)
+							curval = pgdata(model2,iter2)
 							addval = dictmodel.get_value(iter,3)
 							model2.set_value(iter2,2,size+len(addval))
 							model2.set_value(iter2,3,curval+addval)
@@ -833,6 +913,7 @@ class ApplicationMainWindow(gtk.Window):
 		ftype = self.das[pn].type
 		fname = self.das[pn].fname
 		print ftype
+		ole.load_all(self.das[pn])
 		if  ftype == "WMF" or ftype  == "APWMF" or ftype  == "EMF" or ftype == "SVM":
 			fname = self.file_open('Save',None,None,fname)
 			if fname:
@@ -869,6 +950,10 @@ class ApplicationMainWindow(gtk.Window):
 			fname = self.file_open('Save',None,None,fname)
 			if fname:
 				cdr.save(self.das[pn],fname)
+		elif ftype == "IWA":
+			fname = self.file_open('Save',None,None,fname)
+			if fname:
+				iwa.save(self.das[pn],fname)
 		else:
 			self.activate_dump(action)
 
@@ -932,7 +1017,8 @@ class ApplicationMainWindow(gtk.Window):
 			elif 'reload' in goto.lower():
 				#try:
 				if 1:
-					exec("reload(%s)"%goto[7:-1])
+					# the module may not be imported yet
+					reload(__import__(goto[7:-1].strip()))
 					self.activate_reload(None)
 				#except:
 				#	print "Cannot reload",goto[7:-1]
@@ -946,7 +1032,7 @@ class ApplicationMainWindow(gtk.Window):
 				treeSelection = self.das[pn].view.get_selection()
 				model, niter = treeSelection.get_selected()
 				if niter != None:
-					v = model.get_value(niter,3)
+					v = pgdata(model,niter)
 					add_pgiter(self.das[pn],"Part1","dontsave","",v[:off],niter)
 					add_pgiter(self.das[pn],"Part2","dontsave","",v[off:],niter)
 			elif 'rename' in goto.lower():
@@ -963,7 +1049,7 @@ class ApplicationMainWindow(gtk.Window):
 					if niter != None:
 						v = ""
 						for i in j:
-							v += model.get_value(niter,3)[int(i,16):]
+							v += pgdata(model,niter)[int(i,16):]
 							niter = model.iter_next(niter)
 				else:
 					if '@' in goto:
@@ -977,10 +1063,10 @@ class ApplicationMainWindow(gtk.Window):
 					model, niter = treeSelection.get_selected()
 					iter1 = niter
 					if niter != None:
-						v = model.get_value(niter,3)[off:]
+						v = pgdata(model,niter)[off:]
 						for i in range(num-1):
 							niter = model.iter_next(niter)
-							v += model.get_value(niter,3)[off:]
+							v += pgdata(model,niter)[off:]
 				if iter1 != None:
 					add_pgiter(self.das[pn],"[Joined data]","dontsave","",v,iter1)
 
@@ -1074,13 +1160,9 @@ class ApplicationMainWindow(gtk.Window):
 				return 1
 			else:
 				if event.keyval == 99 and event.state == gtk.gdk.CONTROL_MASK:
-					self.selection = (model.get_value(iter1,0),model.get_value(iter1,1),model.get_value(iter1,2),model.get_value(iter1,3))
+					self.selection = copy_row(model,iter1)
 				if event.keyval == 118 and event.state == gtk.gdk.CONTROL_MASK and self.selection != None:
-					niter = model.insert_after (None, iter1)
-					model.set_value (niter, 0, self.selection[0])
-					model.set_value (niter, 1, self.selection[1])
-					model.set_value (niter, 2, self.selection[2])
-					model.set_value (niter, 3, self.selection[3])
+					paste_row(model,iter1,self.selection)
 
 	def on_row_keyreleased (self, view, event):
 		treeSelection = view.get_selection()
@@ -1189,7 +1271,7 @@ class ApplicationMainWindow(gtk.Window):
 		size = model.get_value(iter1,3)
 		offset2 = model.get_value(iter1,5)
 		size2 = model.get_value(iter1,6)
-		hd.hv.hl = {}
+		hd.hv.hl.clear()
 		hd.hv.hl[0] = offset,size,1,1,0,0.9
 		if size2 > 0:
 			hd.hv.hl[1] = offset2,size2,1,0,1,0.9
@@ -1335,7 +1417,7 @@ class ApplicationMainWindow(gtk.Window):
 		treeSelection = self.das[pn].view.get_selection()
 		model, iter1 = treeSelection.get_selected()
 		hd = self.das[pn].hd
-		model.set_value(iter1,3,hd.hv.data)
+		model.set_value(iter1,3,str(hd.hv.data))
 		hd.hv.modified = 0
 		hd.hv.expose(None,None)
 		self.on_row_activated(self.das[pn].view,model.get_path(iter1),self.das[pn].view.get_column(0))
@@ -1346,7 +1428,6 @@ class ApplicationMainWindow(gtk.Window):
 		treeSelection = self.das[pn].view.get_selection()
 		model, iter1 = treeSelection.get_selected()
 		hd = self.das[pn].hd
-		value = model.get_value(iter1,3) 
 		hditer = hd.model.get_iter(path)
 
 		offset = hd.model.get_value(hditer,2)
@@ -1354,27 +1435,16 @@ class ApplicationMainWindow(gtk.Window):
 		fmt = hd.model.get_value(hditer,4)
 		#print 'Format: ', fmt
 
-		if fmt == "clr":
-			value = value[0:offset] + struct.pack("B",int(new_text[4:6],16))+struct.pack("B",int(new_text[2:4],16))+struct.pack("B",int(new_text[0:2],16))+value[offset+3:]
-		elif fmt == "clrgb":
-			value = value[0:offset] + struct.pack("B",int(new_text[0:2],16))+struct.pack("B",int(new_text[2:4],16))+struct.pack("B",int(new_text[4:6],16))+value[offset+3:]
-		elif fmt == "txt":
-			value = value[0:offset]+new_text+value[offset+size:]
-		elif fmt == "utxt":
-			value = value[0:offset]+new_text.encode("utf-16-le")+value[offset+size:]
-		else:
-			value = value[0:offset] + struct.pack(fmt,float(new_text))+value[offset+size:]
-
-		model.set_value(iter1,3,value)
+		edit_row(model,iter1,offset,size,fmt,new_text)
 		if self.das[pn].type == "vsd":
 			(ifmt,itype,t) = model.get_value(iter1,1)
 		else:
 			(ifmt,itype) = model.get_value(iter1,1)
 		if ifmt == "emf" and itype > 0x4000:
 			piter = model.iter_parent(iter1)
-			nvalue = model.get_value(piter,3)[:16]
+			nvalue = pgdata(model,piter)[:16]
 			for i in range(model.iter_n_children(piter)):
-				nvalue += model.get_value(model.iter_nth_child(piter,i),3)
+				nvalue += pgdata(model,model.iter_nth_child(piter,i))
 			model.set_value(piter,3,nvalue)
 			
 		self.on_row_activated(self.das[pn].view,model.get_path(iter1),0)
@@ -1420,9 +1490,12 @@ class ApplicationMainWindow(gtk.Window):
 		hd.version = page.version
 		hd.context = page.context
 		iter1 = model.get_iter(path)
+		lazy = model.get_value(iter1,4)
+		if isinstance(lazy,ole.OLEStream) and not page.loader:
+			lazy.load(page,iter1)
 		ntype = model.get_value(iter1,1)
 		size = model.get_value(iter1,2)
-		data = model.get_value(iter1,3)
+		data = pgdata(model,iter1)
 		if page.type == "YEP":
 			gloff = model.get_value(iter1,7)
 		else:
@@ -1436,7 +1509,7 @@ class ApplicationMainWindow(gtk.Window):
 			result = dialog.run()
 			dialog.destroy()
 			if result == gtk.RESPONSE_YES:
-				model.set_value(hd.hv.iter,3,hd.hv.data)
+				model.set_value(hd.hv.iter,3,str(hd.hv.data))
 			elif result == gtk.RESPONSE_NO:
 				print "Changes discarded"
 
@@ -1447,8 +1520,7 @@ class ApplicationMainWindow(gtk.Window):
 			hd.hv.parent = self
 			hd.hv.iter = iter1
 			hd.hv.data = data
-			hd.hv.hvlines = []
-			hd.hv.hl = {}
+			hd.hv.hl.clear()
 			hd.hv.sel = None
 			hd.hv.curr = 0
 			hd.hv.curc = 0
@@ -1485,173 +1557,14 @@ class ApplicationMainWindow(gtk.Window):
 						return
 					except:
 						pass
-				# YEP
-				if ntype[0] == "vprm" or ntype[0] == "yep":
-					if ntype[1] in yep.vprmfunc:
-						off = 0
-						offsmp = model.get_value(iter1,8)
-						if offsmp == None:
-							offstr = model.get_value(iter1,7)
-							if offstr:
-								off = int(offstr,16)
-						else:
-							off = offsmp
-						yep.vprmfunc[ntype[1]](hd,data,off)
-						
-						# add ligthgreen HL for hdrows
-						hditer1 = hd.model.get_iter_first()
-						hlid = 0
-						while None != hditer1:
-							hdoffset = hd.model.get_value(hditer1,2)
-							hdsize = hd.model.get_value(hditer1,3)
-							hdoffset2 = hd.model.get_value(hditer1,5)
-							hdsize2 = hd.model.get_value(hditer1,6)
-							hd.hv.hl[hlid] = hdoffset,hdsize,.6,.9,.6,.9
-							hlid += 1
-							if hdsize2 > 0:
-								hd.hv.hl[hlid] = hdoffset2,hdsize2,.6,.9,.6,.9
-								hlid += 1
-							hditer1 = hd.model.iter_next(hditer1)
-						hd.hv.expose(None,None)
-				if ntype[0] == "drw":
-					if drw.recfuncs.has_key(ntype[1]):
-						drw.recfuncs[ntype[1]](hd, data, page)
-				if ntype[0] == "escher":
-					if ntype[1] == "odraw":
-						if escher.odraw_ids.has_key(ntype[2]):
-							escher.odraw_ids[ntype[2]](hd, size, data)
-				elif ntype[0] == "quill":
-					if quill.sub_ids.has_key(ntype[1]):
-						quill.sub_ids[ntype[1]](hd, size, data)
-				elif ntype[0][:4] == "vsd2":
-					off = 19
-					if ntype[0] == "vsd24":
-						off = 4
-					if ntype[1] in vsdchunks.chnk_func:
-						vsdchunks.chnk_func[ntype[1]](hd, size, data,off)
-				elif ntype[0] == "vsd":
-					if ntype[1] == "chnk":
-						if vsdchunks.chnk_func.has_key(ntype[2]):
-							vsdchunks.chnk_func[ntype[2]](hd, size, data)
-					elif ntype[1] == "str4":
-						if vsdstream4.stream_func.has_key(ntype[2]):
-							vsdstream4.stream_func[ntype[2]](hd, size, data)
-					elif ntype[1] == "hdr":
-						vsd.hdr(hd,data)
-				elif ntype[0][:4] == "vsdv" and ntype[1][:4] == "chnk":
-						if vsdchunks5.chnk_func.has_key(int(ntype[1][5:])):
-							vsdchunks5.chnk_func[int(ntype[1][5:])](hd, size, data)
-				elif ntype[0] == "vba" and ntype[1] == "dir":
-					vba.vba_dir(hd,data)
-				elif ntype[0] == "vba" and ntype[1] == "src":
-					vba.vba_src(hd,data)
-				elif ntype[0] == "ppp":
-					if ppp.ppp_ids.has_key(ntype[1]):
-						ppp.ppp_ids[ntype[1]](hd,size,data,page)
-				elif ntype[0] == "emf":
-					if emfparse.emr_ids.has_key(ntype[1]):
-						emfparse.emr_ids[ntype[1]](hd,size,data)
-				elif ntype[0] == "wmf":
-					if wmfparse.wmr_ids.has_key(ntype[1]):
-						wmfparse.wmr_ids[ntype[1]](hd,size,data)
-				elif ntype[0] == "svm":
-					if svm.svm_ids.has_key(ntype[1]):
-						svm.svm_ids[ntype[1]](hd,size,data)
-				elif ntype[0] == "cmx":
-					if cmx.cmx_ids.has_key(ntype[1]):
-						cmx.cmx_ids[ntype[1]](hd,size,data)
-				elif ntype[0] == "cdr":
-					if cdr.cdr_ids.has_key(ntype[1]):
-						if ntype[1] == 'DISP':
-							cdr.cdr_ids[ntype[1]](hd,size,data,page)
-						else:
-							cdr.cdr_ids[ntype[1]](hd,size,data)
-				elif ntype[0] == "wld":
-					if wld.wld_ids.has_key(ntype[1]):
-							wld.wld_ids[ntype[1]](hd,size,data)
-				elif ntype[0][0:3] == "pub":
-					if pub.pub98_ids.has_key(ntype[1]):
-							pub.pub98_ids[ntype[1]](hd,size,data)
-				elif ntype[0] == "lrf":
-					if lrf.lrf_ids.has_key(ntype[1]):
-						lrf.lrf_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "wls":
-					if wls.wls_ids.has_key(ntype[1]):
-						wls.wls_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "wt602":
-					if wt602.wt602_ids.has_key(ntype[1]):
-						wt602.wt602_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "c602":
-					if c602.c602_ids.has_key(ntype[1]):
-						c602.c602_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "t602":
-					if t602.ids.has_key(ntype[1]):
-						t602.ids[ntype[1]](hd, size, data)
-				elif ntype[0] == 'imp':
-					if sbimp.imp_ids.has_key(ntype[1]):
-						sbimp.imp_ids[ntype[1]](hd, size, data)
-				elif	ntype[0] == "emf+":
-					if emfplus.emfplus_ids.has_key(ntype[1]):
-						emfplus.emfplus_ids[ntype[1]](hd,data)
-				elif ntype[0] == "xls":
-					if xls.biff5_ids.has_key(ntype[1]):
-						xls.biff5_ids[ntype[1]](hd,data)
-				elif ntype[0] == "doc":
-					if doc.recs.has_key(ntype[1]):
-						doc.recs[ntype[1]](hd,data)
-				elif ntype[0] == "mdb":
-					if mdb.rec_ids.has_key(ntype[1]):
-						mdb.rec_ids[ntype[1]](hd,data)
-				elif	ntype[0] == "cfb":
-					if ole.cfb_ids.has_key(ntype[1]):
-						ole.cfb_ids[ntype[1]](hd,data)
-				elif ntype[0] == "rx2":
-					if rx2.rx2_ids.has_key(ntype[1]):
-						rx2.rx2_ids[ntype[1]](hd,data)
-				elif ntype[0] == "palm":
-					if palm.palm_ids.has_key(ntype[1]):
-						palm.palm_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "pm":
-					if pm6.hd_ids.has_key(ntype[1]):
-						pm6.hd_ids[ntype[1]](hd,data,page)
-				elif ntype[0] == "fh":
-					if fh.hdp.has_key(ntype[1]):
-						fh.hdp[ntype[1]](hd,data,page)
-				elif ntype[0] == "fh12":
-					if fh12.fh12_ids.has_key(ntype[1]):
-						fh12.fh12_ids[ntype[1]](hd,size,data,ntype[1])
-				elif ntype[0] == "zmf2":
-					if isinstance(ntype[1], tuple):
-						view = uniview.HdView(hd, None, ntype[1][1])
-						ntype[1][0](view, data, 0, size)
-					elif zmf.zmf2_ids.has_key(ntype[1]):
-						zmf.zmf2_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "zmf4":
-					if zmf.zmf4_ids.has_key(ntype[1]):
-						zmf.zmf4_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "zbr":
-					if isinstance(ntype[1], tuple):
-						view = uniview.HdView(hd, None, ntype[1][1])
-						ntype[1][0](view, data, 0, size)
-					elif zbr.zbr_ids.has_key(ntype[1]):
-						zbr.zbr_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "iwa":
-					if iwa.iwa_ids.has_key(ntype[1]):
-						iwa.iwa_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "plist":
-					if plist.plist_ids.has_key(ntype[1]):
-						plist.plist_ids[ntype[1]](hd, size, data)
-				elif ntype[0] == "bmi":
-					if callable(ntype[1]):
-						ntype[1](hd, size, data)
-					elif bmi.bmi_ids.has_key(ntype[1]):
-						bmi.bmi_ids[ntype[1]](hd, size, data)
-				elif ntype[0][0:3] == "qxp":
-					qxp.call(hd, size, data, ntype[0], ntype[1])
-				elif ntype[0] == "xml":
-					add_iter (hd,"",data,0,len(data),"txt")
-				elif ntype[0] == "ole" and ntype[1] == "propset":
-					ole.suminfo(hd,data)
+				handlers.call(hd, size, data, page, ntype, model, iter1)
+
+	def on_row_expand(self, view, iter1, path, page):
+		if page.loader:
+			return
+		lazy = page.model.get_value(iter1,4)
+		if isinstance(lazy,ole.OLEStream):
+			lazy.load(page,iter1)
 
 	def tab_button_clicked(self, button):
 		print 'Close tab clicked',button.get_parent().get_parent()
@@ -1672,6 +1585,7 @@ class ApplicationMainWindow(gtk.Window):
 		self.notebook.show_tabs = True
 		self.notebook.show_all()
 		doc.view.connect("row-activated", self.on_row_activated)
+		doc.view.connect("test-expand-row", self.on_row_expand, doc)
 		doc.view.connect("key-press-event", self.on_row_keypressed)
 		doc.view.connect("key-release-event", self.on_row_keyreleased)
 		doc.view.connect("button-release-event", self.on_row_keyreleased)
@@ -1690,9 +1604,11 @@ class ApplicationMainWindow(gtk.Window):
 			par = model.iter_parent(iter1)
 			start,off = model.get_value(iter1,4)
 			print "Reloading FH from %02x ..."%off
-			r = model.remove(iter1)
+			r = iter1
 			while r:
-				r = model.remove(iter1)
+				nxt = model.iter_next(r)
+				model.remove(r)
+				r = nxt
 			print "Iters removed"
 
 			fho = page.appdoc
@@ -1717,6 +1633,8 @@ class ApplicationMainWindow(gtk.Window):
 	def on_tab_close_clicked(self, tab_label, notebook, tab_widget):
 		""" Callback for the "close-clicked" emitted by custom TabLabel widget. """
 		pn = notebook.page_num(tab_widget)
+		if self.das[pn].loader:
+			self.das[pn].loader.cancel()
 		del self.das[pn]
 		self.notebook.remove_page(pn)
 		if pn < len(self.das):  ## not the last page
@@ -1743,39 +1661,73 @@ class ApplicationMainWindow(gtk.Window):
 			doc.hd = hexdump.hexdump()
 			doc.hd.hv.font = self.font
 			doc.hd.hv.fontsize = self.fontsize
+			if self.bgparse and os.path.getsize(fname) >= self.bgparse*1024*1024:
+				doc.pname = os.path.split(fname)[1]
+				self.add_page(doc)
+				self.start_loader(doc)
+				return
 			err = doc.fload()
 			if err == 0:
-				dnum = len(self.das)
-				self.das[dnum] = doc
-				scrolled = doc.scrolled
-				vpaned = doc.hd.vpaned
-				doc.view.connect("row-activated", self.on_row_activated)
-				doc.view.connect("key-press-event", self.on_row_keypressed)
-				doc.view.connect("key-release-event", self.on_row_keyreleased)
-				doc.view.connect("button-release-event", self.on_row_keyreleased)
-				doc.hd.hdview.connect("row-activated", self.on_hdrow_activated)
-				doc.hd.hdview.connect("key-release-event", self.on_hdrow_keyreleased)
-				doc.hd.hdview.connect("button-release-event", self.on_hdrow_keyreleased)
-				doc.hd.hdrend.connect('edited', self.edited_cb)
-				doc.hd.hdview.set_tooltip_column(8)
-				
-				doc.hpaned = gtk.HPaned()
-				doc.hpaned.add1(scrolled)
-				doc.hpaned.add2(vpaned)
-				label = viewCmd.TabLabel(doc.pname)
-				label.connect("close-clicked", self.on_tab_close_clicked, self.notebook, doc.hpaned)
-				self.notebook.append_page(doc.hpaned, label)
-				self.notebook.set_tab_reorderable(doc.hpaned, True)
-				self.notebook.show_tabs = True
-				self.notebook.show_all()
-				self.notebook.set_current_page(-1)
-				if self.cbm != None:
-					li = self.cbm.append()
-					self.cbm.set_value(li,0,"%s (tab %s)"%(doc.pname,dnum))
+				self.add_page(doc)
 			else:
 				print err
 		return
 
+	def add_page(self,doc):
+		dnum = len(self.das)
+		self.das[dnum] = doc
+		scrolled = doc.scrolled
+		vpaned = doc.hd.vpaned
+		doc.view.connect("row-activated", self.on_row_activated)
+		doc.view.connect("test-expand-row", self.on_row_expand, doc)
+		doc.view.connect("key-press-event", self.on_row_keypressed)
+		doc.view.connect("key-release-event", self.on_row_keyreleased)
+		doc.view.connect("button-release-event", self.on_row_keyreleased)
+		doc.hd.hdview.connect("row-activated", self.on_hdrow_activated)
+		doc.hd.hdview.connect("key-release-event", self.on_hdrow_keyreleased)
+		doc.hd.hdview.connect("button-release-event", self.on_hdrow_keyreleased)
+		doc.hd.hdrend.connect('edited', self.edited_cb)
+		doc.hd.hdview.set_tooltip_column(8)
+		
+		doc.hpaned = gtk.HPaned()
+		doc.hpaned.add1(scrolled)
+		doc.hpaned.add2(vpaned)
+		label = viewCmd.TabLabel(doc.pname)
+		label.connect("close-clicked", self.on_tab_close_clicked, self.notebook, doc.hpaned)
+		self.notebook.append_page(doc.hpaned, label)
+		self.notebook.set_tab_reorderable(doc.hpaned, True)
+		self.notebook.show_tabs = True
+		self.notebook.show_all()
+		self.notebook.set_current_page(-1)
+		if self.cbm != None:
+			li = self.cbm.append()
+			self.cbm.set_value(li,0,"%s (tab %s)"%(doc.pname,dnum))
+
+	def start_loader(self,doc):
+		box = gtk.HBox()
+		bar = gtk.ProgressBar()
+		bar.set_text("Parsing %s"%doc.pname)
+		button = gtk.Button("Cancel")
+		box.pack_start(bar, True, True, 2)
+		box.pack_start(button, False, False, 2)
+		self.statusbar.pack_start(box, False, False, 2)
+		box.show_all()
+		loader = bgload.Loader(doc, lambda l: self.on_loader_tick(l,box,bar))
+		button.connect("clicked", lambda b: loader.cancel())
+		loader.start()
+
+	def on_loader_tick(self,loader,box,bar):
+		if loader.done:
+			self.statusbar.remove(box)
+			if loader.err != 0:
+				print loader.err
+			return
+		f = loader.fraction()
+		if f == None:
+			bar.pulse()
+		else:
+			bar.set_fraction(f)
+
 	def file_open (self, title='Open', parent=None, dirname=None, fname=""):
 		if title == 'Save':
 			dlg = gtk.FileChooserDialog('Save...', action=gtk.FILE_CHOOSER_ACTION_SAVE, buttons=(gtk.STOCK_OK,gtk.RESPONSE_OK,gtk.STOCK_CANCEL,gtk.RESPONSE_CANCEL))
@@ -1796,6 +1748,8 @@ class ApplicationMainWindow(gtk.Window):
 
 
 def main():
+	# background parsing runs in threads
+	gobject.threads_init()
 	ApplicationMainWindow()
 	gtk.main()
 
@@ -18,8 +18,8 @@ import sys,struct,os
 import tree,gtk,cairo,zlib
 import gobject
 import difflib
-import ole,escher,rx2,cdr,icc,mf,pict,chdraw,yep,cvx,pm6,vba,pkzip
 from utils import *
+lazy_import("ole escher rx2 cdr icc mf pict chdraw yep cvx pm6 vba pkzip", globals())
 from os.path import expanduser
 import StringIO
 
@@ -197,8 +197,8 @@ class SelectWindow(gtk.Window):
 			m2 = self.rpath_cb.get_model()
 			iter1 = self.lpath_cb.get_active_iter()
 			iter2 = self.rpath_cb.get_active_iter()
-			self.mainapp.dw.diffdata1 = m1.get_value(iter1,3)
-			self.mainapp.dw.diffdata2 = m2.get_value(iter2,3)
+			self.mainapp.dw.diffdata1 = pgdata(m1,iter1)
+			self.mainapp.dw.diffdata2 = pgdata(m2,iter2)
 			self.changed = 0
 			self.mainapp.dw.diff_test(self.mainapp.dw.diffdata1,self.mainapp.dw.diffdata2)
 			self.mainapp.dw.show_all()
@@ -1094,7 +1094,7 @@ class CliWindow(gtk.Window):
 			treeSelection = self.app.das[pn].view.get_selection()
 			rmodel, riter = treeSelection.get_selected()
 			if riter:
-				rbuf = rmodel.get_value(riter,3)
+				rbuf = pgdata(rmodel,riter)
 			else:
 				rbuf = ""
 			pnb = self.clinb.get_current_page()
@@ -1128,7 +1128,7 @@ def arg_conv (ctype,carg):
 
 def xlsfind (model,path,iter,(page,rowaddr,coladdr)):
 	rname = model.get_value(iter,0)
-	rdata = model.get_value(iter,3)
+	rdata = pgdata(model,iter)
 	if rname == 'Dimensions':
 		rwmin = struct.unpack('<I',rdata[4:8])[0]
 		rwmax = struct.unpack('<I',rdata[8:12])[0]
@@ -1174,7 +1174,7 @@ def recfind (model,path,iter,(page,data)):
 	if pos != -1:
 		# found record, looks for value in normal case
 		if arg != -1:
-			recdata = model.get_value(iter,3)
+			recdata = pgdata(model,iter)
 			pos2 = recdata.find(rdata2)
 			if pos2 == -1:
 				return
@@ -1185,7 +1185,7 @@ def recfind (model,path,iter,(page,data)):
 			page.search.set_value(s_iter,3,page.search.iter_n_children(None))
 		# looks for args in CDR record
 		else:
-			recdata = model.get_value(iter,3)
+			recdata = pgdata(model,iter)
 			n_args = struct.unpack('<i', recdata[4:8])[0]
 			s_args = struct.unpack('<i', recdata[8:0xc])[0]
 			s_types = struct.unpack('<i', recdata[0xc:0x10])[0]
@@ -1215,7 +1215,7 @@ def cmdfind (model,path,iter,(page,data)):
 	# in cdr look for leaf chunks only, avoid duplication
 	if page.type[0:3] == "CDR" and model.iter_n_children(iter)>0:
 		return
-	buf = model.get_value(iter,3)
+	buf = pgdata(model,iter)
 	test = -1
 	try:
 		while test < len(buf):
@@ -1241,8 +1241,8 @@ def cmp_children (page1, model1, model2, it1, it2, carg):
 			except:
 				pass
 		else:
-			data1 = model1.get_value(iter1,3)
-			data2 = model2.get_value(iter2,3)
+			data1 = pgdata(model1,iter1)
+			data2 = pgdata(model2,iter2)
 			if len(data1) == len(data2):
 				if carg =="*":
 					for j in range(len(data1)):
@@ -1295,8 +1295,8 @@ def compare (cmd, entry, page1, page2):
 			except:
 				pass
 		else:
-			data1 = model1.get_value(iter1,3)
-			data2 = model2.get_value(iter2,3)
+			data1 = pgdata(model1,iter1)
+			data2 = pgdata(model2,iter2)
 			if len(data1) == len(data2):
 				if carg =="*":
 					for j in range(len(data1)):
@@ -1337,7 +1337,7 @@ def parse (cmd, entry, page):
 			page.view.set_cursor_on_cell(0)
 			treeSelection = page.view.get_selection()
 			model, iter1 = treeSelection.get_selected()
-		buf = model.get_value(iter1,3)
+		buf = pgdata(model,iter1)
 
 		if "ole" == chtype.lower():
 			if buf[int(chaddr,16):int(chaddr,16)+8] == "\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1":
@@ -1402,11 +1402,11 @@ def parse (cmd, entry, page):
 					if pos != -1:
 						endaddr = chaddr[pos+1:]
 						chaddr = chaddr[:pos]
-						value = model.get_value(iter1,3)[int(chaddr,16):int(endaddr,16)]
+						value = pgdata(model,iter1)[int(chaddr,16):int(endaddr,16)]
 					else:
-						value = model.get_value(iter1,3)[int(chaddr,16):]
+						value = pgdata(model,iter1)[int(chaddr,16):]
 				else:
-					value = model.get_value(iter1,3)[int(chaddr,16):]
+					value = pgdata(model,iter1)[int(chaddr,16):]
 
 				if nlen != None:
 					f = open(fname,'wb')
@@ -22,6 +22,7 @@ import inflate
 import vsdchunks,vsdstream4
 import ole
 import ctypes
+import handlers
 from utils import *
 
 
@@ -301,7 +302,7 @@ def get_colors (page, data, version, parent):
 				clr = "#%02x%02x%02x"%(r,g,b)
 				model.set (iter1, 0, txt,1,("vsd","clr"),2,4,3,data[shift+2+i*4:shift+6+i*4],5,clr,6,model.get_string_from_iter(iter1))
 
-def collect_chunks (page,parent):
+def collect_chunks (model,parent):
 	value = ""
 	for i in range(model.iter_n_children(parent)):
 		citer = model.iter_nth_child(parent,i)
@@ -331,14 +332,20 @@ def collect_str5 (model, parent, offset):
 		if ctype >> 4 == 4:
 			res = model.get_value(model.iter_nth_child(citer,0),3)
 			ptype = model.get_value(citer,3)[0:4]
-			ptr_array += ptype + "\x00"*4+struct.pack("<I",offset)+struct.pack("<I",len(res))+"\x40\x00"
+			pfmt = 0x40|(ctype&2)
+			if pfmt&2:
+				res = inflate.deflate(res)
+			ptr_array += ptype + "\x00"*4+struct.pack("<I",offset)+struct.pack("<I",len(res))+struct.pack("<H",pfmt)
 			ptr_count += 1
 			value += res
 			offset += len(res)
 		if ctype >> 4 > 7: # Fridrich found file with 0x8* instead of 0xd
 			res = collect_strD (model,citer)
 			ptype = model.get_value(citer,3)[0:4]
-			pfmt = (struct.unpack("<H",model.get_value(citer,3)[16:18])[0])&0xFD
+			# streams compressed in the original file are compressed again
+			pfmt = struct.unpack("<H",model.get_value(citer,3)[16:18])[0]
+			if pfmt&2:
+				res = inflate.deflate(res)
 			ptr_array += ptype + "\x00"*4+struct.pack("<I",offset)+struct.pack("<I",len(res))+struct.pack("<H",pfmt)
 			ptr_count += 1
 			value += res
@@ -366,7 +373,8 @@ def collect_vd (model, parent):
 		value = hdr + struct.pack("<I",len(res)+18+0x24+len(hdr2)) + "\x00\x84\x01\x00" + tr_ptr + hdr2 + res
 		return value
 
-def dump_tree (model, parent, outfile):
+def dump_tree (page, parent, outfile):
+		model = page.view.get_model()
 		ntype = model.get_value(parent,1)
 		name = model.get_value(parent,0)
 		if name != 'VisioDocument':
@@ -385,8 +393,9 @@ def save (page, fname):
 		outfile = page.parent.cgsf.gsf_outfile_msole_new (output);
 		iter1 = model.get_iter_first()
 		while None != iter1:
-			dump_tree(model, iter1, outfile)
+			dump_tree(page, iter1, outfile)
 			iter1 = model.iter_next(iter1)
 		page.parent.cgsf.gsf_output_close(outfile)
 		page.parent.cgsf.gsf_shutdown()
 
+handlers.register("vsd", {"hdr":hdr}, ("hd","data"))
@@ -17,6 +17,7 @@
 import struct
 import datetime
 import vsd,vsdblock,vsdchunks5
+import handlers
 from utils import *
 
 
@@ -869,3 +870,7 @@ def parse(page, version, parent, pntr):
 #			print 'Something wrong with chunks',name,'%x'%offset
 #			offset = offset + 4 #ch_hdr_len, probably with +4 it will "autorecover" in some cases of underestimated trailer
 	return
+
+handlers.register("vsd", chnk_func, stype="chnk")
+handlers.register("vsd2", chnk_func, ("hd","size","data",19))
+handlers.register("vsd24", chnk_func, ("hd","size","data",4))
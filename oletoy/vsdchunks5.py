@@ -17,6 +17,7 @@
 import struct
 import datetime
 import vsd,vsdblock
+import handlers
 from utils import *
 
 
@@ -179,3 +180,10 @@ chnk_func = {
 	0xc9:NameIDX,
 #	0xd1:ShapeData
 }
+
+def hd_chnk(hd, size, data, stype):
+	# stype is "chnk <type>"
+	if stype[:4] == "chnk" and chnk_func.has_key(int(stype[5:])):
+		chnk_func[int(stype[5:])](hd, size, data)
+
+handlers.register_fallback("vsdv", hd_chnk, ("hd","size","data","stype"))
@@ -17,6 +17,7 @@
 import struct
 from utils import *
 from math import ceil
+import handlers
 
 win_types = {0x15:'Drawing',0x1d:'Stencil'}
 
@@ -150,3 +151,5 @@ def FontFace (hd, size, value):
 	hd.model.set (iter1, 0, "Panos", 1, panos,2,0x60,3,0xa,4,"txt")
 
 stream_func = {0x1e:StencilPage,0x2a:Window,0x2f:EventItem,0x32:NameList,0x34:NameIDXv123,0xc9:NameIDX,0xd7:FontFace}
+
+handlers.register("vsd", stream_func, stype="str4")
@@ -16,6 +16,7 @@
 
 import sys,struct,gtk
 import cdr
+import handlers
 from utils import *
 
 def t2chn (hd, size, data):
@@ -146,4 +147,4 @@ def open(buf,page,parent):
 	except:
 		print "Something failed in type7"
 
-
+handlers.register("wld", wld_ids)
@@ -16,6 +16,7 @@
 
 import struct
 
+import handlers
 from utils import add_iter, add_pgiter, bflag2txt, key2txt, rdata
 
 obfuscation_map = {}
@@ -655,4 +656,6 @@ if __name__ == '__main__':
 	test_deobfuscate(0x19, 0x20, '@')
 	test_deobfuscate(0x1a, 0x20, 'A')
 
+handlers.register("wls", wls_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
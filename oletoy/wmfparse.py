@@ -18,6 +18,7 @@ import sys,struct
 import gtk
 import tree
 import hexdump
+import handlers
 from utils import *
 
 def PointS (hd, value, offset, i=""):
@@ -387,3 +388,5 @@ wmr_ids = {
 2610:ExtTextOut,
 #1790:'CreateBitmap', 1565:'PatBlt', 2338:'BitBlt', 2368:'DibBitblt', 2851:'StretchBlt', 2881:'DibStretchBlt', 3379:'SetDibToDev', 3907:'StretchDIBits'
 }
+
+handlers.register("wmf", wmr_ids)
@@ -16,6 +16,7 @@
 
 import struct
 
+import handlers
 from utils import add_iter, add_pgiter, bflag2txt, d2hex, key2txt, lcid2txt, ms_charsets, rdata
 
 def set_length(hd, iter, length):
@@ -1794,4 +1795,6 @@ def parse_object(page, data, parent):
 	add_pgiter(page, 'Header', 'wt602', 'object_header', data[0:4], parent)
 	add_pgiter(page, 'Content', 'wt602', '', data[4:], parent)
 
+handlers.register("wt602", wt602_ids)
+
 # vim: set ft=python ts=4 sw=4 noet:
@@ -21,8 +21,12 @@ import tree
 import hexdump
 import escher
 import ctypes
+import log
+import handlers
 from utils import *
 
+lg = log.get("xls")
+
 
 escapement = {0:"None", 1:"Superscript", 2:"Subscript"}
 
@@ -733,20 +737,22 @@ def parse (page, data, parent):
 	lblidx = 1
 	iters = []
 	iters.append(parent)
-	print "Length of iters ",len(iters)
+	lg.debug("Length of iters %d",len(iters))
 	curiter = iters[len(iters)-1]
+	trace = lg.on(log.TRACE)
 
 	try:
 		while offset < len(data) - 4:
 			rtype = struct.unpack("<H",data[offset:offset+2])[0]
 			if rtype == 0:
-				print "Break.",offset,len(data)
+				lg.warn("Break. %d %d",offset,len(data))
 				break
 			iter1 = page.model.append(curiter,None)
 			rname = ""
 			if rec_ids.has_key(rtype):
 				rname = rec_ids[rtype]
-			print rtype, rname, offset
+			if trace:
+				lg.trace("%s %s %s",rtype,rname,offset)
 			if rtype == 0x809:
 				iters.append(iter1)
 				curiter = iter1
@@ -759,11 +765,11 @@ def parse (page, data, parent):
 				if ver == 0x500:
 					ftype = "XLS5"
 					page.version = 5
-					print "Version: 5"
+					lg.info("Version: 5")
 				elif ver == 0x600:
 					ftype = "XLS8"
 					page.version = 8
-					print "Version: 8"
+					lg.info("Version: 8")
 			elif rtype == 10 or rtype == 0x1034:
 				iters.pop()
 				curiter = iters[len(iters)-1]
@@ -781,7 +787,7 @@ def parse (page, data, parent):
 			offset += 2
 			rlen = struct.unpack("<H",data[offset:offset+2])[0]
 			offset += 2
-			rdata = data[offset-4:offset+rlen]
+			rdata = DataView(data,offset-4,rlen+4)
 			page.model.set_value(iter1,0,rname)
 			page.model.set_value(iter1,1,("xls",rtype))
 			page.model.set_value(iter1,2,len(rdata))
@@ -792,14 +798,14 @@ def parse (page, data, parent):
 				escher.parse (page.model,rdata[4:],iter1)
 			offset += rlen
 	except:
-		print "Something was wrong in XLS parse"
+		lg.error("Something was wrong in XLS parse")
 
 	return ftype
 
 def collect_tree (model, parent, value=""):
 	for i in range(model.iter_n_children(parent)):
 		citer = model.iter_nth_child(parent, i)
-		print 'mname',model.get_value(citer,0)
+		lg.debug("mname %s",model.get_value(citer,0))
 
 		value += model.get_value(citer,3)
 		if model.iter_n_children(citer):
@@ -832,3 +838,5 @@ def save (page, fname):
 	  iter1 = model.iter_next(iter1)
 	page.parent.cgsf.gsf_output_close(outfile)
 	page.parent.cgsf.gsf_shutdown()
+
+handlers.register("xls", biff5_ids, ("hd","data"))
@@ -17,6 +17,7 @@
 import sys,struct,math
 from utils import *
 from midi import *
+import handlers
 
 # PSR DSP Types p. 25 
 # http://www2.yamaha.co.jp/manual/pdf/emi/english/port/psrs650_en_dl_a0.pdf
@@ -760,6 +761,33 @@ vprmfunc = {"bank":bank, "dkblock":dkblock, "elemhdr":elemhdr,
 	"hdra":hdra, "hdralst":hdralst, "hdrbch":hdrbch, "p1s0":p1s0, "p1s1":p1s1, 
 	"vbhdr":vbhdr, "VVST":vvst, "samples":samples}
 
+def hd_vprm(hd, data, stype, model, iter1):
+	if stype in vprmfunc:
+		off = 0
+		offsmp = model.get_value(iter1,8)
+		if offsmp == None:
+			offstr = model.get_value(iter1,7)
+			if offstr:
+				off = int(offstr,16)
+		else:
+			off = offsmp
+		vprmfunc[stype](hd,data,off)
+
+		# add ligthgreen HL for hdrows
+		hditer1 = hd.model.get_iter_first()
+		hls = []
+		while None != hditer1:
+			hdoffset = hd.model.get_value(hditer1,2)
+			hdsize = hd.model.get_value(hditer1,3)
+			hdoffset2 = hd.model.get_value(hditer1,5)
+			hdsize2 = hd.model.get_value(hditer1,6)
+			hls.append((len(hls),(hdoffset,hdsize,.6,.9,.6,.9)))
+			if hdsize2 > 0:
+				hls.append((len(hls),(hdoffset2,hdsize2,.6,.9,.6,.9)))
+			hditer1 = hd.model.iter_next(hditer1)
+		hd.hv.hl.add(hls)
+		hd.hv.expose(None,None)
+
 def hdr1item (page,data,parent,offset=0):
 	off = 0
 	# size of the "main header for level2 block
@@ -1000,7 +1028,7 @@ def parse_ppi (page, data, parent,align=4.,prefix="",offset=0):
 			else:
 				parse_ppi (page, data[off:off+length], citer, 4., "%s/"%fourcc,off)
 		off += length
-	page.view.get_column(1).set_title("Offset")
+	page.set_title(1,"Offset")
 	return "PPI"
 	
 
@@ -1057,5 +1085,8 @@ def parse (page, data, parent,align=4.,prefix="",offset=0):
 		if fourcc == "IPIT":
 			parse (page, data[off:off+length], citer, 4., "IPIT/",off)
 		off += length
-	page.view.get_column(1).set_title("Offset")
+	page.set_title(1,"Offset")
 	return "YEP"
+
+handlers.register_fallback("vprm", hd_vprm, ("hd","data","stype","model","iter"))
+handlers.register_fallback("yep", hd_vprm, ("hd","data","stype","model","iter"))
@@ -19,6 +19,7 @@
 # files available from the same page.
 
 import uniview
+import handlers
 from utils import add_iter, add_pgiter, rdata, key2txt
 
 obj_names = {
@@ -316,4 +317,7 @@ def open(data, page, parent):
 	off = parse_palette(page, data, off, parent)
 	parse_objects(page, data, off, parent)
 
+handlers.register("zbr", zbr_ids)
+handlers.register_fallback("zbr", uniview.hd_view, ("hd","size","data","stype"))
+
 # vim: set ft=python sts=4 sw=4 noet:
@@ -18,6 +18,8 @@ import zlib
 
 import bmi
 import utils
+import uniview
+import handlers
 from uniview import HdView, PageView
 from utils import add_iter, add_pgiter, rdata, key2txt, d2hex, d2bin, bflag2txt, ms_charsets
 
@@ -1550,4 +1552,8 @@ def zmf4_open(data, page, parent):
 	parser = ZMF4Parser(data, page, parent)
 	parser.parse()
 
+handlers.register("zmf2", zmf2_ids)
+handlers.register_fallback("zmf2", uniview.hd_view, ("hd","size","data","stype"))
+handlers.register("zmf4", zmf4_ids)
+
 # vim: set ft=python sts=4 sw=4 noet: